@@ -0,0 +1,194 @@
+"""
+Benchmark for hotel room availability over the room_nights inventory.
+
+Loads a synthetic inventory (10k rooms, 1M bookings by default, about 3M
+booked nights) into a scratch database, then times the availability queries
+hotel search runs: single-room lookups and whole-inventory searches through
+`RoomInventory.free_rooms`. For comparison it times the same searches as an
+interval-overlap query on the bookings collection, and checks both agree.
+
+Run from the backend directory against a local mongod:
+
+    python -m benchmarks.bench_hotel_availability --rooms 10000 --bookings 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.stats import percentile
+from indexes import ensure_indexes
+from room_inventory import RoomInventory, stay_nights
+
+load_dotenv()
+
+
+def generate_bookings(rooms: int, bookings: int, rng: random.Random):
+    """
+    Non-overlapping stays per room, spread over the following years
+    """
+    per_room = bookings // rooms
+    first_night = date.today()
+    for room in range(rooms):
+        cursor = first_night + timedelta(days=rng.randint(0, 3))
+        for _ in range(per_room):
+            check_in = cursor + timedelta(days=rng.randint(0, 4))
+            check_out = check_in + timedelta(days=rng.randint(1, 5))
+            yield f"room-{room}", check_in, check_out
+            cursor = check_out
+
+
+def random_stay(rng: random.Random, horizon_days: int):
+    check_in = date.today() + timedelta(days=rng.randint(0, horizon_days))
+    return check_in, check_in + timedelta(days=rng.randint(1, 7))
+
+
+def midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+async def load(db, bookings, batch_size: int, concurrency: int) -> int:
+    """
+    Write every booking and its nights in unordered batches; returns the nights written
+    """
+    nights, booking_documents = [], []
+    writes = set()
+    written = 0
+
+    async def flush(collection, documents):
+        if len(writes) >= concurrency:
+            done, _ = await asyncio.wait(writes, return_when=asyncio.FIRST_COMPLETED)
+            writes.difference_update(done)
+        writes.add(asyncio.ensure_future(collection.insert_many(documents, ordered=False)))
+
+    for number, (room_id, check_in, check_out) in enumerate(bookings):
+        booking_id = f"booking-{number}"
+        booking_documents.append({
+            "id": booking_id,
+            "room_id": room_id,
+            "check_in_date": midnight(check_in),
+            "check_out_date": midnight(check_out),
+            "status": "confirmed",
+        })
+        for night in stay_nights(check_in, check_out):
+            nights.append({"room_id": room_id, "night": night, "booking_id": booking_id})
+        if len(nights) >= batch_size:
+            written += len(nights)
+            await flush(db.room_nights, nights)
+            nights = []
+        if len(booking_documents) >= batch_size:
+            await flush(db.bookings, booking_documents)
+            booking_documents = []
+    written += len(nights)
+    for collection, documents in ((db.room_nights, nights), (db.bookings, booking_documents)):
+        if documents:
+            await flush(collection, documents)
+    if writes:
+        await asyncio.gather(*writes)
+    return written
+
+
+async def overlapping_rooms(db, room_ids, check_in: date, check_out: date):
+    return await db.bookings.distinct(
+        "room_id",
+        {
+            "room_id": {"$in": room_ids},
+            "check_in_date": {"$lt": midnight(check_out)},
+            "check_out_date": {"$gt": midnight(check_in)},
+        }
+    )
+
+
+async def run(args) -> dict:
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), maxPoolSize=args.concurrency * 2)
+    db = client[args.db_name]
+    await client.drop_database(args.db_name)
+    await ensure_indexes(db)
+
+    rng = random.Random(args.seed)
+    bookings = list(generate_bookings(args.rooms, args.bookings, rng))
+    horizon_days = (max(check_out for _, _, check_out in bookings) - date.today()).days
+
+    started = time.perf_counter()
+    nights = await load(db, bookings, args.batch_size, args.concurrency)
+    load_seconds = time.perf_counter() - started
+
+    inventory = RoomInventory(db)
+    room_ids = [f"room-{room}" for room in range(args.rooms)]
+
+    # Single-room lookups
+    lookup_latencies = []
+    for _ in range(args.lookups):
+        room_id = rng.choice(room_ids)
+        check_in, check_out = random_stay(rng, horizon_days)
+        lookup_started = time.perf_counter()
+        await inventory.free_rooms([room_id], check_in, check_out)
+        lookup_latencies.append(time.perf_counter() - lookup_started)
+
+    # Whole-inventory searches, as search_hotels does for a city
+    stays = [random_stay(rng, horizon_days) for _ in range(args.searches)]
+    search_latencies = []
+    for check_in, check_out in stays:
+        search_started = time.perf_counter()
+        free = await inventory.free_rooms(room_ids, check_in, check_out)
+        search_latencies.append(time.perf_counter() - search_started)
+
+    # The same searches as an interval-overlap query on the bookings
+    scans = stays[:args.scans]
+    scan_latencies = []
+    for check_in, check_out in scans:
+        scan_started = time.perf_counter()
+        busy = await overlapping_rooms(db, room_ids, check_in, check_out)
+        scan_latencies.append(time.perf_counter() - scan_started)
+
+    check_in, check_out = scans[-1]
+    mismatches = len(await inventory.free_rooms(room_ids, check_in, check_out) ^ (set(room_ids) - set(busy)))
+
+    await client.drop_database(args.db_name)
+    client.close()
+
+    search_ms = sum(search_latencies) / len(search_latencies) * 1000
+    scan_ms = sum(scan_latencies) / len(scan_latencies) * 1000
+    return {
+        "rooms": args.rooms,
+        "bookings": len(bookings),
+        "room_nights": nights,
+        "load_seconds": round(load_seconds, 2),
+        "room_lookup_p50_ms": round(percentile(lookup_latencies, 0.50) * 1000, 3),
+        "room_lookup_p99_ms": round(percentile(lookup_latencies, 0.99) * 1000, 3),
+        "inventory_search_ms": round(search_ms, 2),
+        "inventory_search_p99_ms": round(percentile(search_latencies, 0.99) * 1000, 2),
+        "bookings_overlap_search_ms": round(scan_ms, 2),
+        "speedup": round(scan_ms / search_ms, 1),
+        "free_rooms_last_search": len(free),
+        "mismatched_rooms": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--bookings", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--searches", type=int, default=50)
+    parser.add_argument("--scans", type=int, default=3, help="searches repeated on the bookings for comparison")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=8, help="insert batches in flight while loading")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-name", default="dz_smart_booking_bench")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if result["mismatched_rooms"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
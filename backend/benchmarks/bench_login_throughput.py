@@ -0,0 +1,91 @@
+"""
+Login throughput benchmark.
+
+Measures search latency against a running server, first on its own and then
+while concurrent clients hammer POST /api/auth/login, and reports login
+throughput plus search p50/p99 for both phases. With hashing off the event
+loop, search latency should barely move while logins are saturated.
+
+Start the server (uvicorn server:app --port 8001), then:
+
+    python -m benchmarks.bench_login_throughput --base-url http://localhost:8001 --login-clients 32
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+from benchmarks.stats import percentile
+
+
+async def probe_search(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/api/hotels", params={"limit": 10})
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+async def hammer_login(client: httpx.AsyncClient, stop: asyncio.Event, credentials: dict, outcomes: dict):
+    while not stop.is_set():
+        response = await client.post("/api/auth/login", data=credentials)
+        outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+
+
+async def phase(client: httpx.AsyncClient, seconds: float, login_clients: int, credentials: dict) -> dict:
+    stop = asyncio.Event()
+    latencies, outcomes = [], {}
+    tasks = [asyncio.create_task(probe_search(client, stop, latencies))]
+    tasks += [
+        asyncio.create_task(hammer_login(client, stop, credentials, outcomes))
+        for _ in range(login_clients)
+    ]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    return {
+        "login_clients": login_clients,
+        "logins_per_second": round(outcomes.get(200, 0) / seconds, 1),
+        "login_status_codes": outcomes,
+        "search_requests": len(latencies),
+        "search_p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "search_p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.login_clients + 8)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+        password = "bench-password"
+        response = await client.post("/api/auth/register", json={
+            "email": email,
+            "password": password,
+            "full_name": "Login Bench",
+            "phone_number": "0555000000",
+        })
+        response.raise_for_status()
+        credentials = {"username": email, "password": password}
+
+        return {
+            "idle": await phase(client, args.seconds, 0, credentials),
+            "under_login_load": await phase(client, args.seconds, args.login_clients, credentials),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--login-clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Contention benchmark for the hotel room inventory.
+
+Fires thousands of simultaneous bookings with overlapping stays at a handful
+of rooms, then checks that no two accepted bookings share a night of the
+same room and that the inventory holds exactly the nights of the accepted
+bookings. Reports booking throughput and latency, and the latency of
+availability queries over the resulting inventory. Overlaps must be zero.
+
+Run from the backend directory against a local mongod:
+
+    python -m benchmarks.bench_room_contention --requests 5000 --rooms 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.stats import percentile
+from indexes import ensure_indexes
+from room_inventory import RoomInventory, stay_nights
+
+load_dotenv()
+
+
+def random_stay(rng: random.Random, horizon_days: int):
+    check_in = date.today() + timedelta(days=rng.randint(1, horizon_days))
+    return check_in, check_in + timedelta(days=rng.randint(1, 5))
+
+
+async def count_overlaps(db, inventory_nights: int) -> int:
+    per_room = defaultdict(list)
+    booked_nights = 0
+    async for booking in db.bookings.find({}, {"room_id": 1, "check_in_date": 1, "check_out_date": 1}):
+        per_room[booking["room_id"]].append((booking["check_in_date"], booking["check_out_date"]))
+        booked_nights += len(stay_nights(booking["check_in_date"], booking["check_out_date"]))
+
+    overlaps = 0
+    for stays in per_room.values():
+        stays.sort()
+        for (_, previous_out), (next_in, _) in zip(stays, stays[1:]):
+            if next_in < previous_out:
+                overlaps += 1
+    # Nights left behind by rejected or rolled back stays also count
+    return overlaps + abs(inventory_nights - booked_nights)
+
+
+async def run(args) -> dict:
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), maxPoolSize=args.pool_size)
+    db = client[args.db_name]
+    await client.drop_database(args.db_name)
+    await ensure_indexes(db)
+
+    inventory = RoomInventory(db)
+    rng = random.Random(args.seed)
+    room_ids = [str(uuid.uuid4()) for _ in range(args.rooms)]
+    requests = [(rng.choice(room_ids), *random_stay(rng, args.horizon_days)) for _ in range(args.requests)]
+
+    latencies = []
+    outcomes = Counter()
+
+    async def book(room_id: str, check_in: date, check_out: date):
+        booking_id = str(uuid.uuid4())
+        started = time.perf_counter()
+        if await inventory.claim(room_id, check_in, check_out, booking_id):
+            await db.bookings.insert_one({
+                "id": booking_id,
+                "room_id": room_id,
+                "check_in_date": datetime.combine(check_in, datetime.min.time()),
+                "check_out_date": datetime.combine(check_out, datetime.min.time()),
+                "status": "pending",
+            })
+            outcomes["booked"] += 1
+        else:
+            outcomes["rejected"] += 1
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(book(*request) for request in requests))
+    elapsed = time.perf_counter() - started
+
+    query_latencies = []
+    for _ in range(args.queries):
+        check_in, check_out = random_stay(rng, args.horizon_days)
+        query_started = time.perf_counter()
+        await inventory.free_rooms(room_ids, check_in, check_out)
+        query_latencies.append(time.perf_counter() - query_started)
+
+    overlaps = await count_overlaps(db, await db.room_nights.count_documents({}))
+    await client.drop_database(args.db_name)
+    client.close()
+
+    return {
+        "requests": args.requests,
+        "rooms": args.rooms,
+        "booked": outcomes["booked"],
+        "rejected": outcomes["rejected"],
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(args.requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "availability_p50_ms": round(percentile(query_latencies, 0.50) * 1000, 2),
+        "availability_p99_ms": round(percentile(query_latencies, 0.99) * 1000, 2),
+        "overlapping_bookings": overlaps,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--horizon-days", type=int, default=60, help="check-in dates spread over this many days")
+    parser.add_argument("--queries", type=int, default=500, help="availability queries timed after the run")
+    parser.add_argument("--pool-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-name", default="dz_smart_booking_bench")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if result["overlapping_bookings"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Concurrency benchmark for the seat reservation engine.
+
+Fires thousands of simultaneous bookings at a single trip and reports
+throughput, latency percentiles and the number of oversold seats, which
+must be zero.
+
+Run from the backend directory against a local mongod:
+
+    python -m benchmarks.bench_seat_reservation --requests 5000 --seats 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.stats import percentile
+from indexes import ensure_indexes
+from reservations import SeatReservationEngine
+from seat_map import new_seat_map, sold_count
+
+load_dotenv()
+
+
+async def setup_trip(db, seats: int, price: float) -> dict:
+    trip = {
+        "id": str(uuid.uuid4()),
+        "route_id": str(uuid.uuid4()),
+        "company_id": str(uuid.uuid4()),
+        "bus_type": "standard",
+        "departure_date": datetime.utcnow(),
+        "departure_time": "08:00",
+        "arrival_time": "12:00",
+        "available_seats": seats,
+        "total_seats": seats,
+        "price": price,
+        "features": [],
+        "seat_map": new_seat_map(seats, price),
+    }
+    await db.bus_trips.insert_one(trip)
+    return trip
+
+
+async def count_oversold(db, trip_id: str, seats: int) -> int:
+    bookings = await db.bus_ticket_bookings.find(
+        {"trip_id": trip_id, "status": {"$ne": "canceled"}},
+        {"seat_number": 1}
+    ).to_list(None)
+    per_seat = Counter(booking["seat_number"] for booking in bookings)
+    double_sold = sum(count - 1 for count in per_seat.values() if count > 1)
+
+    trip = await db.bus_trips.find_one({"id": trip_id})
+    counter_drift = abs((seats - len(bookings)) - trip["available_seats"])
+    bitmap_drift = abs(sold_count(trip["seat_map"]) - len(bookings))
+    return double_sold + max(0, len(bookings) - seats) + counter_drift + bitmap_drift
+
+
+async def run(args) -> dict:
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), maxPoolSize=args.pool_size)
+    db = client[args.db_name]
+    await client.drop_database(args.db_name)
+    await ensure_indexes(db)
+
+    trip = await setup_trip(db, args.seats, 1200.0)
+    trip_id = trip["id"]
+    engine = SeatReservationEngine(db)
+    rng = random.Random(args.seed)
+    seat_choices = [str(rng.randint(1, args.seats)) for _ in range(args.requests)]
+
+    latencies = []
+    outcomes = Counter()
+
+    async def book(seat_number: str):
+        def make_booking(price):
+            return {
+                "id": str(uuid.uuid4()),
+                "user_id": str(uuid.uuid4()),
+                "trip_id": trip_id,
+                "passenger_name": "bench",
+                "passenger_phone": "0555000000",
+                "seat_number": seat_number,
+                "price": price,
+                "status": "pending",
+            }
+
+        started = time.perf_counter()
+        try:
+            await engine.reserve(trip, seat_number, make_booking)
+            outcomes["booked"] += 1
+        except HTTPException:
+            outcomes["rejected"] += 1
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(book(seat) for seat in seat_choices))
+    elapsed = time.perf_counter() - started
+
+    oversold = await count_oversold(db, trip_id, args.seats)
+    await client.drop_database(args.db_name)
+    client.close()
+
+    return {
+        "requests": args.requests,
+        "seats": args.seats,
+        "booked": outcomes["booked"],
+        "rejected": outcomes["rejected"],
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(args.requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "oversold_seats": oversold,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--seats", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-name", default="dz_smart_booking_bench")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if result["oversold_seats"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
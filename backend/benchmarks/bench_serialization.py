@@ -0,0 +1,104 @@
+"""
+Benchmark for response serialization.
+
+Encodes a 1000-hotel `search_hotels` response the way FastAPI does for a
+returned model list (response_model validation, jsonable_encoder,
+JSONResponse) and through `serialization.json_response`, and reports CPU
+time per response. Needs no database:
+
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_serialization --hotels 1000
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+import server
+from serialization import json_response
+
+
+def hotel_documents(count: int):
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"Hotel {i}",
+            "city": "Algiers",
+            "city_key": "algiers",
+            "address": f"{i} Rue Didouche Mourad",
+            "description": "Comfortable rooms in the city centre, close to the port and the main stations.",
+            "stars": 1 + i % 5,
+            "amenities": ["wifi", "parking", "breakfast", "air_conditioning"],
+            "images": [f"https://example.com/hotels/{i}/{n}.jpg" for n in range(3)],
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def search_route():
+    for route in server.app.routes:
+        if getattr(route, "path", None) == "/api/search/hotels":
+            return route
+    raise LookupError("search_hotels route not found")
+
+
+def measure(encode, rounds: int) -> float:
+    encode()
+    started = time.process_time()
+    for _ in range(rounds):
+        encode()
+    return (time.process_time() - started) / rounds * 1000
+
+
+def run(args) -> dict:
+    documents = hotel_documents(args.hotels)
+    response_field = search_route().response_field
+    loop = asyncio.new_event_loop()
+
+    def before():
+        # Models built by the handler, then validated and encoded again by FastAPI
+        hotels = [server.Hotel(**hotel) for hotel in documents]
+        content = loop.run_until_complete(
+            serialize_response(field=response_field, response_content=hotels, is_coroutine=True)
+        )
+        return JSONResponse(content).body
+
+    def after():
+        hotels = [server.Hotel(**hotel) for hotel in documents]
+        return json_response(List[server.Hotel], hotels).body
+
+    assert json.loads(before()) == json.loads(after())
+
+    before_ms = measure(before, args.rounds)
+    after_ms = measure(after, args.rounds)
+    loop.close()
+
+    return {
+        "hotels": args.hotels,
+        "rounds": args.rounds,
+        "response_bytes": len(after()),
+        "response_model_cpu_ms": round(before_ms, 2),
+        "json_response_cpu_ms": round(after_ms, 2),
+        "speedup": round(before_ms / after_ms, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hotels", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
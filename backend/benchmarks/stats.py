@@ -0,0 +1,14 @@
+"""
+Summary statistics shared by the benchmarks and the load-testing harness.
+"""
+from typing import List
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of `values`; 0.0 for no values
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -0,0 +1,220 @@
+"""
+Canonical city keys and prefix autocomplete.
+
+Every spelling of a city (English, French, Arabic, with or without accents)
+normalizes to one canonical key such as `sidi_bel_abbes`, which is stored
+on hotels and routes and indexed, so city filters are exact lookups.
+
+The names of all 58 wilayas are listed in every script. Arabic script does
+not write short vowels, so no transliteration can turn بجاية into "bejaia";
+the alias table is what joins the two. Names outside it still get a Latin
+key, with Arabic letters transliterated, so keys are always ASCII.
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+# Cities served by the bus network
+CITIES = ["algiers", "oran", "constantine", "annaba", "setif", "batna", "blida", "sidi_bel_abbes", "tlemcen", "biskra"]
+
+# Display names per canonical key; the first one is the default
+CITY_NAMES: Dict[str, List[str]] = {
+    "algiers": ["Algiers", "Alger", "Dzayer", "الجزائر العاصمة", "الجزائر"],
+    "oran": ["Oran", "Wahran", "وهران"],
+    "constantine": ["Constantine", "Qacentina", "قسنطينة"],
+    "annaba": ["Annaba", "Bône", "عنابة"],
+    "setif": ["Setif", "Sétif", "Stif", "سطيف"],
+    "batna": ["Batna", "باتنة"],
+    "blida": ["Blida", "البليدة"],
+    "sidi_bel_abbes": ["Sidi Bel Abbes", "Sidi Bel Abbès", "Sidi Belabbes", "سيدي بلعباس"],
+    "tlemcen": ["Tlemcen", "تلمسان"],
+    "biskra": ["Biskra", "بسكرة"],
+    "adrar": ["Adrar", "أدرار"],
+    "chlef": ["Chlef", "Chelif", "El Asnam", "الشلف"],
+    "laghouat": ["Laghouat", "Laghwat", "الأغواط"],
+    "oum_el_bouaghi": ["Oum El Bouaghi", "Oum el-Bouaghi", "أم البواقي"],
+    "bejaia": ["Bejaia", "Béjaïa", "Bougie", "Bgayet", "بجاية"],
+    "bechar": ["Bechar", "Béchar", "بشار"],
+    "bouira": ["Bouira", "البويرة"],
+    "tamanrasset": ["Tamanrasset", "Tamanghasset", "تمنراست"],
+    "tebessa": ["Tebessa", "Tébessa", "تبسة"],
+    "tiaret": ["Tiaret", "Tihert", "تيارت"],
+    "tizi_ouzou": ["Tizi Ouzou", "Tizi-Ouzou", "تيزي وزو"],
+    "djelfa": ["Djelfa", "Jelfa", "الجلفة"],
+    "jijel": ["Jijel", "Djidjelli", "جيجل"],
+    "saida": ["Saida", "Saïda", "سعيدة"],
+    "skikda": ["Skikda", "Philippeville", "سكيكدة"],
+    "guelma": ["Guelma", "قالمة"],
+    "medea": ["Medea", "Médéa", "المدية"],
+    "mostaganem": ["Mostaganem", "مستغانم"],
+    "m_sila": ["M'Sila", "Msila", "المسيلة"],
+    "mascara": ["Mascara", "Mouaskar", "معسكر"],
+    "ouargla": ["Ouargla", "Wargla", "ورقلة"],
+    "el_bayadh": ["El Bayadh", "البيض"],
+    "illizi": ["Illizi", "إليزي"],
+    "bordj_bou_arreridj": ["Bordj Bou Arreridj", "Bordj Bou Arréridj", "BBA", "برج بوعريريج"],
+    "boumerdes": ["Boumerdes", "Boumerdès", "بومرداس"],
+    "el_tarf": ["El Tarf", "الطارف"],
+    "tindouf": ["Tindouf", "تندوف"],
+    "tissemsilt": ["Tissemsilt", "تيسمسيلت"],
+    "el_oued": ["El Oued", "Oued Souf", "الوادي"],
+    "khenchela": ["Khenchela", "خنشلة"],
+    "souk_ahras": ["Souk Ahras", "سوق أهراس"],
+    "tipaza": ["Tipaza", "Tipasa", "تيبازة"],
+    "mila": ["Mila", "ميلة"],
+    "ain_defla": ["Ain Defla", "Aïn Defla", "عين الدفلى"],
+    "naama": ["Naama", "Naâma", "النعامة"],
+    "ain_temouchent": ["Ain Temouchent", "Aïn Témouchent", "عين تموشنت"],
+    "ghardaia": ["Ghardaia", "Ghardaïa", "غرداية"],
+    "relizane": ["Relizane", "Ghilizane", "غليزان"],
+    "timimoun": ["Timimoun", "تيميمون"],
+    "bordj_badji_mokhtar": ["Bordj Badji Mokhtar", "برج باجي مختار"],
+    "ouled_djellal": ["Ouled Djellal", "أولاد جلال"],
+    "beni_abbes": ["Beni Abbes", "Béni Abbès", "بني عباس"],
+    "in_salah": ["In Salah", "Ain Salah", "عين صالح"],
+    "in_guezzam": ["In Guezzam", "عين قزام"],
+    "touggourt": ["Touggourt", "تقرت"],
+    "djanet": ["Djanet", "جانت"],
+    "el_m_ghair": ["El M'Ghair", "El Meghaier", "المغير"],
+    "el_meniaa": ["El Meniaa", "El Goléa", "المنيعة"],
+}
+
+_ARABIC_LETTER_VARIANTS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ة": "ه", "ى": "ي", "ـ": None,
+})
+# Arabic letters in the Latin spelling customary in Algeria; hamza and ain are dropped
+_ARABIC_TO_LATIN = str.maketrans({
+    "ا": "a", "ب": "b", "ت": "t", "ث": "th", "ج": "j", "ح": "h", "خ": "kh", "د": "d", "ذ": "dh",
+    "ر": "r", "ز": "z", "س": "s", "ش": "ch", "ص": "s", "ض": "d", "ط": "t", "ظ": "dh", "ع": None,
+    "غ": "gh", "ف": "f", "ق": "q", "ك": "k", "ل": "l", "م": "m", "ن": "n", "ه": "h", "و": "ou",
+    "ي": "i", "ء": None, "ئ": None, "ؤ": None, "پ": "p", "ڤ": "v", "گ": "g",
+})
+_SEPARATORS = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def _fold_script(name: str) -> str:
+    # Drop accents and Arabic diacritics, unify letter variants and separators
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    folded = stripped.casefold().translate(_ARABIC_LETTER_VARIANTS)
+    return _SEPARATORS.sub("_", folded).strip("_")
+
+
+def _fold(name: str) -> str:
+    # As `_fold_script`, with Arabic spelled in Latin
+    return _SEPARATORS.sub("_", _fold_script(name).translate(_ARABIC_TO_LATIN)).strip("_")
+
+
+_ALIASES: Dict[str, str] = {}
+for _key, _names in CITY_NAMES.items():
+    _ALIASES[_fold(_key)] = _key
+    for _name in _names:
+        _ALIASES[_fold(_name)] = _key
+
+
+def normalize_city(name: str) -> str:
+    """
+    Canonical key of a city name; unknown cities get their folded form
+    """
+    folded = _fold(name)
+    return _ALIASES.get(folded, folded)
+
+
+def city_name(key: str) -> str:
+    names = CITY_NAMES.get(key)
+    return names[0] if names else key
+
+
+class CityPrefixIndex:
+    """
+    Sorted folded names answering prefix queries with a binary search.
+
+    Names keep their script here, so a Latin prefix such as "al" does not
+    match every Arabic name that starts with the article.
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[str, str, str]] = []
+
+    def build(self, extra_cities: Iterable[str] = ()):
+        entries = set()
+        for key, names in CITY_NAMES.items():
+            entries.add((key, key, names[0]))
+            for name in names:
+                entries.add((_fold_script(name), key, name))
+        for name in extra_cities:
+            key = normalize_city(name)
+            if key and key not in CITY_NAMES:
+                entries.add((_fold_script(name), key, name))
+        self._entries = sorted(entries)
+
+    def add(self, name: str):
+        """
+        Make a newly seen city suggestible
+        """
+        key = normalize_city(name)
+        if not key or key in CITY_NAMES:
+            return
+        entry = (_fold_script(name), key, name)
+        position = bisect_left(self._entries, entry)
+        if position == len(self._entries) or self._entries[position] != entry:
+            self._entries.insert(position, entry)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+        folded = _fold_script(prefix)
+        if not folded:
+            return []
+        suggestions = []
+        seen = set()
+        position = bisect_left(self._entries, (folded,))
+        while position < len(self._entries) and len(suggestions) < limit:
+            alias, key, name = self._entries[position]
+            if not alias.startswith(folded):
+                break
+            if key not in seen:
+                seen.add(key)
+                display = city_name(key) if key in CITY_NAMES else name
+                suggestions.append({"key": key, "name": display, "matched": name})
+            position += 1
+        return suggestions
+
+
+async def backfill_city_keys(db) -> int:
+    """
+    Store canonical city keys on hotels and routes that lack them or carry
+    a key the aliases no longer give, and on the route snapshots of their trips
+    """
+    updated = 0
+    for collection, field in (
+        (db.hotels, "city"),
+        (db.bus_routes, "origin_city"),
+        (db.bus_routes, "destination_city"),
+    ):
+        key_field = f"{field}_key"
+        # One pass per field over the distinct (name, stored key) pairs
+        async for row in collection.aggregate([
+            {"$group": {"_id": {"name": f"${field}", "key": f"${key_field}"}}}
+        ]):
+            name, stored = row["_id"].get("name"), row["_id"].get("key")
+            if not isinstance(name, str) or stored == normalize_city(name):
+                continue
+            stale = {field: name, key_field: stored}
+            key = normalize_city(name)
+            if collection.name == "bus_routes":
+                route_ids = await collection.distinct("id", stale)
+                await db.bus_trips.update_many(
+                    {"route_id": {"$in": route_ids}}, {"$set": {f"route.{key_field}": key}}
+                )
+            result = await collection.update_many(stale, {"$set": {key_field: key}})
+            updated += result.modified_count
+    return updated
+
+
+async def known_city_names(db) -> List[str]:
+    return (
+        await db.hotels.distinct("city")
+        + await db.bus_routes.distinct("origin_city")
+        + await db.bus_routes.distinct("destination_city")
+    )
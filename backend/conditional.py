@@ -0,0 +1,91 @@
+"""
+Conditional GETs for public resources.
+
+Handlers hand the documents behind a response to `conditional_response`
+before building any model. It derives a weak ETag from the documents' ids
+and `updated_at` stamps, or from a hash of their BSON when some have no
+stamp, and a Last-Modified from the latest stamp. A request whose
+If-None-Match (or, without one, If-Modified-Since) still matches gets a 304
+straight away, so the body is never serialized; otherwise the validators and
+a public Cache-Control are set on the handler's `response` for
+`json_response` to carry over. The short max-age lets the nginx front proxy
+micro-cache these responses and revalidate them with the same validators.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import bson
+from fastapi import Request, Response, status
+
+Document = Dict[str, Any]
+
+
+def entity_tag(documents: List[Document], *parts: bytes) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part)
+    if all(isinstance(document.get("updated_at"), datetime) for document in documents):
+        for document in documents:
+            digest.update(f"{document['id']}:{document['updated_at'].isoformat()};".encode())
+    else:
+        for document in documents:
+            digest.update(bson.encode(document))
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+def last_modified(documents: List[Document]) -> Optional[datetime]:
+    stamps = [document.get("updated_at") for document in documents]
+    if not stamps or not all(isinstance(stamp, datetime) for stamp in stamps):
+        return None
+    # Stored stamps are naive UTC; HTTP dates have whole seconds
+    return max(stamps).replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def _tags(header: str) -> List[str]:
+    return [tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()]
+
+
+def _not_modified(request: Request, etag: str, modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = _tags(if_none_match)
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return modified <= since
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    documents: Iterable[Document],
+    max_age: int
+) -> Optional[Response]:
+    """
+    Set the validators of `documents` on `response` and return a 304 if the
+    request already holds them; None means the handler sends the body
+    """
+    documents = list(documents)
+    # Headers the handler already set, such as the next page cursor, are part of the representation
+    etag = entity_tag(documents, *(name + b":" + value for name, value in response.headers.raw))
+    modified = last_modified(documents)
+    response.headers["ETag"] = etag
+    if modified is not None:
+        response.headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    response.headers["Cache-Control"] = f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+    if not _not_modified(request, etag, modified):
+        return None
+    not_modified = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    not_modified.headers.raw.extend(
+        (name, value) for name, value in response.headers.raw if name != b"content-length"
+    )
+    return not_modified
@@ -0,0 +1,397 @@
+"""
+Synthetic dataset generator for load testing.
+
+Generates bus companies, routes, trips (with seat maps and sold seats),
+ticket bookings, users, hotels, rooms and historical hotel bookings from a
+seeded random generator, and streams them to Mongo in concurrent unordered
+`insert_many` batches. The same arguments, including --start-date, always
+produce the same documents. Indexes are built once the data is loaded.
+
+    python generate_dataset.py --drop --cities 40 --companies 30 --days 60 \\
+        --trips-per-day 6 --hotels 5000 --rooms-per-hotel 40 --bookings 2000000
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+from bson.int64 import Int64
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from passlib.context import CryptContext
+
+from cities import CITIES, city_name, normalize_city
+from indexes import ensure_indexes
+from room_inventory import stay_nights
+from seat_map import WORD_BITS, new_seat_map, word_count
+from trip_snapshots import company_snapshot, route_snapshot
+
+Document = Dict[str, Any]
+
+COLLECTIONS = [
+    "users", "hotels", "rooms", "bookings", "room_nights",
+    "bus_companies", "bus_routes", "bus_trips", "bus_seats", "bus_ticket_bookings",
+]
+
+BUS_TYPES = [("standard", 50, 1.0, 0.6), ("premium", 40, 1.5, 0.3), ("vip", 30, 2.0, 0.1)]
+BUS_FEATURES = {
+    "standard": ["مكيف"],
+    "premium": ["مكيف", "واي فاي", "مقاعد مريحة"],
+    "vip": ["مكيف", "واي فاي", "مقاعد مريحة", "شاشات فردية", "وجبة خفيفة", "مشروبات"],
+}
+HOTEL_AMENITIES = [
+    "واي فاي مجاني", "مسبح", "مطعم", "صالة رياضية", "موقف سيارات",
+    "خدمة الغرف", "مركز أعمال", "إطلالة على البحر", "نادي صحي", "تكييف",
+]
+HOTEL_PARAGRAPHS = [
+    "فندق يقع في قلب المدينة، على مقربة من أهم المعالم السياحية والمراكز التجارية.",
+    "جميع الغرف مجهزة بتكييف الهواء، تلفزيون بشاشة مسطحة، وحمام خاص مع خدمة الواي فاي المجانية.",
+    "يضم الفندق مطاعم تقدم المأكولات الجزائرية والعالمية، بالإضافة إلى مقهى وصالة للمناسبات.",
+    "يعتبر الفندق خياراً مثالياً لرجال الأعمال والعائلات على حد سواء، مع خدمة استقبال على مدار الساعة.",
+    "يقع الفندق على بعد دقائق من محطة الحافلات والمطار، ويوفر خدمة نقل عند الطلب.",
+]
+ROOM_TYPES = [("غرفة قياسية", 2, 1.0), ("غرفة ديلوكس", 2, 1.4), ("غرفة عائلية", 4, 1.8)]
+FIRST_NAMES = ["محمد", "أمين", "ياسين", "سارة", "مريم", "خديجة", "عبد الله", "ليلى", "كريم", "نور"]
+LAST_NAMES = ["بن علي", "بوزيد", "حداد", "سعدي", "مرابط", "زروقي", "بلقاسم", "عمراني"]
+
+
+def new_id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def phone_number(rng: random.Random) -> str:
+    return f"0{rng.choice('567')}{rng.randint(10000000, 99999999)}"
+
+
+def full_name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def distance_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    # Great-circle distance with a road detour factor
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h)) * 1.25
+
+
+class BulkWriter:
+    """
+    Buffers documents per collection and writes full batches concurrently,
+    with at most `concurrency` batches in flight
+    """
+
+    def __init__(self, db, batch_size: int, concurrency: int):
+        self.db = db
+        self.batch_size = batch_size
+        self.inserted: Counter = Counter()
+        self._buffers: Dict[str, List[Document]] = {}
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: List[asyncio.Task] = []
+
+    async def add(self, collection: str, document: Document):
+        buffer = self._buffers.setdefault(collection, [])
+        buffer.append(document)
+        if len(buffer) >= self.batch_size:
+            self._buffers[collection] = []
+            await self._submit(collection, buffer)
+
+    async def flush(self):
+        for collection, buffer in list(self._buffers.items()):
+            if buffer:
+                self._buffers[collection] = []
+                await self._submit(collection, buffer)
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+
+    async def _submit(self, collection: str, batch: List[Document]):
+        await self._slots.acquire()
+        self._tasks.append(asyncio.create_task(self._insert(collection, batch)))
+        # Let the batch reach the driver before generating the next one
+        await asyncio.sleep(0)
+
+    async def _insert(self, collection: str, batch: List[Document]):
+        try:
+            await self.db[collection].insert_many(batch, ordered=False)
+            self.inserted[collection] += len(batch)
+        finally:
+            self._slots.release()
+
+
+class DatasetGenerator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.start = datetime.combine(args.start_date, datetime.min.time())
+        self.cities = self._cities(args.cities)
+        self.user_ids: List[str] = []
+
+    def _cities(self, count: int) -> List[Tuple[str, Tuple[float, float]]]:
+        # Known cities first, then synthetic ones; coordinates across northern Algeria
+        names = [city_name(key) for key in CITIES[:count]]
+        names += [f"Ville {n}" for n in range(len(names) + 1, count + 1)]
+        return [(name, (self.rng.uniform(34.5, 37.0), self.rng.uniform(-1.5, 8.5))) for name in names]
+
+    def users(self, password_hash: str) -> Iterator[Tuple[str, Document]]:
+        for n in range(self.args.users):
+            user_id = new_id(self.rng)
+            self.user_ids.append(user_id)
+            created = self.start - timedelta(days=self.rng.randint(1, 730))
+            yield "users", {
+                "id": user_id,
+                "email": f"user{n}@example.com",
+                "full_name": full_name(self.rng),
+                "phone_number": phone_number(self.rng),
+                "hashed_password": password_hash,
+                "is_active": True,
+                "created_at": created,
+                "updated_at": created,
+            }
+
+    def bus_network(self) -> Iterator[Tuple[str, Document]]:
+        rng = self.rng
+        companies = {}
+        for n in range(1, self.args.companies + 1):
+            company_id = new_id(rng)
+            companies[company_id] = {
+                "id": company_id,
+                "name": f"شركة النقل {n}",
+                "logo": None,
+                "description": "خدمات نقل آمنة وموثوقة بين المدن",
+                "created_at": self.start,
+                "updated_at": self.start,
+            }
+            yield "bus_companies", companies[company_id]
+
+        company_ids = list(companies)
+        for origin, origin_position in self.cities:
+            for destination, destination_position in self.cities:
+                if origin == destination:
+                    continue
+                distance = round(distance_km(origin_position, destination_position))
+                for company_id in rng.sample(company_ids, min(self.args.companies_per_route, len(company_ids))):
+                    route = {
+                        "id": new_id(rng),
+                        "company_id": company_id,
+                        "origin_city": origin,
+                        "destination_city": destination,
+                        "origin_city_key": normalize_city(origin),
+                        "destination_city_key": normalize_city(destination),
+                        "distance_km": distance,
+                        "duration_minutes": int(distance * 1.2),
+                        "created_at": self.start,
+                        "updated_at": self.start,
+                    }
+                    yield "bus_routes", route
+                    yield from self.trips(route, companies[company_id])
+
+    def trips(self, route: Document, company: Document) -> Iterator[Tuple[str, Document]]:
+        rng = self.rng
+        spacing = 16 * 60 // self.args.trips_per_day
+        for day in range(self.args.days):
+            for slot in range(self.args.trips_per_day):
+                bus_type, total_seats, multiplier, _ = rng.choices(BUS_TYPES, weights=[t[3] for t in BUS_TYPES])[0]
+                departure_minutes = 6 * 60 + slot * spacing + rng.choice((0, 15, 30, 45))
+                arrival_minutes = (departure_minutes + route["duration_minutes"]) % (24 * 60)
+                departure = self.start + timedelta(days=day, minutes=departure_minutes)
+                price = round(route["distance_km"] * 0.5 * multiplier, 2)
+
+                trip_id = new_id(rng)
+                sold_count = min(total_seats, int(total_seats * rng.uniform(0, 2 * self.args.occupancy)))
+                sold_seats = rng.sample(range(1, total_seats + 1), sold_count)
+                sold = [0] * word_count(total_seats)
+                for number in sold_seats:
+                    sold[(number - 1) // WORD_BITS] |= 1 << ((number - 1) % WORD_BITS)
+                seat_map = new_seat_map(total_seats, price, bus_type)
+                seat_map["sold"] = [Int64(word) for word in sold]
+
+                yield "bus_trips", {
+                    "id": trip_id,
+                    "route_id": route["id"],
+                    "company_id": route["company_id"],
+                    "bus_type": bus_type,
+                    "departure_date": departure,
+                    "departure_time": f"{departure_minutes // 60:02d}:{departure_minutes % 60:02d}",
+                    "arrival_time": f"{arrival_minutes // 60:02d}:{arrival_minutes % 60:02d}",
+                    "available_seats": total_seats - sold_count,
+                    "total_seats": total_seats,
+                    "price": price,
+                    "features": BUS_FEATURES[bus_type],
+                    "seat_map": seat_map,
+                    "route": route_snapshot(route),
+                    "company": company_snapshot(company),
+                    "created_at": self.start,
+                    "updated_at": self.start,
+                }
+
+                for number in sold_seats:
+                    booked = departure - timedelta(days=rng.randint(1, 30), minutes=rng.randint(0, 1439))
+                    yield "bus_ticket_bookings", {
+                        "id": new_id(rng),
+                        "user_id": rng.choice(self.user_ids),
+                        "trip_id": trip_id,
+                        "passenger_name": full_name(rng),
+                        "passenger_phone": phone_number(rng),
+                        "seat_number": str(number),
+                        "price": price,
+                        "booking_date": booked,
+                        "status": "confirmed",
+                        "created_at": booked,
+                        "updated_at": booked,
+                    }
+
+    def hotels(self) -> Iterator[Tuple[str, Document]]:
+        rng = self.rng
+        rooms_total = self.args.hotels * self.args.rooms_per_hotel
+        bookings_per_room = self.args.bookings / rooms_total if rooms_total else 0
+        for n in range(1, self.args.hotels + 1):
+            city, (latitude, longitude) = rng.choice(self.cities)
+            stars = rng.choices((2, 3, 4, 5), weights=(2, 4, 3, 1))[0]
+            hotel = {
+                "id": new_id(rng),
+                "name": f"فندق {city} {n}",
+                "city": city,
+                "city_key": normalize_city(city),
+                "address": f"شارع {rng.randint(1, 200)}، {city}",
+                "description": "\n\n".join(rng.sample(HOTEL_PARAGRAPHS, 3)),
+                "stars": stars,
+                "amenities": rng.sample(HOTEL_AMENITIES, rng.randint(3, 7)),
+                "images": [f"https://images.example.com/hotels/{n}/{i}.jpg" for i in range(rng.randint(3, 6))],
+                "rating": round(rng.uniform(2.5, 5.0), 1),
+                "reviews_count": rng.randint(0, 500),
+                "latitude": round(latitude + rng.uniform(-0.05, 0.05), 4),
+                "longitude": round(longitude + rng.uniform(-0.05, 0.05), 4),
+                "created_at": self.start,
+                "updated_at": self.start,
+            }
+            yield "hotels", hotel
+
+            for _ in range(self.args.rooms_per_hotel):
+                room_name, capacity, multiplier = rng.choice(ROOM_TYPES)
+                room = {
+                    "id": new_id(rng),
+                    "hotel_id": hotel["id"],
+                    "name": room_name,
+                    "description": "غرفة مريحة مجهزة بتكييف الهواء وتلفزيون وحمام خاص",
+                    "price_per_night": float(round(2000 * stars * multiplier, -2)),
+                    "capacity": capacity,
+                    "available": True,
+                    "images": [],
+                }
+                yield "rooms", room
+                # Round the fractional share of bookings up or down at random
+                count = int(bookings_per_room) + (rng.random() < bookings_per_room % 1)
+                yield from self.room_bookings(room, count)
+
+    def room_bookings(self, room: Document, count: int) -> Iterator[Tuple[str, Document]]:
+        # Back-to-back stays with gaps, ending around the end of the schedule
+        rng = self.rng
+        today = self.start.date()
+        cursor = today - timedelta(days=self.args.history_days)
+        for _ in range(count):
+            check_in = cursor + timedelta(days=rng.randint(0, 4))
+            nights = rng.randint(1, 6)
+            check_out = check_in + timedelta(days=nights)
+            cursor = check_out
+            if check_out <= today:
+                booking_status = "completed"
+            else:
+                booking_status = rng.choices(("confirmed", "pending", "canceled"), weights=(7, 2, 1))[0]
+            created = datetime.combine(check_in, datetime.min.time()) - timedelta(days=rng.randint(1, 60))
+            booking_id = new_id(rng)
+            yield "bookings", {
+                "id": booking_id,
+                "user_id": rng.choice(self.user_ids),
+                "hotel_id": room["hotel_id"],
+                "room_id": room["id"],
+                "check_in_date": datetime.combine(check_in, datetime.min.time()),
+                "check_out_date": datetime.combine(check_out, datetime.min.time()),
+                "guests_count": rng.randint(1, room["capacity"]),
+                "special_requests": None,
+                "status": booking_status,
+                "total_price": nights * room["price_per_night"],
+                "created_at": created,
+                "updated_at": created,
+                "nights_claimed": True,
+            }
+            if booking_status != "canceled" and check_out > today:
+                # Upcoming nights go into the room inventory
+                for night in stay_nights(max(check_in, today), check_out):
+                    yield "room_nights", {"room_id": room["id"], "night": night, "booking_id": booking_id}
+
+
+async def generate(args) -> Dict[str, Any]:
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ.get("DB_NAME", "dz_smart_booking")]
+
+    if args.drop:
+        for collection in COLLECTIONS:
+            await db.drop_collection(collection)
+
+    # Every generated user shares one password; hashing millions would take hours
+    password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(args.password)
+
+    generator = DatasetGenerator(args)
+    writer = BulkWriter(db, args.batch_size, args.concurrency)
+    started = time.perf_counter()
+    for stream in (generator.users(password_hash), generator.bus_network(), generator.hotels()):
+        for collection, document in stream:
+            await writer.add(collection, document)
+    await writer.flush()
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index_result = await ensure_indexes(db)
+    index_seconds = time.perf_counter() - started
+    client.close()
+
+    documents = sum(writer.inserted.values())
+    return {
+        "seed": args.seed,
+        "start_date": args.start_date.isoformat(),
+        "inserted": dict(writer.inserted),
+        "documents": documents,
+        "load_seconds": round(load_seconds, 1),
+        "documents_per_second": round(documents / load_seconds) if load_seconds else 0,
+        "indexes_created": len(index_result["created"]),
+        "index_seconds": round(index_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, default=len(CITIES))
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--companies-per-route", type=int, default=2,
+                        help="companies operating each origin/destination pair")
+    parser.add_argument("--days", type=int, default=30, help="days of bus schedule")
+    parser.add_argument("--trips-per-day", type=int, default=4, help="departures per route and day")
+    parser.add_argument("--occupancy", type=float, default=0.3, help="mean share of sold seats")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--password", default="password123", help="password of every generated user")
+    parser.add_argument("--hotels", type=int, default=1000)
+    parser.add_argument("--rooms-per-hotel", type=int, default=20)
+    parser.add_argument("--bookings", type=int, default=200000, help="hotel bookings across all rooms")
+    parser.add_argument("--history-days", type=int, default=365, help="days of booking history")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8, help="insert_many batches in flight")
+    parser.add_argument("--drop", action="store_true", help="drop the generated collections first")
+    args = parser.parse_args()
+
+    if args.cities < 2 or args.trips_per_day < 1 or args.users < 1:
+        parser.error("need at least 2 cities, 1 trip per day and 1 user")
+
+    print(json.dumps(asyncio.run(generate(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
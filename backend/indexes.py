@@ -0,0 +1,223 @@
+"""
+MongoDB index declarations and startup bootstrap.
+
+Every collection queried by server.py declares the indexes its lookups rely
+on. `ensure_indexes` creates whatever is missing at startup, and
+`index_usage_report` tells which endpoint queries can be answered from an
+index and which still fall back to a collection scan.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    keys: Tuple[Tuple[str, int], ...]
+    unique: bool = False
+
+
+@dataclass(frozen=True)
+class QueryShape:
+    endpoint: str
+    collection: str
+    fields: Tuple[str, ...]
+    # Fields matched with an unanchored regex cannot use an index
+    regex_fields: Tuple[str, ...] = field(default_factory=tuple)
+
+
+def _index(*fields: str, unique: bool = False) -> IndexSpec:
+    return IndexSpec(keys=tuple((name, ASCENDING) for name in fields), unique=unique)
+
+
+# Indexes required by the queries in server.py, per collection
+INDEX_SPECS: Dict[str, List[IndexSpec]] = {
+    "users": [
+        _index("id", unique=True),
+        _index("email", unique=True),
+    ],
+    "hotels": [
+        _index("id", unique=True),
+        _index("city_key"),
+    ],
+    "rooms": [
+        _index("id", unique=True),
+        _index("hotel_id", "capacity"),
+    ],
+    "bookings": [
+        _index("id", unique=True),
+        _index("user_id"),
+        _index("room_id"),
+        _index("check_out_date"),
+    ],
+    "room_nights": [
+        _index("room_id", "night", unique=True),
+        _index("booking_id"),
+    ],
+    "bus_companies": [
+        _index("id", unique=True),
+        _index("updated_at"),
+    ],
+    "bus_routes": [
+        _index("id", unique=True),
+        _index("updated_at"),
+        _index("company_id"),
+        _index("origin_city_key", "destination_city_key"),
+    ],
+    "bus_trips": [
+        _index("id", unique=True),
+        _index("route_id", "departure_date"),
+        _index("company_id"),
+        _index("route.origin_city_key", "route.destination_city_key", "departure_date"),
+    ],
+    "bus_seat_holds": [
+        _index("id", unique=True),
+        _index("expires_at"),
+    ],
+    "bus_ticket_bookings": [
+        _index("id", unique=True),
+        _index("user_id", "_id"),
+        _index("trip_id"),
+    ],
+}
+
+# Filter shapes issued by each endpoint (unfiltered listings are omitted)
+ENDPOINT_QUERIES: List[QueryShape] = [
+    QueryShape("POST /api/auth/register", "users", ("email",)),
+    QueryShape("POST /api/auth/login", "users", ("email",)),
+    QueryShape("get_current_user", "users", ("id",)),
+    QueryShape("GET /api/hotels", "hotels", ("city_key", "stars")),
+    QueryShape("GET /api/hotels/{hotel_id}", "hotels", ("id",)),
+    QueryShape("POST /api/search/hotels", "hotels", ("city_key",)),
+    QueryShape("POST /api/search/hotels", "rooms", ("hotel_id", "capacity")),
+    QueryShape("GET /api/rooms/hotel/{hotel_id}", "rooms", ("hotel_id",)),
+    QueryShape("POST /api/bookings", "rooms", ("id",)),
+    QueryShape("POST /api/search/hotels", "room_nights", ("room_id", "night")),
+    QueryShape("POST /api/bookings", "room_nights", ("booking_id",)),
+    QueryShape("GET /api/bookings/me", "bookings", ("user_id",)),
+    QueryShape("PUT /api/bookings/{booking_id}/cancel", "bookings", ("id", "user_id")),
+    QueryShape("PUT /api/bookings/{booking_id}/cancel", "room_nights", ("booking_id",)),
+    # Reference data: watermark poll, and lookups that miss the in-memory maps
+    QueryShape("refresh_reference_data", "bus_companies", ("updated_at",)),
+    QueryShape("refresh_reference_data", "bus_routes", ("updated_at",)),
+    QueryShape("GET /api/bus/companies/{company_id}", "bus_companies", ("id",)),
+    QueryShape("POST /api/bus/trips", "bus_routes", ("id",)),
+    QueryShape("GET /api/bus/trips", "bus_trips", ("route_id", "departure_date")),
+    QueryShape(
+        "GET /api/bus/trips", "bus_trips", ("route.origin_city_key", "route.destination_city_key", "departure_date")
+    ),
+    QueryShape(
+        "POST /api/bus/search", "bus_trips", ("route.origin_city_key", "route.destination_city_key", "departure_date")
+    ),
+    QueryShape(
+        "GET /api/bus/fare-calendar", "bus_trips",
+        ("route.origin_city_key", "route.destination_city_key", "departure_date")
+    ),
+    QueryShape("PUT /api/bus/companies/{company_id}", "bus_trips", ("company_id",)),
+    QueryShape("PUT /api/bus/routes/{route_id}", "bus_trips", ("route_id",)),
+    QueryShape("GET /api/bus/trips/{trip_id}", "bus_trips", ("id",)),
+    QueryShape("GET /api/bus/seats/{trip_id}", "bus_trips", ("id",)),
+    QueryShape("POST /api/bus/bookings", "bus_trips", ("id",)),
+    QueryShape("POST /api/bus/bookings/group", "bus_trips", ("id",)),
+    QueryShape("POST /api/bus/holds", "bus_trips", ("id",)),
+    QueryShape("POST /api/bus/holds/{hold_id}/book", "bus_seat_holds", ("id", "user_id", "expires_at")),
+    QueryShape("PUT /api/bus/holds/{hold_id}/cancel", "bus_seat_holds", ("id", "user_id")),
+    QueryShape("sweep_seat_holds", "bus_seat_holds", ("expires_at",)),
+    QueryShape("GET /api/bus/bookings/me", "bus_ticket_bookings", ("user_id", "_id")),
+    QueryShape("GET /api/bus/bookings/me", "bus_trips", ("id",)),
+    QueryShape("PUT /api/bus/bookings/{booking_id}/cancel", "bus_ticket_bookings", ("id", "user_id")),
+]
+
+
+def _key_fields(index_info: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(name for name, _ in index_info["key"])
+
+
+async def ensure_indexes(db) -> Dict[str, Any]:
+    """
+    Create every declared index that does not exist yet.
+
+    Returns a summary with the indexes created and any that failed (for
+    example a unique index over data that already contains duplicates).
+    """
+    created: List[str] = []
+    failed: List[Dict[str, str]] = []
+
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[collection_name]
+        existing = {
+            _key_fields(info) for info in (await collection.index_information()).values()
+        }
+        missing = [spec for spec in specs if tuple(name for name, _ in spec.keys) not in existing]
+
+        for spec in missing:
+            try:
+                name = await collection.create_index(list(spec.keys), unique=spec.unique)
+                created.append(f"{collection_name}.{name}")
+            except OperationFailure as e:
+                logger.error(f"Could not create index {spec.keys} on {collection_name}: {e}")
+                failed.append({"collection": collection_name, "keys": str(spec.keys), "error": str(e)})
+
+    if created:
+        logger.info(f"Created indexes: {', '.join(created)}")
+    return {"created": created, "failed": failed}
+
+
+def _coverage(shape: QueryShape, indexes: List[Tuple[Tuple[str, ...], bool]]) -> Tuple[str, Any]:
+    indexable = [name for name in shape.fields if name not in shape.regex_fields]
+    if not indexable:
+        return "collection_scan", None
+
+    best = None
+    for keys, unique in indexes:
+        # A unique index whose keys are all matched finds at most one document
+        if unique and all(name in indexable for name in keys):
+            return "covered", list(keys)
+        # Length of the index prefix made only of fields the query filters on
+        prefix = 0
+        for name in keys:
+            if name not in indexable:
+                break
+            prefix += 1
+        if prefix and (best is None or prefix > best[0]):
+            best = (prefix, keys)
+
+    if best is None:
+        return "collection_scan", None
+    if best[0] == len(indexable) and not shape.regex_fields:
+        return "covered", list(best[1])
+    return "partial", list(best[1])
+
+
+async def index_usage_report(db) -> List[Dict[str, Any]]:
+    """
+    Report, per endpoint query, whether an existing index serves it.
+
+    Status is `covered` when an index prefix matches every filtered field,
+    or a unique index matches on all of its keys, `partial` when only some
+    fields can use an index, and `collection_scan` otherwise.
+    """
+    existing: Dict[str, List[Tuple[Tuple[str, ...], bool]]] = {}
+    for collection_name in {shape.collection for shape in ENDPOINT_QUERIES}:
+        info = await db[collection_name].index_information()
+        existing[collection_name] = [
+            (_key_fields(index), name == "_id_" or bool(index.get("unique"))) for name, index in info.items()
+        ]
+
+    report = []
+    for shape in ENDPOINT_QUERIES:
+        coverage, index = _coverage(shape, existing[shape.collection])
+        report.append({
+            "endpoint": shape.endpoint,
+            "collection": shape.collection,
+            "fields": list(shape.fields),
+            "regex_fields": list(shape.regex_fields),
+            "status": coverage,
+            "index": index,
+        })
+    return report
@@ -0,0 +1,79 @@
+"""
+Cache invalidation across uvicorn workers.
+
+Every worker keeps its own in-process caches, so an entry dropped by one
+worker would live on in the others until it expires. With REDIS_URL set,
+`InvalidationChannel` publishes each dropped key on a Redis channel and every
+worker drops it from its own cache; whenever a worker (re)subscribes it
+clears the cache, since it may have missed messages meanwhile. Without Redis
+the workers cannot tell each other, and `local_caches_safe` reports that
+caches which must not outlive an invalidation stay off when more than one
+worker runs.
+"""
+import asyncio
+import logging
+import os
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Pause before subscribing again after the Redis connection broke
+RESUBSCRIBE_SECONDS = 1.0
+
+
+def redis_from_env():
+    redis_url = os.environ.get("REDIS_URL")
+    if not redis_url:
+        return None
+    import redis.asyncio as aioredis
+    return aioredis.from_url(redis_url)
+
+
+def worker_count() -> int:
+    # The launcher exports its worker count; uvicorn reads the same variable
+    return int(os.environ.get("WEB_CONCURRENCY") or 1)
+
+
+def local_caches_safe(redis) -> bool:
+    return redis is not None or worker_count() <= 1
+
+
+class InvalidationChannel:
+    def __init__(self, cache: TTLCache, name: str, redis=None):
+        self.cache = cache
+        self.name = name
+        self.redis = redis
+
+    async def invalidate(self, key: str):
+        """
+        Drop `key` here and in every other worker
+        """
+        self.cache.invalidate(key)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.publish(self.name, key)
+        except Exception as e:
+            logger.warning(f"Could not publish invalidation on {self.name}: {e}")
+
+    async def listen(self):
+        """
+        Drop the keys invalidated by other workers; runs until cancelled
+        """
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.name)
+                self.cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        key = message["data"]
+                        self.cache.invalidate(key.decode() if isinstance(key, bytes) else key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Lost subscription to {self.name}: {e}")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(RESUBSCRIBE_SECONDS)
@@ -0,0 +1,226 @@
+"""
+In-memory bus network for connecting itineraries.
+
+Every trip is a timed connection between two cities, kept per origin city
+sorted by departure. This is a time-expanded graph: a traveller at a city
+at time t can take any connection from that city departing at or after
+t plus the minimum connection time.
+
+The search is a multi-criteria label search over that graph. It keeps,
+per city, only itineraries that no other itinerary beats on departure,
+arrival, price and number of legs, so the fastest and the cheapest
+itineraries with up to K transfers fall out of the same search. Trips and
+routes are added as they are created and seat counts follow bookings, so
+the graph is never rebuilt per query.
+"""
+import heapq
+import logging
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between two legs
+MAX_CONNECTION_WAIT = timedelta(hours=12)
+
+
+@dataclass
+class Connection:
+    trip_id: str
+    route_id: str
+    company_id: str
+    origin: str
+    destination: str
+    origin_city: str
+    destination_city: str
+    departure: datetime
+    arrival: datetime
+    price: float
+    available_seats: int
+
+    def sort_key(self) -> Tuple[datetime, str]:
+        return self.departure, self.trip_id
+
+
+@dataclass(eq=False)
+class _Label:
+    legs: Tuple[Connection, ...]
+    city: str
+
+    @property
+    def departure(self) -> datetime:
+        return self.legs[0].departure
+
+    @property
+    def arrival(self) -> datetime:
+        return self.legs[-1].arrival
+
+    @property
+    def price(self) -> float:
+        return sum(leg.price for leg in self.legs)
+
+    def dominates(self, other: "_Label") -> bool:
+        return (
+            self.departure >= other.departure
+            and self.arrival <= other.arrival
+            and self.price <= other.price
+            and len(self.legs) <= len(other.legs)
+        )
+
+
+def trip_times(trip: Dict[str, Any], duration_minutes: Optional[int]) -> Tuple[datetime, datetime]:
+    """
+    Departure and arrival of a trip from its day, clock times and route duration
+    """
+    day = datetime.combine(trip["departure_date"].date(), datetime.min.time())
+    hours, minutes = (int(part) for part in trip["departure_time"].split(":")[:2])
+    departure = day + timedelta(hours=hours, minutes=minutes)
+    if duration_minutes:
+        return departure, departure + timedelta(minutes=duration_minutes)
+    # Without a route duration, arrival_time is the clock time, possibly the next day
+    hours, minutes = (int(part) for part in trip["arrival_time"].split(":")[:2])
+    arrival = day + timedelta(hours=hours, minutes=minutes)
+    if arrival <= departure:
+        arrival += timedelta(days=1)
+    return departure, arrival
+
+
+class ItineraryGraph:
+    def __init__(self):
+        self._routes: Dict[str, Dict[str, Any]] = {}
+        self._departures: Dict[str, List[Tuple[datetime, str]]] = {}
+        self._connections: Dict[str, Connection] = {}
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def add_route(self, route: Dict[str, Any]):
+        self._routes[route["id"]] = {
+            "origin": route["origin_city_key"],
+            "destination": route["destination_city_key"],
+            "origin_city": route["origin_city"],
+            "destination_city": route["destination_city"],
+            "duration_minutes": route.get("duration_minutes"),
+        }
+
+    def add_trip(self, trip: Dict[str, Any]):
+        route = self._routes.get(trip["route_id"])
+        if route is None:
+            return
+        if trip["id"] in self._connections:
+            self.remove_trip(trip["id"])
+        departure, arrival = trip_times(trip, route["duration_minutes"])
+        connection = Connection(
+            trip_id=trip["id"],
+            route_id=trip["route_id"],
+            company_id=trip["company_id"],
+            origin=route["origin"],
+            destination=route["destination"],
+            origin_city=route["origin_city"],
+            destination_city=route["destination_city"],
+            departure=departure,
+            arrival=arrival,
+            price=trip["price"],
+            available_seats=trip["available_seats"],
+        )
+        self._connections[connection.trip_id] = connection
+        insort(self._departures.setdefault(connection.origin, []), connection.sort_key())
+
+    def remove_trip(self, trip_id: str):
+        connection = self._connections.pop(trip_id, None)
+        if connection is None:
+            return
+        departures = self._departures[connection.origin]
+        position = bisect_left(departures, connection.sort_key())
+        if position < len(departures) and departures[position] == connection.sort_key():
+            del departures[position]
+
+    def set_seats(self, trip_id: str, available_seats: int):
+        connection = self._connections.get(trip_id)
+        if connection is not None:
+            connection.available_seats = available_seats
+
+    def adjust_seats(self, trip_id: str, delta: int):
+        connection = self._connections.get(trip_id)
+        if connection is not None:
+            connection.available_seats = max(0, connection.available_seats + delta)
+
+    def _departing(self, city: str, earliest: datetime, latest: datetime):
+        departures = self._departures.get(city, [])
+        position = bisect_left(departures, (earliest, ""))
+        while position < len(departures) and departures[position][0] <= latest:
+            yield self._connections[departures[position][1]]
+            position += 1
+
+    def search(
+        self,
+        origin: str,
+        destination: str,
+        day: datetime,
+        passengers_count: int = 1,
+        max_transfers: int = 2,
+        min_connection: timedelta = timedelta(minutes=30)
+    ) -> List[List[Connection]]:
+        """
+        Pareto-optimal itineraries leaving `origin` on `day`, each a list of legs
+        """
+        day_start = datetime.combine(day.date(), datetime.min.time())
+        day_end = day_start + timedelta(days=1) - timedelta(microseconds=1)
+        max_legs = max_transfers + 1
+
+        best: Dict[str, List[_Label]] = {}
+        queue: List[Tuple[datetime, int, _Label]] = []
+        counter = 0
+
+        def offer(label: _Label):
+            nonlocal counter
+            labels = best.setdefault(label.city, [])
+            if any(other.dominates(label) for other in labels):
+                return
+            labels[:] = [other for other in labels if not label.dominates(other)]
+            labels.append(label)
+            counter += 1
+            heapq.heappush(queue, (label.arrival, counter, label))
+
+        for connection in self._departing(origin, day_start, day_end):
+            if connection.available_seats >= passengers_count and connection.destination != origin:
+                offer(_Label(legs=(connection,), city=connection.destination))
+
+        while queue:
+            _, _, label = heapq.heappop(queue)
+            if all(other is not label for other in best[label.city]):
+                continue  # dominated after it was queued
+            if label.city == destination or len(label.legs) == max_legs:
+                continue
+            visited = {origin, *(leg.destination for leg in label.legs)}
+            earliest = label.arrival + min_connection
+            for connection in self._departing(label.city, earliest, label.arrival + MAX_CONNECTION_WAIT):
+                if connection.available_seats < passengers_count or connection.destination in visited:
+                    continue
+                offer(_Label(legs=label.legs + (connection,), city=connection.destination))
+
+        return [list(label.legs) for label in best.get(destination, [])]
+
+    async def load(self, db):
+        """
+        Load all routes and every trip that has not departed before today
+        """
+        fresh = ItineraryGraph()
+        async for route in db.bus_routes.find(
+            {},
+            {
+                "_id": 0, "id": 1, "duration_minutes": 1,
+                "origin_city": 1, "destination_city": 1, "origin_city_key": 1, "destination_city_key": 1
+            }
+        ):
+            fresh.add_route(route)
+        today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        async for trip in db.bus_trips.find(
+            {"departure_date": {"$gte": today}},
+            {"_id": 0, "seat_map": 0, "features": 0, "route": 0, "company": 0}
+        ):
+            fresh.add_trip(trip)
+        self._routes, self._departures, self._connections = fresh._routes, fresh._departures, fresh._connections
+        logger.info(f"Loaded {len(self)} bus connections into the itinerary graph")
@@ -0,0 +1,171 @@
+"""
+Production launcher.
+
+Runs the migrations once, starts server:app under uvicorn with one worker per
+CPU (or WEB_CONCURRENCY), waits until GET /api/ready succeeds, then starts
+nginx in front of it.
+SIGTERM/SIGINT shut down gracefully: nginx stops accepting connections and
+finishes its in-flight requests, then the uvicorn workers drain theirs.
+If either process dies, the other is stopped and the launcher exits 1.
+
+    python launcher.py --port 8001 --proxy "nginx -g 'daemon off;'"
+"""
+import argparse
+import logging
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import List, Optional
+
+ROOT_DIR = Path(__file__).parent
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("launcher")
+
+
+def default_workers() -> int:
+    return int(os.environ.get("WEB_CONCURRENCY", 0)) or os.cpu_count() or 1
+
+
+def uvicorn_command(args) -> List[str]:
+    return [
+        sys.executable, "-m", "uvicorn", "server:app",
+        "--host", args.host,
+        "--port", str(args.port),
+        "--workers", str(args.workers),
+        "--timeout-graceful-shutdown", str(args.graceful_timeout),
+        "--proxy-headers",
+        "--no-access-log",
+    ]
+
+
+def is_ready(url: str) -> bool:
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def wait_until_ready(backend: subprocess.Popen, url: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if backend.poll() is not None:
+            logger.error(f"Backend exited with status {backend.returncode} during startup")
+            return False
+        if is_ready(url):
+            return True
+        time.sleep(0.25)
+    logger.error(f"Backend not ready after {timeout:.0f}s")
+    return False
+
+
+def stop(process: Optional[subprocess.Popen], sig: int, timeout: float, name: str):
+    if process is None or process.poll() is not None:
+        return
+    logger.info(f"Stopping {name}")
+    process.send_signal(sig)
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.warning(f"{name} did not stop within {timeout:.0f}s, killing it")
+        process.kill()
+        process.wait()
+
+
+class Launcher:
+    def __init__(self, args):
+        self.args = args
+        self.backend: Optional[subprocess.Popen] = None
+        self.proxy: Optional[subprocess.Popen] = None
+        self.stopping = False
+
+    def handle_signal(self, signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, draining")
+        self.stopping = True
+
+    def shutdown(self):
+        # The proxy goes first so no new requests reach draining workers
+        stop(self.proxy, signal.SIGQUIT, self.args.graceful_timeout, "proxy")
+        stop(self.backend, signal.SIGTERM, self.args.graceful_timeout + 5, "backend")
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+
+        env = os.environ.copy()
+        # Workers size their per-process caches by how many of them there are
+        env["WEB_CONCURRENCY"] = str(self.args.workers)
+        if self.args.workers > 1:
+            if not env.get("REDIS_URL"):
+                logger.warning("No REDIS_URL: workers cannot share invalidations, so the "
+                               "bus search and principal caches are off")
+            # Each worker keeps its own in-memory indexes; keep them in step
+            env.setdefault("WORKER_INDEX_REFRESH_SECONDS", "15")
+            # Workers write metrics to a shared directory so /metrics sees all of them
+            env.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="prometheus-"))
+
+        # Migrations run once here rather than racing through every worker's startup
+        logger.info("Running migrations")
+        if subprocess.run([sys.executable, "migrations.py"], cwd=ROOT_DIR, env=env).returncode != 0:
+            logger.error("Migrations failed")
+            return 1
+        env["RUN_MIGRATIONS"] = "0"
+
+        logger.info(f"Starting backend with {self.args.workers} workers on port {self.args.port}")
+        started = time.monotonic()
+        self.backend = subprocess.Popen(uvicorn_command(self.args), cwd=ROOT_DIR, env=env)
+
+        ready_url = f"http://127.0.0.1:{self.args.port}/api/ready"
+        if not wait_until_ready(self.backend, ready_url, self.args.ready_timeout):
+            self.shutdown()
+            return 1
+        logger.info(f"Backend ready in {time.monotonic() - started:.1f}s")
+
+        if self.args.proxy:
+            self.proxy = subprocess.Popen(shlex.split(self.args.proxy))
+
+        while not self.stopping:
+            if self.backend.poll() is not None:
+                logger.error("Backend died, shutting down")
+                self.shutdown()
+                return 1
+            if self.proxy is not None and self.proxy.poll() is not None:
+                logger.error("Proxy died, shutting down")
+                self.shutdown()
+                return 1
+            time.sleep(0.5)
+
+        self.shutdown()
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="uvicorn workers, default WEB_CONCURRENCY or the CPU count")
+    parser.add_argument("--ready-timeout", type=float, default=120.0,
+                        help="seconds to wait for /api/ready")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds given to in-flight requests on shutdown")
+    parser.add_argument("--proxy", default="",
+                        help="command started once the backend is ready, e.g. nginx")
+    args = parser.parse_args()
+
+    sys.exit(Launcher(args).run())
+
+
+if __name__ == "__main__":
+    main()
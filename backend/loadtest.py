@@ -0,0 +1,343 @@
+"""
+Async load generator with weighted scenario mixes.
+
+Virtual users repeatedly pick a scenario by weight and run its requests
+against the API, for a fixed duration. After a warm-up period every
+request is recorded under its route template, and the run is summarised
+as per-endpoint throughput and p50/p95/p99 latency in JSON.
+
+Scenarios:
+    browse_hotels   hotel list, hotel page and its rooms
+    bus_search      city autocomplete, bus search and a trip page
+    booking_storm   seat bookings concentrated on a few hot trips
+    login_burst     password logins
+
+Against a running server:
+
+    python loadtest.py --base-url http://localhost:8001 --mix browse_hotels=6,bus_search=3,booking_storm=1
+
+Or start server:app locally for the run, save the result and compare it
+with an earlier one (exits 1 on a regression):
+
+    python loadtest.py --start-server --workers 2 --duration 60 --output run.json --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.stats import percentile
+
+ROOT_DIR = Path(__file__).parent
+
+SCENARIOS = ["browse_hotels", "bus_search", "booking_storm", "login_burst"]
+DEFAULT_MIX = "browse_hotels=5,bus_search=3,booking_storm=1,login_burst=1"
+
+# Statuses that are a normal outcome under load rather than an error
+EXPECTED_STATUSES = {
+    "POST /api/bus/bookings": {400},
+    "POST /api/auth/login": {503},
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class Recorder:
+    def __init__(self):
+        self.recording = False
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, seconds: float, status: str, error: bool):
+        if not self.recording:
+            return
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        codes = self.statuses.setdefault(endpoint, {})
+        codes[status] = codes.get(status, 0) + 1
+        if error:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, seconds: float) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            endpoints[endpoint] = {
+                "requests": len(latencies),
+                "throughput_rps": round(len(latencies) / seconds, 1),
+                "errors": self.errors.get(endpoint, 0),
+                "status_codes": self.statuses[endpoint],
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                "max_ms": round(max(latencies) * 1000, 2),
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            "requests": total,
+            "throughput_rps": round(total / seconds, 1),
+            "errors": sum(self.errors.values()),
+            "endpoints": endpoints,
+        }
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args, recorder: Recorder):
+        self.client = client
+        self.args = args
+        self.recorder = recorder
+        self.rng = random.Random(args.seed)
+        self.hotel_ids: List[str] = []
+        self.cities: List[str] = []
+        self.city_pairs: List[tuple] = []
+        self.hot_trips: List[Dict[str, Any]] = []
+        self.credentials: Dict[str, str] = {}
+        self.auth_headers: Dict[str, str] = {}
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(endpoint, time.perf_counter() - started, type(e).__name__, True)
+            return None
+        elapsed = time.perf_counter() - started
+        code = response.status_code
+        error = code >= 400 and code not in EXPECTED_STATUSES.get(endpoint, set())
+        self.recorder.record(endpoint, elapsed, str(code), error)
+        return response
+
+    async def setup(self):
+        """
+        Discover test data and create the load test user
+        """
+        response = await self.client.get("/api/hotels", params={"view": "summary", "limit": 100})
+        response.raise_for_status()
+        hotels = response.json()
+        self.hotel_ids = [hotel["id"] for hotel in hotels]
+        self.cities = sorted({hotel["city"] for hotel in hotels})
+
+        response = await self.client.get("/api/bus/routes", params={"limit": 500})
+        response.raise_for_status()
+        self.city_pairs = [(route["origin_city"], route["destination_city"]) for route in response.json()]
+
+        # A few hot trips concentrate bookings on the same seats
+        response = await self.client.get("/api/bus/trips", params={"view": "summary", "limit": 500})
+        response.raise_for_status()
+        trips = [trip for trip in response.json() if trip["available_seats"] > 0]
+        self.hot_trips = self.rng.sample(trips, min(self.args.hot_trips, len(trips)))
+
+        email = f"loadtest-{uuid.uuid4().hex[:12]}@example.com"
+        password = "loadtest-password"
+        response = await self.client.post("/api/auth/register", json={
+            "email": email,
+            "password": password,
+            "full_name": "Load Test",
+            "phone_number": "0555000000",
+        })
+        response.raise_for_status()
+        self.credentials = {"username": email, "password": password}
+        self.auth_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def browse_hotels(self):
+        params = {"view": "summary", "limit": 10}
+        if self.cities and self.rng.random() < 0.5:
+            params["city"] = self.rng.choice(self.cities)
+        await self.request("GET /api/hotels", "GET", "/api/hotels", params=params)
+        if not self.hotel_ids:
+            return
+        hotel_id = self.rng.choice(self.hotel_ids)
+        await self.request("GET /api/hotels/{hotel_id}", "GET", f"/api/hotels/{hotel_id}")
+        await self.request("GET /api/rooms/hotel/{hotel_id}", "GET", f"/api/rooms/hotel/{hotel_id}")
+
+    async def bus_search(self):
+        if not self.city_pairs:
+            return
+        origin, destination = self.rng.choice(self.city_pairs)
+        await self.request(
+            "GET /api/cities/suggest", "GET", "/api/cities/suggest", params={"q": origin[:3]}
+        )
+        departure = datetime.utcnow() + timedelta(days=self.rng.randint(0, self.args.search_days - 1))
+        response = await self.request("POST /api/bus/search", "POST", "/api/bus/search", json={
+            "origin_city": origin,
+            "destination_city": destination,
+            "departure_date": departure.strftime("%Y-%m-%dT00:00:00"),
+            "passengers_count": self.rng.randint(1, 3),
+        }, params={"view": "summary"})
+        if response is not None and response.status_code == 200 and response.json():
+            trip_id = self.rng.choice(response.json())["trip"]["id"]
+            await self.request("GET /api/bus/trips/{trip_id}", "GET", f"/api/bus/trips/{trip_id}")
+
+    async def booking_storm(self):
+        if not self.hot_trips:
+            return
+        trip = self.rng.choice(self.hot_trips)
+        # Seats are drawn from a narrow range so clients collide on them
+        seat_number = self.rng.randint(1, max(1, min(trip["available_seats"], 10)))
+        await self.request("POST /api/bus/bookings", "POST", "/api/bus/bookings", json={
+            "trip_id": trip["id"],
+            "passenger_name": "Load Test",
+            "passenger_phone": "0555000000",
+            "seat_number": str(seat_number),
+        }, headers=self.auth_headers)
+
+    async def login_burst(self):
+        await self.request("POST /api/auth/login", "POST", "/api/auth/login", data=self.credentials)
+
+    async def virtual_user(self, scenarios: List[Callable], weights: List[float], stop: asyncio.Event):
+        while not stop.is_set():
+            scenario = self.rng.choices(scenarios, weights=weights)[0]
+            await scenario()
+            if self.args.think_time:
+                await asyncio.sleep(self.rng.uniform(0, 2 * self.args.think_time))
+
+    async def run(self) -> Dict[str, Any]:
+        mix = self.args.mix
+        scenarios = [getattr(self, name) for name in mix]
+        weights = list(mix.values())
+
+        stop = asyncio.Event()
+        users = [
+            asyncio.create_task(self.virtual_user(scenarios, weights, stop))
+            for _ in range(self.args.concurrency)
+        ]
+        await asyncio.sleep(self.args.warmup)
+        self.recorder.recording = True
+        started = time.perf_counter()
+        await asyncio.sleep(self.args.duration)
+        self.recorder.recording = False
+        measured = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*users)
+
+        return {
+            "config": {
+                "base_url": self.args.base_url,
+                "mix": mix,
+                "concurrency": self.args.concurrency,
+                "duration_seconds": self.args.duration,
+                "warmup_seconds": self.args.warmup,
+                "seed": self.args.seed,
+            },
+            **self.recorder.summary(measured),
+        }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    List endpoints whose p95 latency or throughput got worse than `tolerance`
+    """
+    regressions = []
+    for endpoint, before in baseline["endpoints"].items():
+        after = result["endpoints"].get(endpoint)
+        if after is None:
+            continue
+        if after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {before['p95_ms']} ms -> {after['p95_ms']} ms")
+        if after["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{endpoint}: throughput {before['throughput_rps']} -> {after['throughput_rps']} req/s"
+            )
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{endpoint}: errors {before['errors']} -> {after['errors']}")
+    return regressions
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_up(base_url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server at {base_url} did not come up within {timeout:.0f}s")
+            await asyncio.sleep(0.2)
+
+
+async def main_async(args) -> Dict[str, Any]:
+    server = None
+    if args.start_server:
+        port = free_port()
+        args.base_url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=ROOT_DIR, env=os.environ.copy()
+        )
+    try:
+        await wait_until_up(args.base_url, args.startup_timeout)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+            load_test = LoadTest(client, args, Recorder())
+            await load_test.setup()
+            return await load_test.run()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--start-server", action="store_true", help="run server:app locally for the test")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --start-server")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"weighted scenarios, default {DEFAULT_MIX}")
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before recording")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between scenarios")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout")
+    parser.add_argument("--hot-trips", type=int, default=3, help="trips targeted by booking_storm")
+    parser.add_argument("--search-days", type=int, default=7, help="bus searches spread over this many days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="write the result JSON here")
+    parser.add_argument("--baseline", type=Path, help="earlier result to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    result = asyncio.run(main_async(args))
+    if args.baseline:
+        result["regressions"] = compare(result, json.loads(args.baseline.read_text()), args.tolerance)
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(output)
+    print(output)
+
+    if result.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
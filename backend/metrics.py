@@ -0,0 +1,174 @@
+"""
+Prometheus metrics.
+
+Request latency and in-flight requests are labelled with the route
+template (`/api/hotels/{hotel_id}`), never the raw path, so the number of
+series stays bounded. MongoDB command latency comes from the driver's
+command monitoring, labelled by collection and command. The password
+hashing pool reports how long calls wait for a worker and how many it refuses.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by the workers; /metrics then aggregates all of them.
+"""
+import os
+import time
+from typing import Dict, List, Optional, Pattern, Set, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from pymongo import monitoring
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSES = Counter(
+    "http_responses_total",
+    "HTTP responses by route template and status code",
+    ["method", "route", "status"],
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled, by route template",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+
+MONGO_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency by collection and command",
+    ["collection", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5),
+)
+MONGO_FAILURES = Counter(
+    "mongodb_command_failures_total",
+    "Failed MongoDB commands by collection and command",
+    ["collection", "command"],
+)
+
+PASSWORD_HASH_QUEUE_WAIT = Histogram(
+    "password_hash_queue_wait_seconds",
+    "Time password hashing and verification calls wait for a pool worker",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hashing and verification calls refused because the pool queue was full",
+)
+
+BOOKINGS_CREATED = Counter("bookings_created_total", "Bookings created", ["kind"])
+BOOKINGS_CANCELED = Counter("bookings_canceled_total", "Bookings canceled", ["kind"])
+SEATS_SOLD = Counter("bus_seats_sold_total", "Bus seats sold")
+SEARCH_CACHE_LOOKUPS = Counter("bus_search_cache_lookups_total", "Bus search cache lookups", ["result"])
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware recording latency, status and in-flight requests per route
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._static_routes: Optional[Dict[Tuple[str, str], str]] = None
+        self._dynamic_routes: List[Tuple[Pattern, Set[str], str]] = []
+
+    def _index_routes(self, router):
+        # Routes without path parameters resolve with one dict lookup,
+        # the others with their path regex
+        self._static_routes = {}
+        for route in router.routes:
+            methods = getattr(route, "methods", None) or set()
+            if "{" in route.path:
+                self._dynamic_routes.append((route.path_regex, methods, route.path))
+            else:
+                for method in methods:
+                    self._static_routes[(method, route.path)] = route.path
+
+    def _route_template(self, scope) -> str:
+        if self._static_routes is None:
+            self._index_routes(scope["app"].router)
+        method, path = scope["method"], scope["path"]
+        template = self._static_routes.get((method, path))
+        if template is not None:
+            return template
+        partial = UNMATCHED_ROUTE
+        for path_regex, methods, template in self._dynamic_routes:
+            if path_regex.match(path):
+                if method in methods:
+                    return template
+                # Path matched but not the method (405)
+                if partial == UNMATCHED_ROUTE:
+                    partial = template
+        return partial
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            RESPONSES.labels(method, route, str(status_code)).inc()
+            in_flight.dec()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Command listener timing every MongoDB command the client sends
+    """
+
+    def __init__(self):
+        self._collections: Dict[Tuple[int, int], str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[(event.request_id, event.operation_id)] = (
+            target if isinstance(target, str) else event.database_name
+        )
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.request_id, event.operation_id), "")
+        MONGO_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.request_id, event.operation_id), "")
+        MONGO_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_FAILURES.labels(collection, event.command_name).inc()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_stopped():
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,54 @@
+"""
+Startup migrations.
+
+Creates missing indexes and brings documents written by older versions up to
+date. Every step is idempotent. The production launcher runs them once before
+starting the uvicorn workers and tells the workers to skip them, so concurrent
+workers never race through the same backfill. A single server started on its
+own runs them in its startup hook.
+
+    python migrations.py
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from cities import backfill_city_keys
+from indexes import ensure_indexes
+from room_inventory import backfill_room_nights
+from seat_map import add_held_bitmaps, migrate_seat_documents
+from trip_snapshots import backfill_trip_snapshots
+
+ROOT_DIR = Path(__file__).parent
+
+logger = logging.getLogger(__name__)
+
+
+async def run_migrations(db):
+    await ensure_indexes(db)
+    await migrate_seat_documents(db)
+    await add_held_bitmaps(db)
+    await backfill_city_keys(db)
+    await backfill_trip_snapshots(db)
+    await backfill_room_nights(db)
+
+
+async def main():
+    load_dotenv(ROOT_DIR / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        await run_migrations(client[os.environ.get('DB_NAME', 'dz_smart_booking')])
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())
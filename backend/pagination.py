@@ -0,0 +1,89 @@
+"""
+Opaque cursors for keyset pagination.
+
+A cursor wraps the sort key of the last document on a page, so the next
+page starts with an indexed range query instead of skipping documents.
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Response, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    payload = json.dumps({"id": str(document["_id"])}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return ObjectId(payload["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+def keyset_filter(cursor: Optional[str], descending: bool = False) -> Dict[str, Any]:
+    """
+    Return the `_id` range condition that continues after `cursor`
+    """
+    if not cursor:
+        return {}
+    return {"_id": {"$lt" if descending else "$gt": decode_cursor(cursor)}}
+
+
+def split_page(documents: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Split a `limit + 1` result into the page and the cursor of the next one
+    """
+    if len(documents) > limit:
+        page = documents[:limit]
+        return page, encode_cursor(page[-1])
+    return documents, None
+
+
+async def find_page(
+    collection,
+    filter_query: Dict[str, Any],
+    cursor: Optional[str],
+    limit: int,
+    response: Response,
+    projection: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Fetch one page in `_id` order and set the next page's cursor header.
+    A projection must keep `_id`, which the cursor is built from.
+    """
+    query = {**filter_query, **keyset_filter(cursor)}
+    documents = await collection.find(query, projection).sort("_id", 1).limit(limit + 1).to_list(limit + 1)
+    page, next_cursor = split_page(documents, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return page
+
+
+def page_of(
+    documents: List[Dict[str, Any]],
+    cursor: Optional[str],
+    limit: int,
+    response: Response
+) -> List[Dict[str, Any]]:
+    """
+    In-memory counterpart of `find_page` over documents already in `_id` order
+    """
+    if cursor:
+        after = decode_cursor(cursor)
+        documents = [document for document in documents if document["_id"] > after]
+    page, next_cursor = split_page(documents[:limit + 1], limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return page
@@ -0,0 +1,95 @@
+"""
+Password hashing off the event loop.
+
+bcrypt takes tens to hundreds of milliseconds per call, so hashing and
+verification run on a dedicated thread pool (bcrypt releases the GIL). The
+number of calls waiting for a worker is bounded: beyond it callers get a
+503 instead of piling up, and the time each call spends queued is recorded
+in the stats and exported as a Prometheus histogram.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from metrics import PASSWORD_HASH_QUEUE_WAIT, PASSWORD_HASH_REJECTED
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHashingPool:
+    def __init__(self, context: CryptContext, workers: int, queue_limit: int):
+        self.context = context
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._pending = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, plain_password, hashed_password)
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self.workers + self.queue_limit:
+            self._rejected += 1
+            PASSWORD_HASH_REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, please retry",
+                headers={"Retry-After": "1"},
+            )
+
+        queued_at = time.perf_counter()
+
+        def timed_call():
+            self._record_wait(time.perf_counter() - queued_at)
+            return fn(*args)
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed_call)
+        finally:
+            self._pending -= 1
+
+    def _record_wait(self, seconds: float):
+        PASSWORD_HASH_QUEUE_WAIT.observe(seconds)
+        with self._lock:
+            self._wait_count += 1
+            self._wait_total += seconds
+            self._wait_max = max(self._wait_max, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": self._pending,
+                "rejected": self._rejected,
+                "queue_wait": {
+                    "count": self._wait_count,
+                    "total_seconds": round(self._wait_total, 6),
+                    "max_seconds": round(self._wait_max, 6),
+                },
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def pool_from_env(context: CryptContext) -> PasswordHashingPool:
+    workers = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+    queue_limit = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", 64))
+    return PasswordHashingPool(context, workers, queue_limit)
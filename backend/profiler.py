@@ -0,0 +1,210 @@
+"""
+Per-request MongoDB query profiler.
+
+A command listener attributes every MongoDB command to the request that
+issued it through a context variable, recording its count, total time and
+query shape (collection, command and filter with the values blanked out).
+
+- With DEBUG set, responses carry `Server-Timing: db;dur=<ms>;desc="<n> queries"`.
+- Commands slower than SLOW_QUERY_MS are logged with their shape.
+- A query shape repeated more than QUERY_REPEAT_THRESHOLD times in one
+  request is logged as a likely N+1.
+
+`assert_max_queries` bounds the number of queries per request in tests.
+"""
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+DEBUG = os.environ.get("DEBUG", "").lower() in ("1", "true", "yes")
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_MS", 100)) / 1000
+QUERY_REPEAT_THRESHOLD = int(os.environ.get("QUERY_REPEAT_THRESHOLD", 10))
+
+# Where each command keeps its filter
+_FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+}
+
+
+def _blank(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return {key: _blank(item) for key, item in value.items()}
+    if isinstance(value, list) and value and isinstance(value[0], Mapping):
+        return [_blank(item) for item in value]
+    return "?"
+
+
+def query_shape(command_name: str, command: Mapping[str, Any], database: str) -> str:
+    """
+    Describe a command without its values, e.g. `bus_trips.find {"id": "?"}`
+    """
+    target = command.get(command_name)
+    if command_name == "getMore":
+        target = command.get("collection")
+    collection = target if isinstance(target, str) else database
+
+    if command_name in _FILTER_FIELDS:
+        shape = _blank(command.get(_FILTER_FIELDS[command_name]) or {})
+    elif command_name in ("update", "delete"):
+        statements = command.get(command_name + "s") or [{}]
+        shape = _blank(statements[0].get("q") or {})
+    elif command_name == "aggregate":
+        shape = [
+            {stage: _blank(body) if stage == "$match" else "..."}
+            for step in command.get("pipeline", [])
+            for stage, body in step.items()
+        ]
+    else:
+        shape = {}
+    return f"{collection}.{command_name} {json.dumps(shape, sort_keys=True, default=str)}"
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, shape: str, seconds: float):
+        # Commands of one request may finish on several driver threads
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.shapes[shape] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.2f};desc="{self.count} queries"'
+
+    def describe(self) -> str:
+        return "\n".join(f"{count:4d} x {shape}" for shape, count in self.shapes.most_common())
+
+
+_current: ContextVar[Optional[QueryRecorder]] = ContextVar("query_recorder", default=None)
+_captures: List[List[QueryRecorder]] = []
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """
+    Command listener feeding the current request's recorder and the slow-query log
+    """
+
+    def __init__(self, slow_seconds: float = SLOW_QUERY_SECONDS):
+        self.slow_seconds = slow_seconds
+        self._pending: Dict[int, Tuple[Optional[QueryRecorder], str]] = {}
+
+    def started(self, event):
+        # Runs in the context of the request that sent the command
+        self._pending[event.request_id] = (
+            _current.get(),
+            query_shape(event.command_name, event.command, event.database_name),
+        )
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        pending = self._pending.pop(event.request_id, None)
+        if pending is None:
+            return
+        recorder, shape = pending
+        seconds = event.duration_micros / 1e6
+        if recorder is not None:
+            recorder.add(shape, seconds)
+        if seconds >= self.slow_seconds:
+            logger.warning(f"Slow query ({seconds * 1000:.1f} ms): {shape}")
+
+
+class QueryProfilerMiddleware:
+    """
+    ASGI middleware giving each request its own query recorder
+    """
+
+    def __init__(self, app, server_timing: bool = DEBUG, repeat_threshold: int = QUERY_REPEAT_THRESHOLD):
+        self.app = app
+        self.server_timing = server_timing
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        recorder = QueryRecorder()
+        token = _current.set(recorder)
+
+        async def send_wrapper(message):
+            if self.server_timing and message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Server-Timing", recorder.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            for shape, count in recorder.repeated(self.repeat_threshold):
+                logger.warning(f"{scope['method']} {scope['path']} ran the same query {count} times: {shape}")
+            for captured in _captures:
+                captured.append(recorder)
+
+
+@contextmanager
+def record_queries() -> Iterator[QueryRecorder]:
+    """
+    Record the queries issued by code awaited inside the block
+    """
+    recorder = QueryRecorder()
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def capture_requests() -> Iterator[List[QueryRecorder]]:
+    """
+    Collect the recorder of every request completed inside the block
+    """
+    captured: List[QueryRecorder] = []
+    _captures.append(captured)
+    try:
+        yield captured
+    finally:
+        _captures.remove(captured)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[List[QueryRecorder]]:
+    """
+    Fail if a request made inside the block ran more than `limit` queries:
+
+        with assert_max_queries(2):
+            client.get("/api/bus/bookings/me", headers=headers)
+    """
+    with capture_requests() as captured:
+        yield captured
+    for recorder in captured:
+        if recorder.count > limit:
+            raise AssertionError(
+                f"{recorder.count} queries, expected at most {limit}:\n{recorder.describe()}"
+            )
@@ -0,0 +1,56 @@
+"""
+List views and field selection for listing endpoints.
+
+`view=summary` returns the compact model a list card needs, `fields=a,b`
+returns just the named fields of the full model. Both are pushed down to
+Mongo as projections, so unused fields are never read off the wire.
+"""
+from enum import Enum
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+
+
+class ListView(str, Enum):
+    SUMMARY = "summary"
+    FULL = "full"
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """
+    Split a `fields=` parameter, always keeping `id`
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(model.model_fields))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return list(dict.fromkeys(["id", *requested]))
+
+
+def model_projection(model: Type[BaseModel], **overrides: Any) -> Dict[str, Any]:
+    """
+    Projection reading only the fields of `model`
+    """
+    return {**{field: 1 for field in model.model_fields}, **overrides}
+
+
+def list_projection(
+    view: ListView,
+    fields: Optional[List[str]],
+    summary_projection: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    if fields:
+        return {field: 1 for field in fields}
+    if view == ListView.SUMMARY:
+        return summary_projection
+    return None
+
+
+def pick(document: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    return {field: document[field] for field in fields if field in document}
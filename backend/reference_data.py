@@ -0,0 +1,133 @@
+"""
+In-memory reference data: bus companies and routes.
+
+Both collections are small and rarely change, so each worker keeps all of
+them in memory, indexed by id, by company and by (origin, destination) city
+keys, and serves listings, lookups and existence checks without a database
+round trip. Writes made by this worker are applied to the maps at once.
+Writes made by other workers are picked up by `refresh`, which polls a
+watermark (latest `updated_at` and document count of each collection, two
+indexed queries and two metadata counts) and reloads everything when it
+moved. Change streams would need a replica set; the poll does not.
+
+Lookups by id that miss fall back to MongoDB, so a document created by
+another worker since the last refresh is never reported missing.
+"""
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Document = Dict[str, Any]
+Watermark = Tuple[Any, ...]
+
+
+class ReferenceData:
+    def __init__(self, db):
+        self.db = db
+        self.watermark: Optional[Watermark] = None
+        self.loads = 0
+        self._companies: Dict[str, Document] = {}
+        self._routes: Dict[str, Document] = {}
+        self._company_list: List[Document] = []
+        self._routes_by_company: Dict[str, List[Document]] = {}
+        self._routes_by_cities: Dict[Tuple[str, str], List[Document]] = {}
+        self._route_list: List[Document] = []
+
+    async def load(self):
+        """
+        Load both collections and build the maps
+        """
+        watermark = await self._watermark()
+        companies = await self.db.bus_companies.find({}).to_list(None)
+        routes = await self.db.bus_routes.find({}).to_list(None)
+        self._companies = {company["id"]: company for company in companies}
+        self._routes = {route["id"]: route for route in routes}
+        self._reindex()
+        self.watermark = watermark
+        self.loads += 1
+        logger.info(f"Loaded {len(companies)} bus companies and {len(routes)} bus routes")
+
+    async def refresh(self) -> bool:
+        """
+        Reload if another worker changed either collection; True if it did
+        """
+        if await self._watermark() == self.watermark:
+            return False
+        await self.load()
+        return True
+
+    def companies(self) -> List[Document]:
+        return self._company_list
+
+    async def company(self, company_id: str) -> Optional[Document]:
+        company = self._companies.get(company_id)
+        if company is None:
+            company = await self.db.bus_companies.find_one({"id": company_id})
+            if company is not None:
+                self.put_company(company)
+        return company
+
+    def routes(
+        self,
+        origin_key: Optional[str] = None,
+        destination_key: Optional[str] = None,
+        company_id: Optional[str] = None
+    ) -> List[Document]:
+        """
+        Routes matching every given filter, in `_id` order
+        """
+        if origin_key and destination_key:
+            routes = self._routes_by_cities.get((origin_key, destination_key), [])
+        elif company_id:
+            routes = self._routes_by_company.get(company_id, [])
+        else:
+            routes = self._route_list
+        return [
+            route for route in routes
+            if (not origin_key or route["origin_city_key"] == origin_key)
+            and (not destination_key or route["destination_city_key"] == destination_key)
+            and (not company_id or route["company_id"] == company_id)
+        ]
+
+    async def route(self, route_id: str) -> Optional[Document]:
+        route = self._routes.get(route_id)
+        if route is None:
+            route = await self.db.bus_routes.find_one({"id": route_id})
+            if route is not None:
+                self.put_route(route)
+        return route
+
+    def put_company(self, company: Document):
+        """
+        Apply a company written by this worker; it must carry its `_id`
+        """
+        self._companies[company["id"]] = company
+        self._reindex()
+
+    def put_route(self, route: Document):
+        """
+        Apply a route written by this worker; it must carry its `_id`
+        """
+        self._routes[route["id"]] = route
+        self._reindex()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"companies": len(self._companies), "routes": len(self._routes), "loads": self.loads}
+
+    def _reindex(self):
+        self._company_list = sorted(self._companies.values(), key=lambda company: company["_id"])
+        self._route_list = sorted(self._routes.values(), key=lambda route: route["_id"])
+        by_company, by_cities = defaultdict(list), defaultdict(list)
+        for route in self._route_list:
+            by_company[route["company_id"]].append(route)
+            by_cities[(route.get("origin_city_key"), route.get("destination_city_key"))].append(route)
+        self._routes_by_company, self._routes_by_cities = dict(by_company), dict(by_cities)
+
+    async def _watermark(self) -> Watermark:
+        watermark = []
+        for collection in (self.db.bus_companies, self.db.bus_routes):
+            latest = await collection.find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)])
+            watermark += [latest and latest.get("updated_at"), await collection.estimated_document_count()]
+        return tuple(watermark)
@@ -0,0 +1,317 @@
+"""
+Contention-safe bus seat reservations.
+
+Seats are claimed with a single conditional update on the trip's seat map
+that only matches while all of their bits are clear, and decrements the
+trip's seat counter in the same write, so concurrent requests for the same
+seat cannot both win and the counter cannot drift. A group claims all of
+its seats in that one update or none of them, and its bookings are written
+with one bulk insert. The claim is undone if the bookings cannot be
+recorded.
+
+Seats can also be held during checkout: the hold sets the seats' held bits
+and records a bus_seat_holds document with an expiry. Booking, cancelling
+or expiring a hold first claims its document, marking its state and moving
+its expiry to a short lease, then changes the seat bits, and deletes the
+document last. A worker that fails in between leaves the claimed document
+behind, and once the lease runs out `expire_holds` frees its held seats, so
+held bits never outlive their document.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from seat_map import (
+    claim_query, claim_update, free_seat_run, release_query, release_update, seat_masks, seat_position, seat_price,
+    sell_held_update
+)
+
+logger = logging.getLogger(__name__)
+
+# Attempts at finding and claiming adjacent seats before giving up
+ADJACENT_CLAIM_ATTEMPTS = 3
+
+# Expired holds freed per sweep
+EXPIRED_HOLDS_BATCH = 500
+
+# How long a hold being booked or released is kept from the sweeper
+HOLD_CLAIM_LEASE = timedelta(seconds=60)
+
+
+class SeatReservationEngine:
+    def __init__(self, db):
+        self.db = db
+
+    async def reserve(
+        self,
+        trip: Dict[str, Any],
+        seat_number: str,
+        make_booking: Callable[[float], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Claim a seat on `trip` and record the booking built by `make_booking(price)`.
+
+        Raises 404 if the seat does not exist and 400 if it is already booked.
+        """
+        number = self._seat_number(trip, seat_number)
+        if not await self._claim(trip["id"], [number]):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Seat is already booked"
+            )
+
+        booking = make_booking(seat_price(trip["seat_map"], number))
+        try:
+            await self.db.bus_ticket_bookings.insert_one(booking)
+        except Exception:
+            logger.exception(f"Rolling back reservation of seat {seat_number} on trip {trip['id']}")
+            await self._free_seats(trip["id"], [number])
+            raise
+
+        return booking
+
+    async def reserve_group(
+        self,
+        trip: Dict[str, Any],
+        seat_numbers: List[str],
+        make_bookings: Callable[[List[int], List[float]], List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Claim all of `seat_numbers` on `trip` or none of them, and record the
+        bookings built by `make_bookings(seats, prices)`.
+
+        Raises 404 if a seat does not exist and 400 if any is already taken
+        or appears twice.
+        """
+        numbers = self._distinct_seat_numbers(trip, seat_numbers)
+        if not await self._claim(trip["id"], numbers):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="One or more seats are already booked"
+            )
+        return await self._record(trip, numbers, make_bookings)
+
+    async def reserve_adjacent(
+        self,
+        trip: Dict[str, Any],
+        count: int,
+        make_bookings: Callable[[List[int], List[float]], List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Claim `count` consecutive free seats on `trip` and record their bookings.
+
+        The run is picked from the trip's seat map; if another booking takes
+        one of its seats first, the seat map is read again and another run
+        tried. Raises 400 if no run of `count` free seats is left.
+        """
+        for _ in range(ADJACENT_CLAIM_ATTEMPTS):
+            numbers = free_seat_run(trip["seat_map"], trip["total_seats"], count)
+            if numbers is None:
+                break
+            if await self._claim(trip["id"], numbers):
+                return await self._record(trip, numbers, make_bookings)
+            trip = await self.db.bus_trips.find_one(
+                {"id": trip["id"]},
+                {"_id": 0, "id": 1, "total_seats": 1, "seat_map": 1}
+            )
+            if trip is None:
+                break
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"No {count} adjacent seats available"
+        )
+
+    async def hold(self, trip: Dict[str, Any], hold: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Hold the seats listed in `hold` until its `expires_at` and record it.
+
+        Raises 404 if a seat does not exist and 400 if any is taken or appears twice.
+        """
+        numbers = self._distinct_seat_numbers(trip, hold["seat_numbers"])
+        if not await self._claim(trip["id"], numbers, "held"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="One or more seats are not available"
+            )
+        try:
+            await self.db.bus_seat_holds.insert_one(hold)
+        except Exception:
+            logger.exception(f"Rolling back hold of seats {numbers} on trip {trip['id']}")
+            await self._free_seats(trip["id"], numbers, "held")
+            raise
+        return hold
+
+    async def book_hold(
+        self,
+        hold_id: str,
+        user_id: str,
+        make_bookings: Callable[[Dict[str, Any], List[int], List[float]], List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Turn an unexpired hold into bookings built by `make_bookings(hold, seats, prices)`.
+
+        Raises 404 if the user has no such hold, it has expired or its trip is
+        gone, and 409 if its seats are no longer held; no booking is recorded
+        then.
+        """
+        hold = await self._claim_hold(
+            {"id": hold_id, "user_id": user_id, "expires_at": {"$gt": datetime.utcnow()}}, "booking"
+        )
+        if hold is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Seat hold not found or expired"
+            )
+        trip = await self.db.bus_trips.find_one(
+            {"id": hold["trip_id"]},
+            {"_id": 0, "id": 1, "seat_map.classes": 1}
+        )
+        if trip is None:
+            await self._drop_hold(hold_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Bus trip not found"
+            )
+        numbers = [int(seat_number) for seat_number in hold["seat_numbers"]]
+        masks = seat_masks(numbers)
+        result = await self.db.bus_trips.update_one(
+            {"id": hold["trip_id"], **release_query(masks, "held")},
+            sell_held_update(masks)
+        )
+        if result.modified_count != 1:
+            # The seats are no longer held, so they cannot be sold from this hold
+            logger.warning(f"Seats {numbers} of hold {hold_id} on trip {trip['id']} were no longer held")
+            await self._drop_hold(hold_id)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Seat hold is no longer valid"
+            )
+        try:
+            return await self._record(trip, numbers, lambda seats, prices: make_bookings(hold, seats, prices))
+        finally:
+            # The seats are booked, or were freed again when the bookings could not be recorded
+            await self._drop_hold(hold_id)
+
+    async def cancel_hold(self, hold_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Give up a hold early; None if the user has no such hold
+        """
+        hold = await self._claim_hold({"id": hold_id, "user_id": user_id}, "releasing")
+        if hold is not None:
+            await self._free_seats(hold["trip_id"], [int(number) for number in hold["seat_numbers"]], "held")
+            await self._drop_hold(hold_id)
+        return hold
+
+    async def expire_holds(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Free the seats of holds that expired by `now` and return those holds.
+
+        Each hold is claimed with its own find-and-modify, so several workers
+        can sweep at once and a hold being booked is never freed. Holds whose
+        booking or release was left unfinished are swept once their lease
+        runs out; only holds whose seats were still held are returned.
+        """
+        now = now or datetime.utcnow()
+        expired = []
+        async for candidate in self.db.bus_seat_holds.find(
+            {"expires_at": {"$lte": now}}, {"_id": 0, "id": 1}
+        ).limit(EXPIRED_HOLDS_BATCH):
+            hold = await self._claim_hold(
+                {"id": candidate["id"], "expires_at": {"$lte": now}}, "releasing", now, unfinished=True
+            )
+            if hold is None:
+                continue
+            numbers = [int(number) for number in hold["seat_numbers"]]
+            if await self._free_seats(hold["trip_id"], numbers, "held"):
+                expired.append(hold)
+            await self._drop_hold(hold["id"])
+        return expired
+
+    async def _claim_hold(
+        self,
+        query: Dict[str, Any],
+        state: str,
+        now: Optional[datetime] = None,
+        unfinished: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Take a hold for booking or release, leasing it for HOLD_CLAIM_LEASE.
+
+        Only holds nobody has claimed yet match, unless `unfinished` also
+        lets the sweeper take claims whose lease ran out.
+        """
+        if not unfinished:
+            query = {**query, "state": {"$exists": False}}
+        return await self.db.bus_seat_holds.find_one_and_update(
+            query,
+            {"$set": {"state": state, "expires_at": (now or datetime.utcnow()) + HOLD_CLAIM_LEASE}},
+            {"_id": 0}
+        )
+
+    async def _drop_hold(self, hold_id: str):
+        await self.db.bus_seat_holds.delete_one({"id": hold_id})
+
+    async def release(self, trip_id: str, seat_number: str) -> bool:
+        """
+        Return a booked seat to the pool; False if it was not booked
+        """
+        if seat_position(seat_number) is None:
+            return False
+        return await self._free_seats(trip_id, [int(seat_number)])
+
+    def _seat_number(self, trip: Dict[str, Any], seat_number: str) -> int:
+        position = seat_position(seat_number, trip["total_seats"]) if "seat_map" in trip else None
+        if position is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Seat not found"
+            )
+        return int(seat_number)
+
+    def _distinct_seat_numbers(self, trip: Dict[str, Any], seat_numbers: List[str]) -> List[int]:
+        numbers = [self._seat_number(trip, seat_number) for seat_number in seat_numbers]
+        if len(set(numbers)) != len(numbers):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Seat numbers must be different"
+            )
+        return numbers
+
+    async def _claim(self, trip_id: str, numbers: List[int], bitmap: str = "sold") -> bool:
+        masks = seat_masks(numbers)
+        result = await self.db.bus_trips.update_one(
+            {"id": trip_id, **claim_query(masks)},
+            {**claim_update(masks, bitmap), "$inc": {"available_seats": -len(numbers)}}
+        )
+        return result.modified_count == 1
+
+    async def _record(
+        self,
+        trip: Dict[str, Any],
+        numbers: List[int],
+        make_bookings: Callable[[List[int], List[float]], List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        bookings = make_bookings(numbers, [seat_price(trip["seat_map"], number) for number in numbers])
+        try:
+            await self.db.bus_ticket_bookings.insert_many(bookings)
+        except Exception:
+            logger.exception(f"Rolling back reservation of seats {numbers} on trip {trip['id']}")
+            # Only this call's bookings: the seats it claimed on this trip
+            await self.db.bus_ticket_bookings.delete_many({
+                "id": {"$in": [booking["id"] for booking in bookings]},
+                "trip_id": trip["id"],
+                "seat_number": {"$in": [str(number) for number in numbers]},
+            })
+            await self._free_seats(trip["id"], numbers)
+            raise
+        return bookings
+
+    async def _free_seats(self, trip_id: str, numbers: List[int], bitmap: str = "sold") -> bool:
+        masks = seat_masks(numbers)
+        result = await self.db.bus_trips.update_one(
+            {"id": trip_id, **release_query(masks, bitmap)},
+            {**release_update(masks, bitmap), "$inc": {"available_seats": len(numbers)}}
+        )
+        return result.modified_count == 1
@@ -0,0 +1,140 @@
+"""
+Per-room, per-night hotel inventory.
+
+Every booked night is a room_nights document {room_id, night, booking_id}
+under a unique (room_id, night) index. A stay claims all of its nights with
+one unordered insert_many; if any night is already taken the insert reports
+a duplicate key and the nights it did write are deleted again, so a stay
+gets every night or none and two bookings can never share a night.
+Availability for a set of rooms is one indexed query on the same collection.
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Set, Union
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+def stay_nights(check_in: Union[date, datetime], check_out: Union[date, datetime]) -> List[datetime]:
+    """
+    Midnight of every night from check-in up to, not including, check-out
+    """
+    if isinstance(check_in, datetime):
+        check_in = check_in.date()
+    if isinstance(check_out, datetime):
+        check_out = check_out.date()
+    first = datetime.combine(check_in, datetime.min.time())
+    return [first + timedelta(days=offset) for offset in range((check_out - check_in).days)]
+
+
+class RoomInventory:
+    def __init__(self, db):
+        self.db = db
+
+    async def claim(
+        self,
+        room_id: str,
+        check_in: Union[date, datetime],
+        check_out: Union[date, datetime],
+        booking_id: str
+    ) -> bool:
+        """
+        Claim every night of the stay for `booking_id`; False if any is taken
+        by another booking.
+
+        Claiming a stay again is a no-op, so nights already held by the same
+        booking count as claimed. On failure only the nights this call wrote
+        are deleted, never those of an earlier or concurrent claim.
+        """
+        nights = [
+            {"room_id": room_id, "night": night, "booking_id": booking_id}
+            for night in stay_nights(check_in, check_out)
+        ]
+        if not nights:
+            # A stay within one day holds no night
+            return True
+        try:
+            await self.db.room_nights.insert_many(nights, ordered=False)
+            return True
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            failed = {error["index"] for error in errors}
+            duplicates_only = all(error["code"] == DUPLICATE_KEY for error in errors)
+            if duplicates_only and not await self._taken_by_others(
+                room_id, [nights[index]["night"] for index in failed], booking_id
+            ):
+                return True
+            written = [night["night"] for index, night in enumerate(nights) if index not in failed]
+            if written:
+                await self.db.room_nights.delete_many(
+                    {"room_id": room_id, "night": {"$in": written}, "booking_id": booking_id}
+                )
+            if duplicates_only:
+                return False
+            raise
+
+    async def release(self, booking_id: str) -> int:
+        """
+        Give back the nights held by a booking
+        """
+        result = await self.db.room_nights.delete_many({"booking_id": booking_id})
+        return result.deleted_count
+
+    async def free_rooms(
+        self,
+        room_ids: Iterable[str],
+        check_in: Union[date, datetime],
+        check_out: Union[date, datetime]
+    ) -> Set[str]:
+        """
+        The rooms among `room_ids` with every night of the stay free
+        """
+        room_ids = set(room_ids)
+        nights = stay_nights(check_in, check_out)
+        if not room_ids or not nights:
+            return room_ids
+        busy = await self.db.room_nights.distinct(
+            "room_id",
+            {"room_id": {"$in": list(room_ids)}, "night": {"$gte": nights[0], "$lte": nights[-1]}}
+        )
+        return room_ids - set(busy)
+
+    async def _taken_by_others(self, room_id: str, nights: List[datetime], booking_id: str) -> bool:
+        taken = await self.db.room_nights.find_one(
+            {"room_id": room_id, "night": {"$in": nights}, "booking_id": {"$ne": booking_id}},
+            {"_id": 1}
+        )
+        return taken is not None
+
+
+async def backfill_room_nights(db) -> Dict[str, Any]:
+    """
+    Claim the nights of active bookings made before the inventory existed.
+
+    Bookings whose nights overlap an earlier booking (overbookings taken
+    before the inventory) are reported and left unclaimed.
+    """
+    inventory = RoomInventory(db)
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    claimed = 0
+    conflicts: List[str] = []
+    async for booking in db.bookings.find(
+        {"check_out_date": {"$gt": today}, "status": {"$ne": "canceled"}, "nights_claimed": {"$exists": False}},
+        {"_id": 0, "id": 1, "room_id": 1, "check_in_date": 1, "check_out_date": 1}
+    ).sort("created_at", 1):
+        # Nights already behind us are not inventory any more
+        check_in = max(booking["check_in_date"], today)
+        if await inventory.claim(booking["room_id"], check_in, booking["check_out_date"], booking["id"]):
+            claimed += 1
+        else:
+            conflicts.append(booking["id"])
+        await db.bookings.update_one({"id": booking["id"]}, {"$set": {"nights_claimed": True}})
+    if claimed:
+        logger.info(f"Claimed room nights for {claimed} existing bookings")
+    if conflicts:
+        logger.warning(f"{len(conflicts)} existing bookings overlap earlier ones: {conflicts[:20]}")
+    return {"claimed": claimed, "conflicts": conflicts}
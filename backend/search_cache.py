@@ -0,0 +1,117 @@
+"""
+Result cache for bus searches.
+
+Results are keyed by (origin key, destination key, day, passengers) and
+tagged with a version per (origin, destination, day) bucket. Any change to
+a trip's seats bumps the version of its bucket, which makes every cached
+result for that bucket unreachable. A search reads the version before it
+queries Mongo and stores its result under that version, so a result
+computed concurrently with a booking can never be served after it.
+
+Entries live in an in-process TTL cache and, when REDIS_URL is set, in
+Redis as well; the Redis tier also holds the bucket versions, so every
+worker sees an invalidation immediately. Without Redis the versions exist
+only in each process, so with several workers the cache is turned off
+rather than serve trips another worker has just sold out.
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+
+from cache import TTLCache
+from invalidation import local_caches_safe
+
+logger = logging.getLogger(__name__)
+
+Bucket = Tuple[str, str, str]
+
+
+def search_bucket(origin_key: str, destination_key: str, departure_date: datetime) -> Bucket:
+    return origin_key, destination_key, departure_date.strftime("%Y-%m-%d")
+
+
+class BusSearchCache:
+    def __init__(self, maxsize: int, ttl: float, redis=None):
+        self.local: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.redis = redis
+        self._versions: Dict[Bucket, int] = {}
+        self.redis_hits = 0
+        self.redis_errors = 0
+
+    async def version(self, bucket: Bucket) -> int:
+        if self.redis is not None:
+            try:
+                value = await self.redis.get(self._version_key(bucket))
+                return int(value or 0)
+            except Exception as e:
+                self._redis_failed(e)
+        return self._versions.get(bucket, 0)
+
+    async def get(self, bucket: Bucket, version: int, passengers_count: int) -> Optional[List[Dict[str, Any]]]:
+        key = (bucket, version, passengers_count)
+        results = self.local.get(key)
+        if results is not None or self.redis is None:
+            return results
+
+        try:
+            raw = await self.redis.get(self._entry_key(*key))
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+        if raw is None:
+            return None
+        self.redis_hits += 1
+        results = json_util.loads(raw)
+        self.local.set(key, results)
+        return results
+
+    async def set(self, bucket: Bucket, version: int, passengers_count: int, results: List[Dict[str, Any]]):
+        key = (bucket, version, passengers_count)
+        self.local.set(key, results)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self._entry_key(*key), json_util.dumps(results), ex=int(self.ttl))
+            except Exception as e:
+                self._redis_failed(e)
+
+    async def invalidate(self, bucket: Bucket):
+        self._versions[bucket] = self._versions.get(bucket, 0) + 1
+        if self.redis is not None:
+            try:
+                await self.redis.incr(self._version_key(bucket))
+            except Exception as e:
+                self._redis_failed(e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.local.stats(),
+            "redis_enabled": self.redis is not None,
+            "redis_hits": self.redis_hits,
+            "redis_errors": self.redis_errors,
+        }
+
+    def _version_key(self, bucket: Bucket) -> str:
+        return "bus-search:version:" + ":".join(bucket)
+
+    def _entry_key(self, bucket: Bucket, version: int, passengers_count: int) -> str:
+        return f"bus-search:{':'.join(bucket)}:{version}:{passengers_count}"
+
+    def _redis_failed(self, error: Exception):
+        self.redis_errors += 1
+        logger.warning(f"Bus search cache Redis tier unavailable: {error}")
+
+
+def cache_from_env(redis=None) -> BusSearchCache:
+    maxsize = int(os.environ.get("BUS_SEARCH_CACHE_SIZE", 5000))
+    if not local_caches_safe(redis):
+        logger.warning("Bus search cache disabled: several workers and no REDIS_URL to share versions")
+        maxsize = 0
+    return BusSearchCache(
+        maxsize=maxsize,
+        ttl=float(os.environ.get("BUS_SEARCH_CACHE_TTL_SECONDS", 30)),
+        redis=redis
+    )
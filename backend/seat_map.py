@@ -0,0 +1,247 @@
+"""
+Compact per-trip seat maps.
+
+Seat availability is embedded in the trip document as bitmaps of sold and
+held seats (32 seats per Int64 word) together with per-class pricing,
+instead of one bus_seats document per seat:
+
+    "seat_map": {
+        "sold": [Int64, ...],
+        "held": [Int64, ...],
+        "classes": [{"name": "standard", "first_seat": 1, "last_seat": 50, "price": 200.0}]
+    }
+
+A seat is free while its bit is clear in both bitmaps. Seat numbers are
+1-based. Claiming or releasing seats is a single `$bit` update on the trip,
+guarded by `$bitsAllClear` / `$bitsAllSet`, whether it covers one seat or a
+whole group; so is turning held seats into sold ones.
+"""
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson.int64 import Int64
+
+WORD_BITS = 32
+
+
+def word_count(total_seats: int) -> int:
+    return (total_seats + WORD_BITS - 1) // WORD_BITS
+
+
+def new_seat_map(total_seats: int, price: float, class_name: str = "standard") -> Dict[str, Any]:
+    return {
+        "sold": [Int64(0)] * word_count(total_seats),
+        "held": [Int64(0)] * word_count(total_seats),
+        "classes": [{
+            "name": class_name,
+            "first_seat": 1,
+            "last_seat": total_seats,
+            "price": price
+        }] if total_seats else [],
+    }
+
+
+def seat_position(seat_number: str, total_seats: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """
+    Return the (word, bit mask) of a seat, or None if it does not exist
+    """
+    try:
+        number = int(seat_number)
+    except (TypeError, ValueError):
+        return None
+    if number < 1 or (total_seats is not None and number > total_seats):
+        return None
+    index = number - 1
+    return index // WORD_BITS, 1 << (index % WORD_BITS)
+
+
+def seat_price(seat_map: Dict[str, Any], seat_number: int) -> float:
+    for seat_class in seat_map["classes"]:
+        if seat_class["first_seat"] <= seat_number <= seat_class["last_seat"]:
+            return seat_class["price"]
+    raise ValueError(f"Seat {seat_number} has no price class")
+
+
+def is_sold(seat_map: Dict[str, Any], seat_number: int, bitmap: str = "sold") -> bool:
+    index = seat_number - 1
+    return bool(seat_map[bitmap][index // WORD_BITS] & (1 << (index % WORD_BITS)))
+
+
+def is_taken(seat_map: Dict[str, Any], seat_number: int) -> bool:
+    return is_sold(seat_map, seat_number) or is_sold(seat_map, seat_number, "held")
+
+
+def seat_id(trip_id: str, seat_number: int) -> str:
+    # Stable id so the same seat keeps its id across reads
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{trip_id}/{seat_number}"))
+
+
+def expand_seats(trip_id: str, total_seats: int, seat_map: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Expand a seat map into BusSeat-shaped documents
+    """
+    return [
+        {
+            "id": seat_id(trip_id, number),
+            "trip_id": trip_id,
+            "seat_number": str(number),
+            "is_available": not is_taken(seat_map, number),
+            "price": seat_price(seat_map, number),
+        }
+        for number in range(1, total_seats + 1)
+    ]
+
+
+def seat_masks(seat_numbers: Iterable[int]) -> Dict[int, int]:
+    """
+    Combine seats into one bit mask per seat map word
+    """
+    masks: Dict[int, int] = {}
+    for number in seat_numbers:
+        index = number - 1
+        word = index // WORD_BITS
+        masks[word] = masks.get(word, 0) | (1 << (index % WORD_BITS))
+    return masks
+
+
+def free_seat_run(seat_map: Dict[str, Any], total_seats: int, count: int) -> Optional[List[int]]:
+    """
+    Return the first `count` consecutive free seat numbers, or None
+    """
+    run: List[int] = []
+    for number in range(1, total_seats + 1):
+        if is_taken(seat_map, number):
+            run = []
+            continue
+        run.append(number)
+        if len(run) == count:
+            return run
+    return None
+
+
+def claim_query(masks: Dict[int, int]) -> Dict[str, Any]:
+    # Matches only while the seats are neither sold nor held
+    return {
+        f"seat_map.{bitmap}.{word}": {"$bitsAllClear": mask}
+        for bitmap in ("sold", "held")
+        for word, mask in masks.items()
+    }
+
+
+def claim_update(masks: Dict[int, int], bitmap: str = "sold") -> Dict[str, Any]:
+    return {"$bit": {f"seat_map.{bitmap}.{word}": {"or": Int64(mask)} for word, mask in masks.items()}}
+
+
+def release_query(masks: Dict[int, int], bitmap: str = "sold") -> Dict[str, Any]:
+    return {f"seat_map.{bitmap}.{word}": {"$bitsAllSet": mask} for word, mask in masks.items()}
+
+
+def release_update(masks: Dict[int, int], bitmap: str = "sold") -> Dict[str, Any]:
+    return {"$bit": {
+        f"seat_map.{bitmap}.{word}": {"and": Int64(~mask & 0xFFFFFFFF)} for word, mask in masks.items()
+    }}
+
+
+def sell_held_update(masks: Dict[int, int]) -> Dict[str, Any]:
+    # Clear the held bits and set the sold ones in the same write
+    return {"$bit": {**release_update(masks, "held")["$bit"], **claim_update(masks)["$bit"]}}
+
+
+def sold_count(seat_map: Dict[str, Any]) -> int:
+    return sum(bin(word).count("1") for word in seat_map["sold"])
+
+
+def seat_map_from_documents(
+    total_seats: int,
+    seats: List[Dict[str, Any]],
+    default_price: float,
+    class_name: str
+) -> Dict[str, Any]:
+    """
+    Build a seat map from legacy bus_seats documents
+    """
+    sold = [0] * word_count(total_seats)
+    prices = {}
+    for seat in seats:
+        position = seat_position(seat["seat_number"], total_seats)
+        if position is None:
+            continue
+        word, mask = position
+        if not seat["is_available"]:
+            sold[word] |= mask
+        prices[int(seat["seat_number"])] = seat["price"]
+
+    # Collapse consecutive seats with the same price into classes
+    classes = []
+    for number in range(1, total_seats + 1):
+        price = prices.get(number, default_price)
+        if classes and classes[-1]["price"] == price:
+            classes[-1]["last_seat"] = number
+        else:
+            name = class_name if not classes else f"{class_name}_{len(classes) + 1}"
+            classes.append({"name": name, "first_seat": number, "last_seat": number, "price": price})
+
+    return {"sold": [Int64(word) for word in sold], "held": [Int64(0)] * len(sold), "classes": classes}
+
+
+async def migrate_seat_documents(db) -> int:
+    """
+    Give every trip without a seat map one built from its bus_seats documents.
+
+    bus_seats has no index once the seat maps exist, so it is read in one
+    pass sorted by trip and merged with the trips sorted by id, rather than
+    scanned once per trip.
+    """
+    if await db.bus_trips.find_one({"seat_map": {"$exists": False}}, {"_id": 1}) is None:
+        return 0
+
+    seats_by_trip = db.bus_seats.find(
+        {}, {"_id": 0, "trip_id": 1, "seat_number": 1, "is_available": 1, "price": 1}
+    ).sort("trip_id", 1).allow_disk_use(True)
+    next_seat = await anext(seats_by_trip, None)
+
+    migrated = 0
+    async for trip in db.bus_trips.find({"seat_map": {"$exists": False}}).sort("id", 1):
+        seats = []
+        while next_seat is not None and next_seat["trip_id"] <= trip["id"]:
+            if next_seat["trip_id"] == trip["id"]:
+                seats.append(next_seat)
+            next_seat = await anext(seats_by_trip, None)
+
+        numbers = [int(seat["seat_number"]) for seat in seats if seat["seat_number"].isdigit()]
+        total_seats = max([trip["total_seats"]] + numbers)
+        class_name = trip.get("bus_type", "standard")
+        if seats:
+            seat_map = seat_map_from_documents(total_seats, seats, trip["price"], class_name)
+        else:
+            seat_map = new_seat_map(total_seats, trip["price"], class_name)
+        result = await db.bus_trips.update_one(
+            {"id": trip["id"], "seat_map": {"$exists": False}},
+            {"$set": {
+                "seat_map": seat_map,
+                "total_seats": total_seats,
+                "available_seats": total_seats - sold_count(seat_map)
+            }}
+        )
+        migrated += result.modified_count
+    return migrated
+
+
+async def add_held_bitmaps(db) -> int:
+    """
+    Give every seat map created before seat holds an empty held bitmap
+    """
+    missing: Dict[int, List[str]] = {}
+    async for trip in db.bus_trips.find(
+        {"seat_map": {"$exists": True}, "seat_map.held": {"$exists": False}},
+        {"_id": 0, "id": 1, "seat_map.sold": 1}
+    ):
+        missing.setdefault(len(trip["seat_map"]["sold"]), []).append(trip["id"])
+    updated = 0
+    for words, trip_ids in missing.items():
+        result = await db.bus_trips.update_many(
+            {"id": {"$in": trip_ids}, "seat_map.held": {"$exists": False}},
+            {"$set": {"seat_map.held": [Int64(0)] * words}}
+        )
+        updated += result.modified_count
+    return updated
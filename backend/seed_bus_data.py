@@ -5,6 +5,9 @@ from dotenv import load_dotenv
 from datetime import datetime, timedelta, time
 import uuid
 import random
+from cities import CITIES as cities, normalize_city
+from seat_map import new_seat_map
+from trip_snapshots import company_snapshot, route_snapshot
 
 # Load environment variables
 load_dotenv()
@@ -42,9 +45,6 @@ sample_bus_companies = [
     }
 ]
 
-# Main cities
-cities = ["algiers", "oran", "constantine", "annaba", "setif", "batna", "blida", "sidi_bel_abbes", "tlemcen", "biskra"]
-
 # Routes between major cities
 sample_bus_routes = []
 sample_bus_trips = []
@@ -71,7 +71,6 @@ async def seed_database():
     
     # Create routes between cities
     print("🛣️ إنشاء مسارات الحافلات...")
-    route_ids = []
     for i in range(len(cities)):
         for j in range(len(cities)):
             if i != j:  # No routes from city to itself
@@ -87,6 +86,8 @@ async def seed_database():
                     "company_id": company_id,
                     "origin_city": cities[i],
                     "destination_city": cities[j],
+                    "origin_city_key": normalize_city(cities[i]),
+                    "destination_city_key": normalize_city(cities[j]),
                     "distance_km": distance,
                     "duration_minutes": duration,
                     "created_at": datetime.utcnow(),
@@ -94,15 +95,14 @@ async def seed_database():
                 }
                 
                 sample_bus_routes.append(route)
-                route_ids.append(route["id"])
     
     await db.bus_routes.insert_many(sample_bus_routes)
     
     # Create trips for each route
     print("🚏 إنشاء رحلات الحافلات...")
-    for route_id in route_ids:
-        # Get the route details
-        route = await db.bus_routes.find_one({"id": route_id})
+    companies = {company["id"]: company for company in sample_bus_companies}
+    for route in sample_bus_routes:
+        route_id = route["id"]
         
         # Get the company for this route
         company_id = route["company_id"]
@@ -169,28 +169,17 @@ async def seed_database():
                     "total_seats": total_seats,
                     "price": round(price, 2),
                     "features": features,
+                    "seat_map": new_seat_map(total_seats, round(price, 2), bus_type),
+                    "route": route_snapshot(route),
+                    "company": company_snapshot(companies[company_id]),
                     "created_at": datetime.utcnow(),
                     "updated_at": datetime.utcnow()
                 }
                 
-                # Insert trip
-                result = await db.bus_trips.insert_one(trip)
-                trip_id = trip["id"]
-                
-                # Create seats for this trip
-                seats = []
-                for seat_num in range(1, total_seats + 1):
-                    seat = {
-                        "id": str(uuid.uuid4()),
-                        "trip_id": trip_id,
-                        "seat_number": str(seat_num),
-                        "is_available": True,
-                        "price": round(price, 2)
-                    }
-                    seats.append(seat)
-                
-                if seats:
-                    await db.bus_seats.insert_many(seats)
+                sample_bus_trips.append(trip)
+    
+    # Insert all trips with their seat maps in one bulk write
+    await db.bus_trips.insert_many(sample_bus_trips, ordered=False)
     
     print("✅ تم زرع بيانات النقل بنجاح!")
     
@@ -198,7 +187,10 @@ async def seed_database():
     companies_count = await db.bus_companies.count_documents({})
     routes_count = await db.bus_routes.count_documents({})
     trips_count = await db.bus_trips.count_documents({})
-    seats_count = await db.bus_seats.count_documents({})
+    seats_totals = await db.bus_trips.aggregate([
+        {"$group": {"_id": None, "seats": {"$sum": "$total_seats"}}}
+    ]).to_list(1)
+    seats_count = seats_totals[0]["seats"] if seats_totals else 0
     
     print("\n-------------------------------------")
     print(f"👥 عدد شركات النقل: {companies_count}")
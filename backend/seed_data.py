@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import uuid
 from passlib.context import CryptContext
+from cities import normalize_city
 
 # Load environment variables
 load_dotenv()
@@ -211,6 +212,8 @@ async def seed_database():
     await db.users.insert_one(sample_user)
     
     print("🏨 إضافة بيانات الفنادق...")
+    for hotel in sample_hotels:
+        hotel["city_key"] = normalize_city(hotel["city"])
     await db.hotels.insert_many(sample_hotels)
     
     print("🛏️ إضافة بيانات الغرف...")
@@ -0,0 +1,44 @@
+"""
+Fast JSON responses.
+
+Handlers build their Pydantic models once and return them through
+`json_response`, which encodes them straight to JSON bytes with
+pydantic-core. FastAPI skips its own response_model validation and
+jsonable_encoder pass for a returned Response, while `response_model` on the
+route still drives the OpenAPI schema.
+"""
+from functools import lru_cache
+from typing import Any, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_type: Any) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def dump_json(response_type: Any, content: Any) -> bytes:
+    return _adapter(response_type).dump_json(content)
+
+
+def json_response(
+    response_type: Any,
+    content: Any,
+    response: Optional[Response] = None,
+    status_code: int = 200
+) -> Response:
+    """
+    Encode `content` as `response_type` into a JSON response.
+
+    Headers set on the handler's injected `response` are carried over.
+    """
+    encoded = Response(
+        content=dump_json(response_type, content),
+        status_code=status_code,
+        media_type="application/json"
+    )
+    if response is not None:
+        encoded.headers.raw.extend(response.headers.raw)
+    return encoded
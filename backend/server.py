@@ -1,12 +1,15 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Query, Request, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+import asyncio
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, ValidationError, field_validator
 from typing import List, Optional, Union, Dict, Any
 from enum import Enum
 import uuid
@@ -14,6 +17,28 @@ from datetime import datetime, timedelta, time
 import bcrypt
 import jwt
 from passlib.context import CryptContext
+from cache import TTLCache
+from cities import CityPrefixIndex, known_city_names, normalize_city
+from conditional import conditional_response
+from indexes import index_usage_report
+from invalidation import InvalidationChannel, local_caches_safe, redis_from_env
+from itineraries import ItineraryGraph
+from metrics import (
+    BOOKINGS_CANCELED, BOOKINGS_CREATED, SEARCH_CACHE_LOOKUPS, SEATS_SOLD,
+    MongoCommandMetrics, PrometheusMiddleware, mark_worker_stopped, render_metrics
+)
+from migrations import run_migrations
+from pagination import NEXT_CURSOR_HEADER, find_page, keyset_filter, page_of, split_page
+from passwords import pool_from_env
+from profiler import QueryProfiler, QueryProfilerMiddleware
+from reference_data import ReferenceData
+from projections import ListView, list_projection, model_projection, parse_fields, pick
+from reservations import SeatReservationEngine
+from room_inventory import RoomInventory, stay_nights
+from search_cache import Bucket, cache_from_env, search_bucket
+from seat_map import expand_seats, new_seat_map
+from serialization import json_response
+from trip_snapshots import company_snapshot, propagate_company, propagate_route, route_snapshot
 
 # Root directory and environment variables
 ROOT_DIR = Path(__file__).parent
@@ -21,18 +46,55 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics(), QueryProfiler()])
 db = client[os.environ.get('DB_NAME', 'dz_smart_booking')]
+seat_reservations = SeatReservationEngine(db)
+room_inventory = RoomInventory(db)
+reference_data = ReferenceData(db)
+city_index = CityPrefixIndex()
+itinerary_graph = ItineraryGraph()
+redis_client = redis_from_env()
+bus_search_cache = cache_from_env(redis_client)
+
+# Whether startup runs the migrations; the launcher runs them once before
+# starting several workers and turns this off
+RUN_MIGRATIONS = os.environ.get("RUN_MIGRATIONS", "1").lower() in ("1", "true", "yes")
+
+# Reload interval of the in-memory bus network; set when several workers
+# take bookings, so each sees the others' (0 disables)
+WORKER_INDEX_REFRESH_SECONDS = float(os.environ.get("WORKER_INDEX_REFRESH_SECONDS", 0))
+
+# How long seats stay held during checkout, and how often expired holds are freed
+SEAT_HOLD_MINUTES = float(os.environ.get("SEAT_HOLD_MINUTES", 10))
+SEAT_HOLD_SWEEP_SECONDS = float(os.environ.get("SEAT_HOLD_SWEEP_SECONDS", 30))
+
+# How often each worker checks for companies and routes changed by the others
+REFERENCE_DATA_REFRESH_SECONDS = float(os.environ.get("REFERENCE_DATA_REFRESH_SECONDS", 5))
+
+# Max-age of public hotel, room and company responses, which nginx micro-caches
+PUBLIC_CACHE_SECONDS = int(os.environ.get("PUBLIC_CACHE_SECONDS", 5))
 
 # Security configuration
 SECRET_KEY = os.environ.get("SECRET_KEY", "dzsecretkey123456789")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Accounts allowed on the /api/admin endpoints, as comma-separated emails
+ADMIN_EMAILS = {email.strip().lower() for email in os.environ.get("ADMIN_EMAILS", "").split(",") if email.strip()}
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_pool = pool_from_env(pwd_context)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Resolved principals, keyed by user id. Several workers tell each other about
+# changed users through Redis; without REDIS_URL they cannot, and the cache is off
+principal_cache = TTLCache(
+    maxsize=int(os.environ.get("PRINCIPAL_CACHE_SIZE", 10000)) if local_caches_safe(redis_client) else 0,
+    ttl=float(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+)
+principal_invalidations = InvalidationChannel(principal_cache, "principal-invalidations", redis_client)
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -60,6 +122,10 @@ class UserInDB(User):
 class UserResponse(User):
     pass
 
+class UserUpdate(BaseModel):
+    full_name: Optional[str] = None
+    phone_number: Optional[str] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -100,6 +166,32 @@ class Hotel(HotelBase):
     rating: float = 0.0
     reviews_count: int = 0
 
+# Length of the description excerpt in summary views
+SUMMARY_DESCRIPTION_LENGTH = 200
+
+class HotelSummary(BaseModel):
+    """
+    Hotel card for list views: cover image, first amenities, description excerpt
+    """
+    id: str
+    name: str
+    city: str
+    stars: int
+    rating: float = 0.0
+    reviews_count: int = 0
+    description: str = ""
+    amenities: List[str] = []
+    images: List[str] = []
+    
+    @field_validator("description")
+    @classmethod
+    def shorten_description(cls, description: str) -> str:
+        if len(description) <= SUMMARY_DESCRIPTION_LENGTH:
+            return description
+        return description[:SUMMARY_DESCRIPTION_LENGTH].rstrip() + "…"
+
+HOTEL_SUMMARY_PROJECTION = model_projection(HotelSummary, images={"$slice": 1}, amenities={"$slice": 3})
+
 class BookingStatus(str, Enum):
     PENDING = "pending"
     CONFIRMED = "confirmed"
@@ -114,6 +206,19 @@ class BusCompany(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class BusCompanyUpdate(BaseModel):
+    name: Optional[str] = None
+    logo: Optional[str] = None
+    description: Optional[str] = None
+
+    @field_validator("name")
+    @classmethod
+    def reject_null(cls, value):
+        # Omit a field to leave it unchanged; only optional fields can be cleared
+        if value is None:
+            raise ValueError("must not be null")
+        return value
+
 class BusRoute(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     company_id: str
@@ -124,6 +229,20 @@ class BusRoute(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class BusRouteUpdate(BaseModel):
+    origin_city: Optional[str] = None
+    destination_city: Optional[str] = None
+    distance_km: Optional[float] = None
+    duration_minutes: Optional[int] = None
+
+    @field_validator("origin_city", "destination_city", "distance_km", "duration_minutes")
+    @classmethod
+    def reject_null(cls, value):
+        # Omit a field to leave it unchanged
+        if value is None:
+            raise ValueError("must not be null")
+        return value
+
 class BusType(str, Enum):
     STANDARD = "standard"
     PREMIUM = "premium"
@@ -144,6 +263,46 @@ class BusTrip(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class BusTripSummary(BaseModel):
+    id: str
+    route_id: str
+    company_id: str
+    bus_type: BusType = BusType.STANDARD
+    departure_date: datetime
+    departure_time: str
+    arrival_time: str
+    available_seats: int
+    price: float
+    features: List[str] = []
+
+BUS_TRIP_SUMMARY_PROJECTION = model_projection(BusTripSummary)
+
+# Full trips without the seat map and the route and company snapshots
+TRIP_PROJECTION = {"seat_map": 0, "route": 0, "company": 0}
+
+class BusRouteSummary(BaseModel):
+    id: str
+    origin_city: str
+    destination_city: str
+    distance_km: float
+    duration_minutes: int
+
+class BusCompanySummary(BaseModel):
+    id: str
+    name: str
+    logo: Optional[str] = None
+
+class BusSearchResultSummary(BaseModel):
+    trip: BusTripSummary
+    route: BusRouteSummary
+    company: BusCompanySummary
+
+class FareCalendarDay(BaseModel):
+    date: datetime
+    min_price: Optional[float] = None
+    trip_count: int = 0
+    earliest_departure: Optional[str] = None
+
 class BusSeat(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     trip_id: str
@@ -170,12 +329,68 @@ class BusTicketBookingCreate(BaseModel):
     passenger_phone: str
     seat_number: str
 
+# Most passengers in one group booking
+MAX_GROUP_SIZE = 10
+
+class BusPassenger(BaseModel):
+    passenger_name: str
+    passenger_phone: str
+
+class GroupPassenger(BusPassenger):
+    seat_number: Optional[str] = None
+
+class BusGroupBookingCreate(BaseModel):
+    trip_id: str
+    # Either every passenger names a seat, or none does and adjacent seats are picked
+    passengers: List[GroupPassenger] = Field(min_length=1, max_length=MAX_GROUP_SIZE)
+
+class BusSeatHoldCreate(BaseModel):
+    trip_id: str
+    seat_numbers: List[str] = Field(min_length=1, max_length=MAX_GROUP_SIZE)
+
+class BusSeatHold(BusSeatHoldCreate):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    expires_at: datetime
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class BusHoldBookingCreate(BaseModel):
+    # One passenger per held seat, in the order of the hold's seat_numbers
+    passengers: List[BusPassenger] = Field(min_length=1, max_length=MAX_GROUP_SIZE)
+
 class BusTripSearch(BaseModel):
     origin_city: str
     destination_city: str
     departure_date: datetime
     passengers_count: int = 1
 
+class ItinerarySearch(BusTripSearch):
+    max_transfers: int = Field(2, ge=0, le=3)
+    min_connection_minutes: int = Field(30, ge=0, le=360)
+
+class ItineraryLeg(BaseModel):
+    trip_id: str
+    route_id: str
+    company_id: str
+    origin_city: str
+    destination_city: str
+    departure: datetime
+    arrival: datetime
+    price: float
+    available_seats: int
+
+class Itinerary(BaseModel):
+    legs: List[ItineraryLeg]
+    departure: datetime
+    arrival: datetime
+    duration_minutes: int
+    transfers: int
+    price: float
+
+class ItineraryResults(BaseModel):
+    fastest: List[Itinerary]
+    cheapest: List[Itinerary]
+
 class BookingBase(BaseModel):
     hotel_id: str
     room_id: str
@@ -195,6 +410,11 @@ class Booking(BookingBase):
     status: BookingStatus = BookingStatus.PENDING
     total_price: float
 
+class CitySuggestion(BaseModel):
+    key: str
+    name: str
+    matched: str
+
 class HotelSearch(BaseModel):
     city: str
     check_in_date: datetime
@@ -202,11 +422,11 @@ class HotelSearch(BaseModel):
     guests_count: int
     
 # Authentication functions
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    return await password_pool.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_pool.verify(plain_password, hashed_password)
 
 async def get_user_by_email(email: str):
     user = await db.users.find_one({"email": email})
@@ -218,7 +438,9 @@ async def authenticate_user(email: str, password: str):
     user = await get_user_by_email(email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
+        return False
+    if not user.is_active:
         return False
     return user
 
@@ -243,11 +465,36 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except jwt.PyJWTError:
         raise credentials_exception
     
-    user = await db.users.find_one({"id": user_id})
-    if user is None:
-        raise credentials_exception
+    current_user = principal_cache.get(user_id)
+    if current_user is None:
+        user = await db.users.find_one({"id": user_id})
+        if user is None or not user.get("is_active", True):
+            raise credentials_exception
+        current_user = UserInDB(**user)
+        principal_cache.set(user_id, current_user)
     
-    return UserInDB(**user)
+    return current_user
+
+async def get_admin_user(current_user: UserInDB = Depends(get_current_user)):
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
+
+async def update_user(user_id: str, changes: Dict[str, Any]):
+    """
+    Update a user and drop their cached principal
+    """
+    await db.users.update_one(
+        {"id": user_id},
+        {"$set": {**changes, "updated_at": datetime.utcnow()}}
+    )
+    await principal_invalidations.invalidate(user_id)
+
+async def deactivate_user(user_id: str):
+    await update_user(user_id, {"is_active": False})
 
 # API Routes
 @api_router.post("/auth/register", response_model=Token)
@@ -261,7 +508,7 @@ async def register_user(user_data: UserCreate):
         )
     
     # Create new user with hashed password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     user_dict = user_data.dict(exclude={"password"})
     new_user = UserInDB(**user_dict, hashed_password=hashed_password)
     
@@ -300,59 +547,133 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 async def get_user_profile(current_user: UserInDB = Depends(get_current_user)):
     return UserResponse(**current_user.dict(exclude={"hashed_password"}))
 
+@api_router.put("/users/me", response_model=UserResponse)
+async def update_user_profile(
+    user_data: UserUpdate,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    changes = user_data.dict(exclude_none=True)
+    if changes:
+        await update_user(current_user.id, changes)
+    user = await db.users.find_one({"id": current_user.id})
+    return UserResponse(**user)
+
 # Hotel Routes
+def hotel_list_response(
+    hotels: List[Dict[str, Any]],
+    view: ListView,
+    fields: Optional[List[str]],
+    response: Optional[Response] = None
+) -> Response:
+    if fields:
+        return json_response(List[Dict[str, Any]], [pick(hotel, fields) for hotel in hotels], response)
+    if view == ListView.SUMMARY:
+        return json_response(List[HotelSummary], [HotelSummary(**hotel) for hotel in hotels], response)
+    return json_response(List[Hotel], [Hotel(**hotel) for hotel in hotels], response)
+
 @api_router.post("/hotels", response_model=Hotel)
 async def create_hotel(hotel_data: HotelCreate):
     hotel = Hotel(**hotel_data.dict())
-    await db.hotels.insert_one(hotel.dict())
+    await db.hotels.insert_one({**hotel.dict(), "city_key": normalize_city(hotel.city)})
+    city_index.add(hotel.city)
     return hotel
 
-@api_router.get("/hotels", response_model=List[Hotel])
+@api_router.get("/hotels", response_model=Union[List[Hotel], List[HotelSummary]])
 async def get_hotels(
+    response: Response,
     city: Optional[str] = None,
     min_stars: Optional[int] = None,
     max_price: Optional[float] = None,
-    page: int = 1,
-    limit: int = 10
+    page: int = Query(1, ge=1, deprecated=True),
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    view: ListView = ListView.FULL,
+    fields: Optional[str] = Query(None, description="Comma-separated hotel fields to return")
 ):
+    selected = parse_fields(fields, Hotel)
+    projection = list_projection(view, selected, HOTEL_SUMMARY_PROJECTION)
+    
     # Build filter
     filter_query = {}
     if city:
-        filter_query["city"] = {"$regex": city, "$options": "i"}
+        filter_query["city_key"] = normalize_city(city)
     if min_stars:
         filter_query["stars"] = {"$gte": min_stars}
     
-    # Get hotels with pagination
-    skip = (page - 1) * limit
-    hotels = await db.hotels.find(filter_query).skip(skip).limit(limit).to_list(length=limit)
+    # Page-number paging is kept for old clients; the cursor is the fast path
+    if page > 1 and not cursor:
+        skip = (page - 1) * limit
+        hotels = await db.hotels.find(filter_query, projection).sort("_id", 1).skip(skip).limit(limit).to_list(length=limit)
+    else:
+        hotels = await find_page(db.hotels, filter_query, cursor, limit, response, projection)
     
-    return [Hotel(**hotel) for hotel in hotels]
+    return hotel_list_response(hotels, view, selected, response)
 
 @api_router.get("/hotels/{hotel_id}", response_model=Hotel)
-async def get_hotel(hotel_id: str):
+async def get_hotel(hotel_id: str, request: Request, response: Response):
     hotel = await db.hotels.find_one({"id": hotel_id})
     if not hotel:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Hotel not found"
         )
-    return Hotel(**hotel)
-
-@api_router.post("/search/hotels", response_model=List[Hotel])
-async def search_hotels(search_data: HotelSearch):
+    not_modified = conditional_response(request, response, [hotel], PUBLIC_CACHE_SECONDS)
+    if not_modified:
+        return not_modified
+    return json_response(Hotel, Hotel(**hotel), response)
+
+@api_router.post("/search/hotels", response_model=Union[List[Hotel], List[HotelSummary]])
+async def search_hotels(
+    search_data: HotelSearch,
+    view: ListView = ListView.FULL,
+    fields: Optional[str] = Query(None, description="Comma-separated hotel fields to return")
+):
+    """
+    Search hotels with at least one room free for the whole stay
+    """
+    selected = parse_fields(fields, Hotel)
+    
+    # A stay is counted in calendar nights, like the room inventory
+    if not stay_nights(search_data.check_in_date, search_data.check_out_date):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Check-out date must be at least one night after check-in date"
+        )
+    
     # Build filter for hotels in the city
-    filter_query = {"city": {"$regex": search_data.city, "$options": "i"}}
+    filter_query = {"city_key": normalize_city(search_data.city)}
     
-    hotels = await db.hotels.find(filter_query).to_list(1000)
-    hotels_data = [Hotel(**hotel) for hotel in hotels]
+    hotels = await db.hotels.find(
+        filter_query, list_projection(view, selected, HOTEL_SUMMARY_PROJECTION)
+    ).to_list(1000)
+    if not hotels:
+        return []
+    
+    # Rooms large enough for the party
+    rooms = await db.rooms.find(
+        {
+            "hotel_id": {"$in": [hotel["id"] for hotel in hotels]},
+            "capacity": {"$gte": search_data.guests_count},
+            "available": True
+        },
+        {"_id": 0, "id": 1, "hotel_id": 1}
+    ).to_list(None)
     
-    # Later we can implement room availability check
-    return hotels_data
+    # Keep hotels with a room free for every night of the stay
+    free_rooms = await room_inventory.free_rooms(
+        (room["id"] for room in rooms), search_data.check_in_date, search_data.check_out_date
+    )
+    hotel_ids = {room["hotel_id"] for room in rooms if room["id"] in free_rooms}
+    
+    return hotel_list_response([hotel for hotel in hotels if hotel["id"] in hotel_ids], view, selected)
 
 @api_router.get("/rooms/hotel/{hotel_id}", response_model=List[Room])
-async def get_hotel_rooms(hotel_id: str):
+async def get_hotel_rooms(hotel_id: str, request: Request, response: Response):
     rooms = await db.rooms.find({"hotel_id": hotel_id}).to_list(1000)
-    return [Room(**room) for room in rooms]
+    not_modified = conditional_response(request, response, rooms, PUBLIC_CACHE_SECONDS)
+    if not_modified:
+        return not_modified
+    return json_response(List[Room], [Room(**room) for room in rooms], response)
 
 @api_router.post("/bookings", response_model=Booking)
 async def create_booking(
@@ -367,19 +688,20 @@ async def create_booking(
             detail="Room not found"
         )
     
-    # Calculate total price (days * price_per_night)
+    # Calculate total price (nights * price_per_night), counting the
+    # calendar nights the room inventory claims
     check_in = booking_data.check_in_date
     check_out = booking_data.check_out_date
-    days = (check_out - check_in).days
+    nights = len(stay_nights(check_in, check_out))
     
-    if days <= 0:
+    if nights <= 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Check-out date must be after check-in date"
+            detail="Check-out date must be at least one night after check-in date"
         )
     
     room_obj = Room(**room)
-    total_price = days * room_obj.price_per_night
+    total_price = nights * room_obj.price_per_night
     
     # Create booking
     booking = Booking(
@@ -388,86 +710,254 @@ async def create_booking(
         total_price=total_price
     )
     
-    await db.bookings.insert_one(booking.dict())
+    # Claim every night of the stay, or none if the room is taken on any of them
+    if not await room_inventory.claim(booking.room_id, check_in, check_out, booking.id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Room is not available for these dates"
+        )
+    try:
+        await db.bookings.insert_one({**booking.dict(), "nights_claimed": True})
+    except Exception:
+        await room_inventory.release(booking.id)
+        raise
+    BOOKINGS_CREATED.labels("hotel").inc()
     return booking
 
 @api_router.get("/bookings/me", response_model=List[Booking])
 async def get_user_bookings(current_user: UserInDB = Depends(get_current_user)):
     bookings = await db.bookings.find({"user_id": current_user.id}).to_list(1000)
-    return [Booking(**booking) for booking in bookings]
+    return json_response(List[Booking], [Booking(**booking) for booking in bookings])
+
+@api_router.put("/bookings/{booking_id}/cancel", response_model=Booking)
+async def cancel_booking(
+    booking_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Cancel a hotel booking and free its nights
+    """
+    # Flip the status only once, so a repeated cancel is a no-op
+    booking = await db.bookings.find_one_and_update(
+        {"id": booking_id, "user_id": current_user.id, "status": {"$ne": BookingStatus.CANCELED}},
+        {"$set": {"status": BookingStatus.CANCELED, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    
+    if not booking:
+        booking = await db.bookings.find_one({
+            "id": booking_id,
+            "user_id": current_user.id
+        })
+        if not booking:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Booking not found"
+            )
+        return Booking(**booking)
+    BOOKINGS_CANCELED.labels("hotel").inc()
+    
+    await room_inventory.release(booking_id)
+    
+    return Booking(**booking)
 
 # Bus Company Routes
 @api_router.post("/bus/companies", response_model=BusCompany)
 async def create_bus_company(company_data: BusCompany):
-    await db.bus_companies.insert_one(company_data.dict())
+    company = company_data.dict()
+    await db.bus_companies.insert_one(company)
+    reference_data.put_company(company)
     return company_data
 
 @api_router.get("/bus/companies", response_model=List[BusCompany])
-async def get_bus_companies():
-    companies = await db.bus_companies.find().to_list(100)
-    return [BusCompany(**company) for company in companies]
+async def get_bus_companies(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500)
+):
+    companies = page_of(reference_data.companies(), cursor, limit, response)
+    not_modified = conditional_response(request, response, companies, PUBLIC_CACHE_SECONDS)
+    if not_modified:
+        return not_modified
+    return json_response(List[BusCompany], [BusCompany(**company) for company in companies], response)
 
 @api_router.get("/bus/companies/{company_id}", response_model=BusCompany)
-async def get_bus_company(company_id: str):
+async def get_bus_company(company_id: str, request: Request, response: Response):
+    company = await reference_data.company(company_id)
+    if not company:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bus company not found"
+        )
+    not_modified = conditional_response(request, response, [company], PUBLIC_CACHE_SECONDS)
+    if not_modified:
+        return not_modified
+    return json_response(BusCompany, BusCompany(**company), response)
+
+def validate_merged(model, document: Dict[str, Any]):
+    """
+    Raise 422 if a document with an update applied is not a valid `model`
+    """
+    try:
+        model(**document)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(include_url=False, include_context=False, include_input=False)
+        )
+
+@api_router.put("/bus/companies/{company_id}", response_model=BusCompany)
+async def update_bus_company(company_id: str, company_data: BusCompanyUpdate):
+    """
+    Update a bus company and the company snapshot of its trips
+    """
+    updates = company_data.dict(exclude_unset=True)
     company = await db.bus_companies.find_one({"id": company_id})
     if not company:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Bus company not found"
         )
+    # The merged company goes into trip snapshots and the reference data, so it must be valid
+    validate_merged(BusCompany, {**company, **updates})
+    company = await db.bus_companies.find_one_and_update(
+        {"id": company_id},
+        {"$set": {**updates, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not company:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bus company not found"
+        )
+    reference_data.put_company(company)
+    await propagate_company(db, company)
+    await invalidate_searches_matching({"company_id": company_id})
     return BusCompany(**company)
 
 # Bus Routes
 @api_router.post("/bus/routes", response_model=BusRoute)
 async def create_bus_route(route_data: BusRoute):
     # Check if company exists
-    company = await db.bus_companies.find_one({"id": route_data.company_id})
+    company = await reference_data.company(route_data.company_id)
     if not company:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Bus company not found"
         )
-    await db.bus_routes.insert_one(route_data.dict())
+    route = {
+        **route_data.dict(),
+        "origin_city_key": normalize_city(route_data.origin_city),
+        "destination_city_key": normalize_city(route_data.destination_city)
+    }
+    await db.bus_routes.insert_one(route)
+    reference_data.put_route(route)
+    itinerary_graph.add_route(route)
+    city_index.add(route_data.origin_city)
+    city_index.add(route_data.destination_city)
     return route_data
 
 @api_router.get("/bus/routes", response_model=List[BusRoute])
 async def get_bus_routes(
+    response: Response,
     origin_city: Optional[str] = None,
     destination_city: Optional[str] = None,
-    company_id: Optional[str] = None
+    company_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500)
 ):
-    filter_query = {}
-    if origin_city:
-        filter_query["origin_city"] = {"$regex": origin_city, "$options": "i"}
-    if destination_city:
-        filter_query["destination_city"] = {"$regex": destination_city, "$options": "i"}
-    if company_id:
-        filter_query["company_id"] = company_id
+    routes = reference_data.routes(
+        origin_key=normalize_city(origin_city) if origin_city else None,
+        destination_key=normalize_city(destination_city) if destination_city else None,
+        company_id=company_id
+    )
+    routes = page_of(routes, cursor, limit, response)
+    return json_response(List[BusRoute], [BusRoute(**route) for route in routes], response)
+
+@api_router.put("/bus/routes/{route_id}", response_model=BusRoute)
+async def update_bus_route(route_id: str, route_data: BusRouteUpdate):
+    """
+    Update a bus route and the route snapshot of its trips
+    """
+    updates = route_data.dict(exclude_unset=True)
+    route = await db.bus_routes.find_one({"id": route_id})
+    if not route:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bus route not found"
+        )
+    validate_merged(BusRoute, {**route, **updates})
+    if "origin_city" in updates:
+        updates["origin_city_key"] = normalize_city(updates["origin_city"])
+    if "destination_city" in updates:
+        updates["destination_city_key"] = normalize_city(updates["destination_city"])
     
-    routes = await db.bus_routes.find(filter_query).to_list(100)
-    return [BusRoute(**route) for route in routes]
+    # Searches cached under the old cities must go too
+    await invalidate_searches_matching({"route_id": route_id})
+    route = await db.bus_routes.find_one_and_update(
+        {"id": route_id},
+        {"$set": {**updates, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not route:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bus route not found"
+        )
+    reference_data.put_route(route)
+    await propagate_route(db, route)
+    await invalidate_searches_matching({"route_id": route_id})
+    city_index.add(route["origin_city"])
+    city_index.add(route["destination_city"])
+    # Trip times depend on the route's duration
+    await itinerary_graph.load(db)
+    return BusRoute(**route)
 
 # Bus Trips
 @api_router.post("/bus/trips", response_model=BusTrip)
 async def create_bus_trip(trip_data: BusTrip):
-    # Check if route exists
-    route = await db.bus_routes.find_one({"id": trip_data.route_id})
+    # Check if route and company exist
+    route = await reference_data.route(trip_data.route_id)
     if not route:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Bus route not found"
         )
-    await db.bus_trips.insert_one(trip_data.dict())
+    company = await reference_data.company(trip_data.company_id)
+    if not company:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bus company not found"
+        )
+    
+    # A new trip starts with every seat free
+    trip_data.available_seats = trip_data.total_seats
+    trip = trip_data.dict()
+    trip["seat_map"] = new_seat_map(trip_data.total_seats, trip_data.price, trip_data.bus_type)
+    trip["route"] = route_snapshot(route)
+    trip["company"] = company_snapshot(company)
+    await db.bus_trips.insert_one(trip)
+    itinerary_graph.add_trip(trip)
+    await bus_search_cache.invalidate(search_bucket(
+        route["origin_city_key"], route["destination_city_key"], trip_data.departure_date
+    ))
     return trip_data
 
-@api_router.get("/bus/trips", response_model=List[BusTrip])
+@api_router.get("/bus/trips", response_model=Union[List[BusTrip], List[BusTripSummary]])
 async def get_bus_trips(
+    response: Response,
     route_id: Optional[str] = None,
     company_id: Optional[str] = None,
     departure_date: Optional[str] = None,
     origin_city: Optional[str] = None,
-    destination_city: Optional[str] = None
+    destination_city: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    view: ListView = ListView.FULL,
+    fields: Optional[str] = Query(None, description="Comma-separated trip fields to return")
 ):
+    selected = parse_fields(fields, BusTrip)
     filter_query = {}
     if route_id:
         filter_query["route_id"] = route_id
@@ -486,70 +976,68 @@ async def get_bus_trips(
                 detail="Invalid date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)"
             )
     
-    # If origin_city or destination_city is provided, we need to join with routes
-    if origin_city or destination_city:
-        route_filter = {}
-        if origin_city:
-            route_filter["origin_city"] = {"$regex": origin_city, "$options": "i"}
-        if destination_city:
-            route_filter["destination_city"] = {"$regex": destination_city, "$options": "i"}
-        
-        routes = await db.bus_routes.find(route_filter).to_list(100)
-        route_ids = [route["id"] for route in routes]
-        filter_query["route_id"] = {"$in": route_ids}
+    # Cities are matched on the trip's route snapshot
+    if origin_city:
+        filter_query["route.origin_city_key"] = normalize_city(origin_city)
+    if destination_city:
+        filter_query["route.destination_city_key"] = normalize_city(destination_city)
     
-    trips = await db.bus_trips.find(filter_query).to_list(100)
-    return [BusTrip(**trip) for trip in trips]
-
-@api_router.post("/bus/search", response_model=List[Dict[str, Any]])
-async def search_bus_trips(search_data: BusTripSearch):
+    projection = list_projection(view, selected, BUS_TRIP_SUMMARY_PROJECTION) or TRIP_PROJECTION
+    trips = await find_page(db.bus_trips, filter_query, cursor, limit, response, projection)
+    if selected:
+        return json_response(List[Dict[str, Any]], [pick(trip, selected) for trip in trips], response)
+    if view == ListView.SUMMARY:
+        return json_response(List[BusTripSummary], [BusTripSummary(**trip) for trip in trips], response)
+    return json_response(List[BusTrip], [BusTrip(**trip) for trip in trips], response)
+
+@api_router.post("/bus/search", response_model=Union[List[Dict[str, Any]], List[BusSearchResultSummary]])
+async def search_bus_trips(
+    search_data: BusTripSearch,
+    view: ListView = ListView.FULL,
+    fields: Optional[str] = Query(None, description="Comma-separated trip fields to return")
+):
     """
-    Search for bus trips with route details
+    Search for bus trips with route details.
+    `fields` selects trip fields; route and company then come in summary form.
     """
+    selected = parse_fields(fields, BusTrip)
     try:
-        # Find routes matching origin and destination
-        routes = await db.bus_routes.find({
-            "origin_city": {"$regex": search_data.origin_city, "$options": "i"},
-            "destination_city": {"$regex": search_data.destination_city, "$options": "i"}
-        }).to_list(100)
-        
-        route_ids = [route["id"] for route in routes]
-        if not route_ids:
-            return []
-        
-        # Format the date to match only the day
-        date_obj = search_data.departure_date
-        start_of_day = datetime(date_obj.year, date_obj.month, date_obj.day)
-        end_of_day = start_of_day + timedelta(days=1)
-        
-        # Find trips for these routes on the specified date
-        trips = await db.bus_trips.find({
-            "route_id": {"$in": route_ids},
-            "departure_date": {"$gte": start_of_day, "$lt": end_of_day},
-            "available_seats": {"$gte": search_data.passengers_count}
-        }).to_list(100)
-        
-        # Create a lookup dictionary for routes
-        routes_dict = {route["id"]: route for route in routes}
-        
-        # Get company details
-        company_ids = list(set(trip["company_id"] for trip in trips))
-        companies = await db.bus_companies.find({"id": {"$in": company_ids}}).to_list(100)
-        companies_dict = {company["id"]: company for company in companies}
+        bucket = search_bucket(
+            normalize_city(search_data.origin_city),
+            normalize_city(search_data.destination_city),
+            search_data.departure_date
+        )
         
-        # Combine trip, route, and company data
-        result = []
-        for trip in trips:
-            route = routes_dict.get(trip["route_id"], {})
-            company = companies_dict.get(trip["company_id"], {})
-            
-            result.append({
-                "trip": BusTrip(**trip),
-                "route": BusRoute(**route),
-                "company": BusCompany(**company)
-            })
+        # Serve from the cache unless the bucket changed since it was stored
+        version = await bus_search_cache.version(bucket)
+        results = await bus_search_cache.get(bucket, version, search_data.passengers_count)
+        SEARCH_CACHE_LOOKUPS.labels("miss" if results is None else "hit").inc()
+        if results is None:
+            results = await find_bus_trips(bucket, search_data)
+            await bus_search_cache.set(bucket, version, search_data.passengers_count, results)
         
-        return result
+        if selected:
+            return json_response(List[Dict[str, Any]], [
+                {
+                    "trip": pick(result["trip"], selected),
+                    "route": BusRouteSummary(**result["route"]),
+                    "company": BusCompanySummary(**result["company"])
+                }
+                for result in results
+            ])
+        if view == ListView.SUMMARY:
+            return json_response(
+                List[BusSearchResultSummary],
+                [BusSearchResultSummary(**result) for result in results]
+            )
+        return json_response(List[Dict[str, Any]], [
+            {
+                "trip": BusTrip(**result["trip"]),
+                "route": BusRoute(**result["route"]),
+                "company": BusCompany(**result["company"])
+            }
+            for result in results
+        ])
     
     except Exception as e:
         logger.error(f"Error searching bus trips: {e}")
@@ -558,44 +1046,133 @@ async def search_bus_trips(search_data: BusTripSearch):
             detail=f"Error searching bus trips: {str(e)}"
         )
 
+async def find_bus_trips(bucket: Bucket, search_data: BusTripSearch) -> List[Dict[str, Any]]:
+    """
+    Query the trips of a search, with their route and company snapshots
+    """
+    origin_key, destination_key, _ = bucket
+    
+    # Format the date to match only the day
+    date_obj = search_data.departure_date
+    start_of_day = datetime(date_obj.year, date_obj.month, date_obj.day)
+    end_of_day = start_of_day + timedelta(days=1)
+    
+    trips = await db.bus_trips.find({
+        "route.origin_city_key": origin_key,
+        "route.destination_city_key": destination_key,
+        "departure_date": {"$gte": start_of_day, "$lt": end_of_day},
+        "available_seats": {"$gte": search_data.passengers_count}
+    }, {"_id": 0, "seat_map": 0}).to_list(100)
+    
+    return [
+        {"trip": trip, "route": trip.pop("route"), "company": trip.pop("company")}
+        for trip in trips
+    ]
+
+@api_router.get("/bus/fare-calendar", response_model=List[FareCalendarDay])
+async def get_bus_fare_calendar(
+    origin_city: str,
+    destination_city: str,
+    departure_date: datetime,
+    days: int = Query(3, ge=0, le=15, description="Days shown on each side of departure_date"),
+    passengers_count: int = Query(1, ge=1)
+):
+    """
+    Cheapest fare, trip count and earliest departure for each day around
+    departure_date, grouped by day in one aggregation over the window
+    """
+    center = datetime(departure_date.year, departure_date.month, departure_date.day)
+    first_day = center - timedelta(days=days)
+    end = center + timedelta(days=days + 1)
+    
+    pipeline = [
+        {"$match": {
+            "route.origin_city_key": normalize_city(origin_city),
+            "route.destination_city_key": normalize_city(destination_city),
+            "departure_date": {"$gte": first_day, "$lt": end},
+            "available_seats": {"$gte": passengers_count}
+        }},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$departure_date"}},
+            "min_price": {"$min": "$price"},
+            "trip_count": {"$sum": 1},
+            "earliest_departure": {"$min": "$departure_time"}
+        }}
+    ]
+    per_day = {}
+    async for row in db.bus_trips.aggregate(pipeline):
+        per_day[row.pop("_id")] = row
+    
+    calendar = []
+    for offset in range(2 * days + 1):
+        day = first_day + timedelta(days=offset)
+        calendar.append(FareCalendarDay(date=day, **per_day.get(day.strftime("%Y-%m-%d"), {})))
+    return json_response(List[FareCalendarDay], calendar)
+
+async def invalidate_trip_searches(trip: Dict[str, Any]):
+    """
+    Drop cached searches that may include this trip
+    """
+    route = trip.get("route") or await db.bus_routes.find_one(
+        {"id": trip["route_id"]},
+        {"_id": 0, "origin_city_key": 1, "destination_city_key": 1}
+    )
+    if route:
+        await bus_search_cache.invalidate(search_bucket(
+            route["origin_city_key"], route["destination_city_key"], trip["departure_date"]
+        ))
+
+async def invalidate_searches_matching(query: Dict[str, Any]):
+    """
+    Drop cached searches of every upcoming trip matching `query`
+    """
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    pipeline = [
+        {"$match": {**query, "departure_date": {"$gte": today}}},
+        {"$group": {"_id": {
+            "origin": "$route.origin_city_key",
+            "destination": "$route.destination_city_key",
+            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$departure_date"}}
+        }}}
+    ]
+    async for row in db.bus_trips.aggregate(pipeline):
+        bucket = row["_id"]
+        await bus_search_cache.invalidate((bucket["origin"], bucket["destination"], bucket["day"]))
+
 @api_router.get("/bus/trips/{trip_id}", response_model=Dict[str, Any])
 async def get_bus_trip_details(trip_id: str):
     """
     Get details of a bus trip, including route and company information
     """
-    # Get trip details
-    trip = await db.bus_trips.find_one({"id": trip_id})
+    # Route and company come with the trip as snapshots
+    trip = await db.bus_trips.find_one({"id": trip_id}, {"_id": 0})
     if not trip:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Bus trip not found"
         )
-    
-    # Get associated route
-    route = await db.bus_routes.find_one({"id": trip["route_id"]})
+    route = trip.pop("route", None)
     if not route:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Bus route not found"
         )
-    
-    # Get company details
-    company = await db.bus_companies.find_one({"id": trip["company_id"]})
+    company = trip.pop("company", None)
     if not company:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Bus company not found"
         )
     
-    # Get seats information
-    seats = await db.bus_seats.find({"trip_id": trip_id}).to_list(100)
+    # Expand the trip's seat map
+    seats = expand_seats(trip_id, trip["total_seats"], trip["seat_map"]) if "seat_map" in trip else []
     
-    return {
+    return json_response(Dict[str, Any], {
         "trip": BusTrip(**trip),
         "route": BusRoute(**route),
         "company": BusCompany(**company),
-        "seats": [BusSeat(**seat) for seat in seats] if seats else []
-    }
+        "seats": [BusSeat(**seat) for seat in seats]
+    })
 
 @api_router.post("/bus/seats", response_model=List[BusSeat])
 async def create_bus_seats(trip_id: str, total_seats: int, price: float):
@@ -610,34 +1187,32 @@ async def create_bus_seats(trip_id: str, total_seats: int, price: float):
             detail="Bus trip not found"
         )
     
-    # Create seats
-    seats = []
-    for i in range(1, total_seats + 1):
-        seat = BusSeat(
-            trip_id=trip_id,
-            seat_number=str(i),
-            is_available=True,
-            price=price
-        )
-        seats.append(seat.dict())
-    
-    await db.bus_seats.insert_many(seats)
-    
-    # Update trip with total seats
-    await db.bus_trips.update_one(
-        {"id": trip_id},
-        {"$set": {"total_seats": total_seats, "available_seats": total_seats}}
+    # Replace the seat map, unless seats on this trip have already been sold
+    seat_map = new_seat_map(total_seats, price, trip.get("bus_type", "standard"))
+    result = await db.bus_trips.update_one(
+        {"id": trip_id, "$expr": {"$eq": ["$available_seats", "$total_seats"]}},
+        {"$set": {"seat_map": seat_map, "total_seats": total_seats, "available_seats": total_seats}}
     )
+    if not result.modified_count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Seats on this trip have already been booked"
+        )
+    itinerary_graph.set_seats(trip_id, total_seats)
+    await invalidate_trip_searches(trip)
     
-    return [BusSeat(**seat) for seat in seats]
+    return [BusSeat(**seat) for seat in expand_seats(trip_id, total_seats, seat_map)]
 
 @api_router.get("/bus/seats/{trip_id}", response_model=List[BusSeat])
 async def get_bus_seats(trip_id: str):
     """
     Get all seats for a bus trip
     """
-    seats = await db.bus_seats.find({"trip_id": trip_id}).to_list(100)
-    return [BusSeat(**seat) for seat in seats]
+    trip = await db.bus_trips.find_one({"id": trip_id}, {"total_seats": 1, "seat_map": 1})
+    if not trip or "seat_map" not in trip:
+        return []
+    seats = expand_seats(trip_id, trip["total_seats"], trip["seat_map"])
+    return json_response(List[BusSeat], [BusSeat(**seat) for seat in seats])
 
 @api_router.post("/bus/bookings", response_model=BusTicketBooking)
 async def book_bus_ticket(
@@ -655,84 +1230,208 @@ async def book_bus_ticket(
             detail="Bus trip not found"
         )
     
-    # Check if seat exists and is available
-    seat = await db.bus_seats.find_one({
-        "trip_id": booking_data.trip_id,
-        "seat_number": booking_data.seat_number
-    })
+    # Claim the seat atomically and record the booking
+    def make_booking(price: float) -> Dict[str, Any]:
+        return BusTicketBooking(
+            user_id=current_user.id,
+            trip_id=booking_data.trip_id,
+            passenger_name=booking_data.passenger_name,
+            passenger_phone=booking_data.passenger_phone,
+            seat_number=booking_data.seat_number,
+            price=price
+        ).dict()
+    
+    booking = await seat_reservations.reserve(trip, booking_data.seat_number, make_booking)
+    BOOKINGS_CREATED.labels("bus").inc()
+    SEATS_SOLD.inc()
+    itinerary_graph.adjust_seats(trip["id"], -1)
+    await invalidate_trip_searches(trip)
     
-    if not seat:
+    return BusTicketBooking(**booking)
+
+@api_router.post("/bus/bookings/group", response_model=List[BusTicketBooking])
+async def book_bus_group(
+    booking_data: BusGroupBookingCreate,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Book seats for a group: all of them or none
+    """
+    seat_numbers = [passenger.seat_number for passenger in booking_data.passengers]
+    if any(seat_numbers) and not all(seat_numbers):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give a seat number for every passenger or for none"
+        )
+    
+    trip = await db.bus_trips.find_one({"id": booking_data.trip_id})
+    if not trip:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Seat not found"
+            detail="Bus trip not found"
         )
     
-    if not seat["is_available"]:
+    def make_bookings(seats: List[int], prices: List[float]) -> List[Dict[str, Any]]:
+        return [
+            BusTicketBooking(
+                user_id=current_user.id,
+                trip_id=booking_data.trip_id,
+                passenger_name=passenger.passenger_name,
+                passenger_phone=passenger.passenger_phone,
+                seat_number=str(seat),
+                price=price
+            ).dict()
+            for passenger, seat, price in zip(booking_data.passengers, seats, prices)
+        ]
+    
+    if all(seat_numbers):
+        bookings = await seat_reservations.reserve_group(trip, seat_numbers, make_bookings)
+    else:
+        bookings = await seat_reservations.reserve_adjacent(trip, len(seat_numbers), make_bookings)
+    BOOKINGS_CREATED.labels("bus").inc(len(bookings))
+    SEATS_SOLD.inc(len(bookings))
+    itinerary_graph.adjust_seats(trip["id"], -len(bookings))
+    await invalidate_trip_searches(trip)
+    
+    return json_response(List[BusTicketBooking], [BusTicketBooking(**booking) for booking in bookings])
+
+@api_router.post("/bus/holds", response_model=BusSeatHold)
+async def hold_bus_seats(
+    hold_data: BusSeatHoldCreate,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Hold seats for SEAT_HOLD_MINUTES while the user pays
+    """
+    trip = await db.bus_trips.find_one({"id": hold_data.trip_id})
+    if not trip:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Seat is already booked"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bus trip not found"
         )
     
-    # Create booking
-    booking = BusTicketBooking(
+    hold = BusSeatHold(
+        **hold_data.dict(),
         user_id=current_user.id,
-        trip_id=booking_data.trip_id,
-        passenger_name=booking_data.passenger_name,
-        passenger_phone=booking_data.passenger_phone,
-        seat_number=booking_data.seat_number,
-        price=seat["price"]
+        expires_at=datetime.utcnow() + timedelta(minutes=SEAT_HOLD_MINUTES)
     )
+    await seat_reservations.hold(trip, hold.dict())
+    itinerary_graph.adjust_seats(trip["id"], -len(hold.seat_numbers))
+    await invalidate_trip_searches(trip)
     
-    await db.bus_ticket_bookings.insert_one(booking.dict())
+    return hold
+
+@api_router.post("/bus/holds/{hold_id}/book", response_model=List[BusTicketBooking])
+async def book_bus_hold(
+    hold_id: str,
+    booking_data: BusHoldBookingCreate,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Turn a seat hold into bookings, one passenger per held seat
+    """
+    hold = await db.bus_seat_holds.find_one({"id": hold_id, "user_id": current_user.id}, {"_id": 0, "seat_numbers": 1})
+    if hold and len(hold["seat_numbers"]) != len(booking_data.passengers):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Expected {len(hold['seat_numbers'])} passengers for this hold"
+        )
     
-    # Update seat availability
-    await db.bus_seats.update_one(
-        {"trip_id": booking_data.trip_id, "seat_number": booking_data.seat_number},
-        {"$set": {"is_available": False}}
-    )
+    def make_bookings(hold: Dict[str, Any], seats: List[int], prices: List[float]) -> List[Dict[str, Any]]:
+        return [
+            BusTicketBooking(
+                user_id=current_user.id,
+                trip_id=hold["trip_id"],
+                passenger_name=passenger.passenger_name,
+                passenger_phone=passenger.passenger_phone,
+                seat_number=str(seat),
+                price=price
+            ).dict()
+            for passenger, seat, price in zip(booking_data.passengers, seats, prices)
+        ]
     
-    # Update available seats count in trip
-    await db.bus_trips.update_one(
-        {"id": booking_data.trip_id},
-        {"$inc": {"available_seats": -1}}
-    )
+    bookings = await seat_reservations.book_hold(hold_id, current_user.id, make_bookings)
+    BOOKINGS_CREATED.labels("bus").inc(len(bookings))
+    SEATS_SOLD.inc(len(bookings))
     
-    return booking
+    return json_response(List[BusTicketBooking], [BusTicketBooking(**booking) for booking in bookings])
+
+@api_router.put("/bus/holds/{hold_id}/cancel", response_model=BusSeatHold)
+async def cancel_bus_hold(
+    hold_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Release held seats before the hold expires
+    """
+    hold = await seat_reservations.cancel_hold(hold_id, current_user.id)
+    if not hold:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Seat hold not found"
+        )
+    await seat_holds_released(hold)
+    
+    return BusSeatHold(**hold)
+
+async def seat_holds_released(*holds: Dict[str, Any]):
+    """
+    Return the seats of released holds to the itinerary graph and searches
+    """
+    for hold in holds:
+        itinerary_graph.adjust_seats(hold["trip_id"], len(hold["seat_numbers"]))
+        trip = await db.bus_trips.find_one(
+            {"id": hold["trip_id"]},
+            {"_id": 0, "route_id": 1, "departure_date": 1, "route": 1}
+        )
+        if trip:
+            await invalidate_trip_searches(trip)
 
 @api_router.get("/bus/bookings/me", response_model=List[Dict[str, Any]])
-async def get_user_bus_bookings(current_user: UserInDB = Depends(get_current_user)):
+async def get_user_bus_bookings(
+    response: Response,
+    booking_status: Optional[BookingStatus] = Query(None, alias="status"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=100),
+    current_user: UserInDB = Depends(get_current_user)
+):
     """
-    Get all bus bookings for the current user
+    Get the bus bookings of the current user, newest first.
+    Trips, with their route and company snapshots, are joined in a single
+    aggregation; the cursor for the next page is returned in the
+    X-Next-Cursor header.
     """
-    bookings = await db.bus_ticket_bookings.find({"user_id": current_user.id}).to_list(100)
-    if not bookings:
-        return []
+    match_query = {"user_id": current_user.id, **keyset_filter(cursor, descending=True)}
+    if booking_status:
+        match_query["status"] = booking_status
+    
+    pipeline = [
+        {"$match": match_query},
+        {"$sort": {"_id": -1}},
+        {"$limit": limit + 1},
+        {"$lookup": {"from": "bus_trips", "localField": "trip_id", "foreignField": "id", "as": "trip"}},
+        {"$unwind": {"path": "$trip", "preserveNullAndEmptyArrays": True}},
+        {"$project": {"trip.seat_map": 0}},
+    ]
+    bookings = await db.bus_ticket_bookings.aggregate(pipeline).to_list(limit + 1)
+    bookings, next_cursor = split_page(bookings, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
-    # Get trip details for each booking
     result = []
     for booking in bookings:
-        booking_obj = BusTicketBooking(**booking)
-        trip = await db.bus_trips.find_one({"id": booking["trip_id"]})
+        trip = booking.pop("trip", None)
+        route = trip.pop("route", None) if trip else None
+        company = trip.pop("company", None) if trip else None
         
-        if trip:
-            route = await db.bus_routes.find_one({"id": trip["route_id"]})
-            company = await db.bus_companies.find_one({"id": trip["company_id"]})
-            
-            result.append({
-                "booking": booking_obj,
-                "trip": BusTrip(**trip) if trip else None,
-                "route": BusRoute(**route) if route else None,
-                "company": BusCompany(**company) if company else None
-            })
-        else:
-            result.append({
-                "booking": booking_obj,
-                "trip": None,
-                "route": None,
-                "company": None
-            })
-    
-    return result
+        result.append({
+            "booking": BusTicketBooking(**booking),
+            "trip": BusTrip(**trip) if trip else None,
+            "route": BusRoute(**route) if trip and route else None,
+            "company": BusCompany(**company) if trip and company else None
+        })
+    
+    return json_response(List[Dict[str, Any]], result, response)
 
 @api_router.put("/bus/bookings/{booking_id}/cancel", response_model=BusTicketBooking)
 async def cancel_bus_booking(
@@ -742,39 +1441,121 @@ async def cancel_bus_booking(
     """
     Cancel a bus booking
     """
-    # Find the booking
-    booking = await db.bus_ticket_bookings.find_one({
-        "id": booking_id,
-        "user_id": current_user.id
-    })
+    # Flip the status only once, so a repeated cancel cannot free the seat twice
+    booking = await db.bus_ticket_bookings.find_one_and_update(
+        {"id": booking_id, "user_id": current_user.id, "status": {"$ne": BookingStatus.CANCELED}},
+        {"$set": {"status": BookingStatus.CANCELED, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
     
     if not booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Booking not found"
-        )
-    
-    # Update booking status
-    await db.bus_ticket_bookings.update_one(
-        {"id": booking_id},
-        {"$set": {"status": BookingStatus.CANCELED, "updated_at": datetime.utcnow()}}
-    )
+        booking = await db.bus_ticket_bookings.find_one({
+            "id": booking_id,
+            "user_id": current_user.id
+        })
+        if not booking:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Booking not found"
+            )
+        return BusTicketBooking(**booking)
+    BOOKINGS_CANCELED.labels("bus").inc()
     
     # Make the seat available again
-    await db.bus_seats.update_one(
-        {"trip_id": booking["trip_id"], "seat_number": booking["seat_number"]},
-        {"$set": {"is_available": True}}
-    )
+    if await seat_reservations.release(booking["trip_id"], booking["seat_number"]):
+        itinerary_graph.adjust_seats(booking["trip_id"], 1)
+        trip = await db.bus_trips.find_one(
+            {"id": booking["trip_id"]},
+            {"_id": 0, "route_id": 1, "departure_date": 1, "route": 1}
+        )
+        if trip:
+            await invalidate_trip_searches(trip)
     
-    # Update available seats count in trip
-    await db.bus_trips.update_one(
-        {"id": booking["trip_id"]},
-        {"$inc": {"available_seats": 1}}
+    return BusTicketBooking(**booking)
+
+@api_router.post("/bus/itineraries", response_model=ItineraryResults)
+async def search_bus_itineraries(
+    search_data: ItinerarySearch,
+    limit: int = Query(5, ge=1, le=20)
+):
+    """
+    Fastest and cheapest itineraries, with up to `max_transfers` changes,
+    leaving on the requested day
+    """
+    candidates = itinerary_graph.search(
+        normalize_city(search_data.origin_city),
+        normalize_city(search_data.destination_city),
+        search_data.departure_date,
+        passengers_count=search_data.passengers_count,
+        max_transfers=search_data.max_transfers,
+        min_connection=timedelta(minutes=search_data.min_connection_minutes)
     )
-    
-    # Return updated booking
-    updated_booking = await db.bus_ticket_bookings.find_one({"id": booking_id})
-    return BusTicketBooking(**updated_booking)
+    itineraries = [
+        Itinerary(
+            legs=[ItineraryLeg(**vars(leg)) for leg in legs],
+            departure=legs[0].departure,
+            arrival=legs[-1].arrival,
+            duration_minutes=int((legs[-1].arrival - legs[0].departure).total_seconds() // 60),
+            transfers=len(legs) - 1,
+            price=round(sum(leg.price for leg in legs) * search_data.passengers_count, 2)
+        )
+        for legs in candidates
+    ]
+    return json_response(ItineraryResults, ItineraryResults(
+        fastest=sorted(itineraries, key=lambda i: (i.duration_minutes, i.price, i.transfers))[:limit],
+        cheapest=sorted(itineraries, key=lambda i: (i.price, i.duration_minutes, i.transfers))[:limit]
+    ))
+
+# City Routes
+@api_router.get("/cities/suggest", response_model=List[CitySuggestion])
+async def suggest_cities(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """
+    Autocomplete city names by prefix, in any supported spelling
+    """
+    return city_index.suggest(q, limit)
+
+# Admin Routes
+@api_router.get("/admin/indexes", response_model=List[Dict[str, Any]])
+async def get_index_report(current_user: UserInDB = Depends(get_admin_user)):
+    """
+    Report which endpoint queries are served by an index
+    """
+    return await index_usage_report(db)
+
+@api_router.get("/admin/stats", response_model=Dict[str, Any])
+async def get_runtime_stats(current_user: UserInDB = Depends(get_admin_user)):
+    """
+    Runtime counters of in-process pools and caches
+    """
+    return {
+        "password_hashing": password_pool.stats(),
+        "principal_cache": principal_cache.stats(),
+        "bus_search_cache": bus_search_cache.stats(),
+        "reference_data": reference_data.stats()
+    }
+
+# Readiness probe used by the launcher and load balancers
+@api_router.get("/ready", tags=["health"])
+async def readiness():
+    """
+    Ready once the startup bootstrap is done and MongoDB answers a ping
+    """
+    if not getattr(app.state, "indexes_ready", False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Startup bootstrap in progress"
+        )
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout=2)
+    except (PyMongoError, asyncio.TimeoutError):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database unavailable"
+        )
+    return {"status": "ready"}
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -784,6 +1565,12 @@ app.include_router(api_router)
 async def root():
     return {"message": "DzSmartBooking API is running", "status": "ok"}
 
+# Prometheus scrape endpoint, served outside /api
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
 # Health check endpoint for API router
 @api_router.get("/health", tags=["health"])
 async def api_health():
@@ -796,8 +1583,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Query counts and timings per request
+app.add_middleware(QueryProfilerMiddleware)
+
+# Request metrics per route template
+app.add_middleware(PrometheusMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -805,6 +1599,66 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def bootstrap_indexes():
+    app.state.indexes_ready = False
+    if RUN_MIGRATIONS:
+        await run_migrations(db)
+    await reference_data.load()
+    city_index.build(await known_city_names(db))
+    await itinerary_graph.load(db)
+    if WORKER_INDEX_REFRESH_SECONDS > 0:
+        app.state.index_refresh = asyncio.create_task(refresh_worker_indexes())
+    app.state.hold_sweeper = asyncio.create_task(sweep_seat_holds())
+    app.state.reference_refresh = asyncio.create_task(refresh_reference_data())
+    if redis_client is not None:
+        app.state.principal_listener = asyncio.create_task(principal_invalidations.listen())
+    app.state.indexes_ready = True
+
+async def refresh_worker_indexes():
+    """
+    Periodically reload the in-memory indexes from MongoDB
+    """
+    while True:
+        await asyncio.sleep(WORKER_INDEX_REFRESH_SECONDS)
+        try:
+            await itinerary_graph.load(db)
+        except PyMongoError as e:
+            logger.warning(f"In-memory index refresh failed: {e}")
+
+async def refresh_reference_data():
+    """
+    Periodically pick up companies and routes changed by other workers
+    """
+    while True:
+        await asyncio.sleep(REFERENCE_DATA_REFRESH_SECONDS)
+        try:
+            await reference_data.refresh()
+        except PyMongoError as e:
+            logger.warning(f"Reference data refresh failed: {e}")
+
+async def sweep_seat_holds():
+    """
+    Periodically free the seats of expired holds
+    """
+    while True:
+        await asyncio.sleep(SEAT_HOLD_SWEEP_SECONDS)
+        try:
+            expired = await seat_reservations.expire_holds()
+            if expired:
+                logger.info(f"Released {len(expired)} expired seat holds")
+                await seat_holds_released(*expired)
+        except PyMongoError as e:
+            logger.warning(f"Seat hold sweep failed: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task_name in ("index_refresh", "hold_sweeper", "reference_refresh", "principal_listener"):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
     client.close()
+    password_pool.shutdown()
+    if redis_client is not None:
+        await redis_client.aclose()
+    mark_worker_stopped()
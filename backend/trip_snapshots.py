@@ -0,0 +1,70 @@
+"""
+Route and company snapshots embedded in bus trips.
+
+Every trip document carries a copy of its route (with the city keys) and of
+its company under `route` and `company`, so searches, trip details and
+booking listings read one collection with one indexed query instead of
+joining bus_routes and bus_companies per call. The copies are written when
+a trip is created and rewritten on every trip of a route or company when
+that route or company changes.
+"""
+import logging
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+ROUTE_SNAPSHOT_FIELDS = (
+    "id", "company_id", "origin_city", "destination_city", "origin_city_key", "destination_city_key",
+    "distance_km", "duration_minutes", "created_at", "updated_at",
+)
+COMPANY_SNAPSHOT_FIELDS = ("id", "name", "logo", "description", "created_at", "updated_at")
+
+
+def route_snapshot(route: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: route[name] for name in ROUTE_SNAPSHOT_FIELDS if name in route}
+
+
+def company_snapshot(company: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: company[name] for name in COMPANY_SNAPSHOT_FIELDS if name in company}
+
+
+async def propagate_route(db, route: Dict[str, Any]) -> int:
+    """
+    Rewrite the route snapshot of every trip on `route`
+    """
+    result = await db.bus_trips.update_many({"route_id": route["id"]}, {"$set": {"route": route_snapshot(route)}})
+    return result.modified_count
+
+
+async def propagate_company(db, company: Dict[str, Any]) -> int:
+    """
+    Rewrite the company snapshot of every trip run by `company`
+    """
+    result = await db.bus_trips.update_many(
+        {"company_id": company["id"]}, {"$set": {"company": company_snapshot(company)}}
+    )
+    return result.modified_count
+
+
+async def backfill_trip_snapshots(db) -> int:
+    """
+    Embed route and company snapshots in trips created before they existed
+    """
+    route_ids = await db.bus_trips.distinct("route_id", {"route": {"$exists": False}})
+    company_ids = await db.bus_trips.distinct("company_id", {"company": {"$exists": False}})
+    updated = 0
+    async for route in db.bus_routes.find({"id": {"$in": route_ids}}, {"_id": 0}):
+        result = await db.bus_trips.update_many(
+            {"route_id": route["id"], "route": {"$exists": False}},
+            {"$set": {"route": route_snapshot(route)}}
+        )
+        updated += result.modified_count
+    async for company in db.bus_companies.find({"id": {"$in": company_ids}}, {"_id": 0}):
+        result = await db.bus_trips.update_many(
+            {"company_id": company["id"], "company": {"$exists": False}},
+            {"$set": {"company": company_snapshot(company)}}
+        )
+        updated += result.modified_count
+    if updated:
+        logger.info(f"Embedded route and company snapshots in {updated} trips")
+    return updated
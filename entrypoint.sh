@@ -5,37 +5,6 @@ set -e
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
 echo "Starting FastAPI backend"
-# Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
-BACKEND_PID=$!
-
-echo "Waiting for backend to start..."
-sleep 30
-
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
-
-# Start Nginx
-nginx -g 'daemon off;' &
-NGINX_PID=$!
-
-# Handle termination signals
-trap 'kill $BACKEND_PID $NGINX_PID; exit 0' SIGTERM SIGINT
-
-# Check if processes are still running
-while kill -0 $BACKEND_PID 2>/dev/null && kill -0 $NGINX_PID 2>/dev/null; do
-    sleep 1
-done
-
-# If we get here, one of the processes died
-if kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Nginx died, shutting down backend..."
-    kill $BACKEND_PID
-else
-    echo "Backend died, shutting down nginx..."
-    kill $NGINX_PID
-fi
-
-exit 1
+# The launcher runs the uvicorn workers, starts Nginx once the backend is
+# ready and drains both on SIGTERM
+exec python3 launcher.py --host 0.0.0.0 --port 8001 --proxy "nginx -g 'daemon off;'"
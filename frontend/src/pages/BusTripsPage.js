@@ -209,7 +209,7 @@ const BusTripsPage = () => {
           destination_city: destinationCity,
           departure_date: departureDate,
           passengers_count: parseInt(passengers) || 1
-        });
+        }, { params: { view: 'summary' } });
         
         setTrips(response.data);
       } catch (err) {
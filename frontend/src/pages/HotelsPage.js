@@ -134,10 +134,10 @@ const HotelsPage = () => {
             check_in_date: checkIn || new Date().toISOString(),
             check_out_date: checkOut || new Date(Date.now() + 86400000).toISOString(),
             guests_count: parseInt(guests) || 2
-          });
+          }, { params: { view: 'summary' } });
         } else {
           // Get all hotels if no search parameter
-          response = await axios.get(`${API}/hotels`);
+          response = await axios.get(`${API}/hotels`, { params: { view: 'summary' } });
         }
         
         setHotels(response.data);
@@ -0,0 +1,77 @@
+"""
+Shared fixtures.
+
+The backend is a flat set of modules loaded from backend/, the way uvicorn
+runs it. MongoDB is replaced by the in-memory database of `fake_mongo` and
+Redis by fakeredis; nothing needs a running server.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+from tests.fake_mongo import fake_database  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db(anyio_backend):
+    from indexes import ensure_indexes
+
+    database = fake_database()
+    await ensure_indexes(database)
+    return database
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """
+    The server module bound to a fresh in-memory database
+    """
+    import server as server_module
+    from passwords import pool_from_env
+
+    database = fake_database()
+    monkeypatch.setattr(server_module, "db", database)
+    for component in (
+        server_module.seat_reservations, server_module.room_inventory, server_module.reference_data
+    ):
+        monkeypatch.setattr(component, "db", database)
+    # The app shuts its password pool down when it stops; each test app gets its own
+    monkeypatch.setattr(server_module, "password_pool", pool_from_env(server_module.pwd_context))
+    server_module.principal_cache.clear()
+    server_module.bus_search_cache.local.clear()
+    return server_module
+
+
+@pytest.fixture
+def client(server):
+    from fastapi.testclient import TestClient
+
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def user(server, client):
+    """
+    A registered user and the headers authenticating as them
+    """
+    response = client.post("/api/auth/register", json={
+        "email": "amina@example.com",
+        "password": "secret-password",
+        "full_name": "Amina Test",
+        "phone_number": "0550000000",
+    })
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return {"id": body["user"]["id"], "headers": {"Authorization": f"Bearer {body['access_token']}"}}
@@ -0,0 +1,123 @@
+"""
+In-memory MongoDB for the tests.
+
+mongomock-motor stands in for Motor. Two gaps are filled here:
+
+- mongomock does not know the bitwise operators the seat maps rely on
+  (`$bitsAllClear` / `$bitsAllSet` queries and `$bit` updates), so they
+  are registered with the same semantics as the server's.
+- mongomock sends no command monitoring events, so every collection call
+  is reported to a `QueryProfiler` as the command the driver would send,
+  which lets `assert_max_queries` count queries per request.
+"""
+import functools
+from contextvars import ContextVar
+from itertools import count
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple
+
+import mongomock.collection
+import mongomock.filtering
+from mongomock_motor import AsyncMongoMockClient
+
+from profiler import QueryProfiler
+
+
+def _mask(value) -> int:
+    # A bit mask, or a list of bit positions
+    if isinstance(value, list):
+        return sum(1 << position for position in value)
+    return int(value)
+
+
+def _bit_update(document, field_name, value):
+    key = int(field_name) if isinstance(document, list) else field_name
+    current = document[key]
+    for operation, mask in value.items():
+        if operation == "and":
+            current &= mask
+        elif operation == "or":
+            current |= mask
+        else:
+            current ^= mask
+    document[key] = type(document[key])(current)
+
+
+def install_bitwise_operators():
+    operators = mongomock.filtering._filterer_inst._operator_map
+    operators["$bitsAllClear"] = lambda value, mask: isinstance(value, int) and value & _mask(mask) == 0
+    operators["$bitsAllSet"] = lambda value, mask: isinstance(value, int) and value & _mask(mask) == _mask(mask)
+    mongomock.collection._updaters["$bit"] = _bit_update
+
+
+# Collection method -> command name and where its filter goes
+_COMMANDS: Dict[str, Tuple[str, Optional[str]]] = {
+    "find": ("find", "filter"),
+    "find_one": ("find", "filter"),
+    "count_documents": ("count", "query"),
+    "estimated_document_count": ("count", None),
+    "distinct": ("distinct", "query"),
+    "aggregate": ("aggregate", "pipeline"),
+    "find_one_and_update": ("findAndModify", "query"),
+    "find_one_and_delete": ("findAndModify", "query"),
+    "insert_one": ("insert", None),
+    "insert_many": ("insert", None),
+    "update_one": ("update", "updates"),
+    "update_many": ("update", "updates"),
+    "delete_one": ("delete", "deletes"),
+    "delete_many": ("delete", "deletes"),
+}
+
+_listener = QueryProfiler(slow_seconds=float("inf"))
+_request_ids = count()
+# mongomock implements some calls with others; only the outermost one is a command
+_in_command: ContextVar[bool] = ContextVar("in_command", default=False)
+
+
+def _command(collection, method: str, args, kwargs) -> Dict[str, Any]:
+    name, field = _COMMANDS[method]
+    command: Dict[str, Any] = {name: collection.name}
+    if method == "distinct":
+        command["key"] = args[0] if args else kwargs.get("key")
+        command["query"] = args[1] if len(args) > 1 else kwargs.get("filter")
+    elif field in ("updates", "deletes"):
+        command[field] = [{"q": args[0] if args else kwargs.get("filter")}]
+    elif field is not None:
+        command[field] = args[0] if args else kwargs.get("filter", kwargs.get("pipeline"))
+    return command
+
+
+def _reporting(method: str, call):
+    @functools.wraps(call)
+    def wrapper(self, *args, **kwargs):
+        if _in_command.get():
+            return call(self, *args, **kwargs)
+        command = _command(self, method, args, kwargs)
+        request_id = next(_request_ids)
+        _listener.started(SimpleNamespace(
+            command_name=next(iter(command)), command=command,
+            database_name=self.database.name, request_id=request_id
+        ))
+        token = _in_command.set(True)
+        try:
+            return call(self, *args, **kwargs)
+        finally:
+            _in_command.reset(token)
+            _listener.succeeded(SimpleNamespace(request_id=request_id, duration_micros=0))
+    return wrapper
+
+
+def install_command_events():
+    collection = mongomock.collection.Collection
+    for method in _COMMANDS:
+        call = getattr(collection, method)
+        if not getattr(call, "_reports_commands", False):
+            wrapper = _reporting(method, call)
+            wrapper._reports_commands = True
+            setattr(collection, method, wrapper)
+
+
+def fake_database(name: str = "test"):
+    install_bitwise_operators()
+    install_command_events()
+    return AsyncMongoMockClient()[name]
@@ -0,0 +1,98 @@
+import pytest
+
+from cities import CITY_NAMES, CityPrefixIndex, backfill_city_keys, city_name, normalize_city
+
+
+@pytest.mark.parametrize("name", ["Algiers", "ALGER", "alger ", "Dzayer", "الجزائر", "الجزائر العاصمة"])
+def test_algiers_aliases(name):
+    assert normalize_city(name) == "algiers"
+
+
+@pytest.mark.parametrize("name", ["Sidi Bel Abbès", "sidi-bel-abbes", "Sidi_Bel_Abbes", "Sidi Belabbes", "سيدي بلعباس"])
+def test_accents_separators_and_scripts_fold_to_one_key(name):
+    assert normalize_city(name) == "sidi_bel_abbes"
+
+
+def test_arabic_letter_variants_fold_together():
+    assert normalize_city("سطيف") == normalize_city("Sétif") == "setif"
+    # Taa marbuta and haa are the same letter for matching
+    assert normalize_city("عنابه") == "annaba"
+
+
+@pytest.mark.parametrize("key", sorted(CITY_NAMES))
+def test_every_wilaya_has_one_key_in_every_script(key):
+    names = CITY_NAMES[key]
+    assert any("\u0600" <= char <= "\u06ff" for name in names for char in name)
+    assert {normalize_city(name) for name in names} == {key}
+    assert key.isascii()
+
+
+def test_bejaia_in_both_scripts():
+    assert normalize_city("بجاية") == normalize_city("Béjaïa") == normalize_city("Bougie") == "bejaia"
+
+
+def test_unknown_cities_get_a_latin_key():
+    assert normalize_city("  Bou Saâda ") == "bou_saada"
+    assert city_name("bou_saada") == "bou_saada"
+    assert city_name("oran") == "Oran"
+    # Arabic names outside the aliases are transliterated
+    assert normalize_city("بوسعادة") == "bousadh"
+    assert normalize_city("الخروب") == "alkhroub"
+
+
+def test_prefix_suggestions_name_each_city_once():
+    index = CityPrefixIndex()
+    index.build(["Bou Saâda"])
+    assert [item["key"] for item in index.suggest("alg")] == ["algiers"]
+    # Latin prefixes do not match the Arabic article of other cities
+    assert [item["key"] for item in index.suggest("al")] == ["algiers"]
+    assert index.suggest("sétif")[0] == {"key": "setif", "name": "Setif", "matched": "Setif"}
+    assert index.suggest("وهر")[0]["key"] == "oran"
+    assert index.suggest("بجا")[0] == {"key": "bejaia", "name": "Bejaia", "matched": "بجاية"}
+    assert index.suggest("el o")[0] == {"key": "el_oued", "name": "El Oued", "matched": "El Oued"}
+    assert index.suggest("bou s")[0] == {"key": "bou_saada", "name": "Bou Saâda", "matched": "Bou Saâda"}
+    assert index.suggest("  ") == []
+    assert len(index.suggest("b", limit=2)) == 2
+
+
+def test_added_cities_become_suggestible_once():
+    index = CityPrefixIndex()
+    index.build()
+    assert index.suggest("el k") == []
+    index.add("El Khroub")
+    index.add("El Khroub")
+    index.add("الخروب")
+    assert index.suggest("el k") == [{"key": "el_khroub", "name": "El Khroub", "matched": "El Khroub"}]
+    assert [item["key"] for item in index.suggest("الخ")] == ["alkhroub"]
+
+
+@pytest.mark.anyio
+async def test_backfill_stores_canonical_keys(db):
+    await db.hotels.insert_many([{"id": "h1", "city": "Alger"}, {"id": "h2", "city": "Oran", "city_key": "oran"}])
+    await db.bus_routes.insert_one({"id": "r1", "origin_city": "وهران", "destination_city": "Sidi Bel Abbès"})
+
+    assert await backfill_city_keys(db) == 3
+    assert (await db.hotels.find_one({"id": "h1"}))["city_key"] == "algiers"
+    route = await db.bus_routes.find_one({"id": "r1"})
+    assert (route["origin_city_key"], route["destination_city_key"]) == ("oran", "sidi_bel_abbes")
+    assert await backfill_city_keys(db) == 0
+
+
+@pytest.mark.anyio
+async def test_backfill_replaces_keys_the_aliases_no_longer_give(db):
+    # Keys stored when بجاية was not an alias yet
+    await db.hotels.insert_one({"id": "h1", "city": "بجاية", "city_key": "بجايه"})
+    await db.bus_routes.insert_one({
+        "id": "r1", "origin_city": "Oran", "destination_city": "بجاية",
+        "origin_city_key": "oran", "destination_city_key": "بجايه",
+    })
+    await db.bus_trips.insert_one({
+        "id": "t1", "route_id": "r1", "route": {"id": "r1", "origin_city_key": "oran", "destination_city_key": "بجايه"}
+    })
+
+    assert await backfill_city_keys(db) == 2
+    assert (await db.hotels.find_one({"id": "h1"}))["city_key"] == "bejaia"
+    assert (await db.bus_routes.find_one({"id": "r1"}))["destination_city_key"] == "bejaia"
+    trip = await db.bus_trips.find_one({"id": "t1"})
+    assert (trip["route"]["origin_city_key"], trip["route"]["destination_city_key"]) == ("oran", "bejaia")
+    assert await backfill_city_keys(db) == 0
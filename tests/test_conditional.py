@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from conditional import entity_tag, last_modified
+
+HOTEL = {
+    "name": "Hotel Es Salam",
+    "city": "Oran",
+    "address": "1 Front de Mer",
+    "description": "Sea view",
+    "stars": 4,
+}
+
+pytestmark = pytest.mark.anyio
+
+
+def test_stamped_documents_are_tagged_by_id_and_stamp():
+    stamp = datetime(2030, 1, 1, 12, 0, 0, 500)
+    documents = [{"id": "a", "updated_at": stamp, "name": "A"}]
+    assert entity_tag(documents) == entity_tag([{"id": "a", "updated_at": stamp, "name": "B"}])
+    assert entity_tag(documents) != entity_tag([{"id": "a", "updated_at": stamp + timedelta(seconds=1)}])
+    assert entity_tag(documents).startswith('W/"')
+    assert last_modified(documents).isoformat() == "2030-01-01T12:00:00+00:00"
+
+
+def test_unstamped_documents_are_tagged_by_content():
+    assert entity_tag([{"id": "a", "name": "A"}]) != entity_tag([{"id": "a", "name": "B"}])
+    assert last_modified([{"id": "a", "name": "A"}]) is None
+    assert last_modified([]) is None
+
+
+def test_headers_are_part_of_the_tag():
+    documents = [{"id": "a"}]
+    assert entity_tag(documents, b"x-next-cursor:abc") != entity_tag(documents)
+
+
+def test_hotel_revalidation(client):
+    hotel = client.post("/api/hotels", json=HOTEL).json()
+    first = client.get(f"/api/hotels/{hotel['id']}")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"].startswith("public, max-age=")
+    assert "last-modified" in first.headers
+
+    revalidated = client.get(f"/api/hotels/{hotel['id']}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+
+    assert client.get(f"/api/hotels/{hotel['id']}", headers={"If-None-Match": '"stale", *'}).status_code == 304
+    assert client.get(f"/api/hotels/{hotel['id']}", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_if_modified_since_applies_without_if_none_match(client):
+    hotel = client.post("/api/hotels", json=HOTEL).json()
+    modified = client.get(f"/api/hotels/{hotel['id']}").headers["last-modified"]
+    assert client.get(f"/api/hotels/{hotel['id']}", headers={"If-Modified-Since": modified}).status_code == 304
+
+    earlier = format_datetime(datetime(2000, 1, 1, tzinfo=timezone.utc), usegmt=True)
+    assert client.get(f"/api/hotels/{hotel['id']}", headers={"If-Modified-Since": earlier}).status_code == 200
+    assert client.get(f"/api/hotels/{hotel['id']}", headers={"If-Modified-Since": "not a date"}).status_code == 200
+    # If-None-Match wins when both are sent
+    assert client.get(
+        f"/api/hotels/{hotel['id']}", headers={"If-Modified-Since": modified, "If-None-Match": '"stale"'}
+    ).status_code == 200
+
+
+def test_updating_a_company_changes_its_etag(client):
+    company = client.post("/api/bus/companies", json={"name": "Sogral"}).json()
+    etag = client.get(f"/api/bus/companies/{company['id']}").headers["etag"]
+    listed = client.get("/api/bus/companies").headers["etag"]
+
+    assert client.put(f"/api/bus/companies/{company['id']}", json={"name": "Sogral Express"}).status_code == 200
+
+    refreshed = client.get(f"/api/bus/companies/{company['id']}", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.json()["name"] == "Sogral Express"
+    assert refreshed.headers["etag"] != etag
+    assert client.get("/api/bus/companies", headers={"If-None-Match": listed}).status_code == 200
+
+
+async def test_unstamped_rooms_change_their_etag_with_content(server, client):
+    room = {"id": "r1", "hotel_id": "h1", "name": "Double", "description": "", "price_per_night": 90.0, "capacity": 2}
+    await server.db.rooms.insert_one(dict(room))
+    etag = client.get("/api/rooms/hotel/h1").headers["etag"]
+    assert client.get("/api/rooms/hotel/h1", headers={"If-None-Match": etag}).status_code == 304
+
+    await server.db.rooms.update_one({"id": "r1"}, {"$set": {"price_per_night": 95.0}})
+    assert client.get("/api/rooms/hotel/h1", headers={"If-None-Match": etag}).status_code == 200
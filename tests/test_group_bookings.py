@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+
+PASSENGER = {"passenger_name": "Amina", "passenger_phone": "0550000000"}
+
+
+@pytest.fixture
+def trip(client):
+    company = client.post("/api/bus/companies", json={"name": "Sogral"}).json()
+    route = client.post("/api/bus/routes", json={
+        "company_id": company["id"], "origin_city": "Oran", "destination_city": "Algiers",
+        "distance_km": 430, "duration_minutes": 300,
+    }).json()
+    return client.post("/api/bus/trips", json={
+        "route_id": route["id"], "company_id": company["id"], "departure_date": datetime(2030, 5, 1).isoformat(),
+        "departure_time": "08:00", "arrival_time": "13:00", "available_seats": 6, "total_seats": 6, "price": 900.0,
+    }).json()
+
+
+def book_group(client, user, trip, passengers):
+    return client.post("/api/bus/bookings/group", headers=user["headers"], json={
+        "trip_id": trip["id"], "passengers": passengers
+    })
+
+
+def test_group_without_seats_gets_adjacent_seats(client, user, trip):
+    single = client.post("/api/bus/bookings", headers=user["headers"], json={
+        "trip_id": trip["id"], "seat_number": "2", **PASSENGER
+    })
+    assert single.status_code == 200, single.text
+
+    response = book_group(client, user, trip, [PASSENGER] * 3)
+    assert response.status_code == 200, response.text
+    assert [booking["seat_number"] for booking in response.json()] == ["3", "4", "5"]
+    assert client.get(f"/api/bus/trips/{trip['id']}").json()["trip"]["available_seats"] == 2
+
+
+def test_group_without_an_adjacent_run_is_refused(client, user, trip):
+    for seat in ("2", "5"):
+        client.post("/api/bus/bookings", headers=user["headers"], json={
+            "trip_id": trip["id"], "seat_number": seat, **PASSENGER
+        })
+    response = book_group(client, user, trip, [PASSENGER] * 3)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "No 3 adjacent seats available"
+    assert client.get(f"/api/bus/trips/{trip['id']}").json()["trip"]["available_seats"] == 4
+
+
+def test_group_names_a_seat_for_every_passenger_or_none(client, user, trip):
+    response = book_group(client, user, trip, [{**PASSENGER, "seat_number": "1"}, PASSENGER])
+    assert response.status_code == 400
+    chosen = book_group(client, user, trip, [{**PASSENGER, "seat_number": "6"}, {**PASSENGER, "seat_number": "1"}])
+    assert [booking["seat_number"] for booking in chosen.json()] == ["6", "1"]
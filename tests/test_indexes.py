@@ -0,0 +1,39 @@
+import pytest
+
+from indexes import INDEX_SPECS, QueryShape, _coverage, ensure_indexes, index_usage_report
+
+pytestmark = pytest.mark.anyio
+
+
+def test_unique_index_matched_on_all_its_keys_covers_the_query():
+    shape = QueryShape("PUT /api/bus/bookings/{booking_id}/cancel", "bus_ticket_bookings", ("id", "user_id"))
+    indexes = [(("_id",), True), (("id",), True), (("user_id", "_id"), False)]
+    assert _coverage(shape, indexes) == ("covered", ["id"])
+
+
+def test_non_unique_prefix_is_partial():
+    shape = QueryShape("GET /api/hotels", "hotels", ("city_key", "stars"))
+    assert _coverage(shape, [(("city_key",), False)]) == ("partial", ["city_key"])
+    assert _coverage(shape, [(("city_key", "stars"), False)]) == ("covered", ["city_key", "stars"])
+    assert _coverage(shape, [(("name",), True)]) == ("collection_scan", None)
+
+
+def test_regex_fields_cannot_use_an_index():
+    shape = QueryShape("search", "hotels", ("name",), regex_fields=("name",))
+    assert _coverage(shape, [(("name",), True)]) == ("collection_scan", None)
+
+
+async def test_lookups_by_id_are_reported_as_covered(db):
+    assert (await ensure_indexes(db))["failed"] == []
+    report = await index_usage_report(db)
+    assert {row["collection"] for row in report} <= set(INDEX_SPECS)
+    status = {(row["endpoint"], row["collection"]): row["status"] for row in report}
+    for endpoint, collection in (
+        ("PUT /api/bookings/{booking_id}/cancel", "bookings"),
+        ("PUT /api/bus/bookings/{booking_id}/cancel", "bus_ticket_bookings"),
+        ("POST /api/bus/holds/{hold_id}/book", "bus_seat_holds"),
+        ("PUT /api/bus/holds/{hold_id}/cancel", "bus_seat_holds"),
+    ):
+        assert status[endpoint, collection] == "covered"
+    # The stars range is filtered after the city_key lookup
+    assert [row["endpoint"] for row in report if row["status"] != "covered"] == ["GET /api/hotels"]
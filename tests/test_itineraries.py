@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from itineraries import ItineraryGraph, trip_times
+
+DAY = datetime(2030, 5, 1)
+
+
+def route(route_id, origin, destination, duration_minutes=None):
+    return {
+        "id": route_id,
+        "origin_city": origin.title(),
+        "destination_city": destination.title(),
+        "origin_city_key": origin,
+        "destination_city_key": destination,
+        "duration_minutes": duration_minutes,
+    }
+
+
+def trip(trip_id, route_id, departure_time, price, seats=10, day=DAY, arrival_time="00:00"):
+    return {
+        "id": trip_id,
+        "route_id": route_id,
+        "company_id": "c1",
+        "departure_date": day,
+        "departure_time": departure_time,
+        "arrival_time": arrival_time,
+        "price": price,
+        "available_seats": seats,
+    }
+
+
+@pytest.fixture
+def graph():
+    """
+    Oran to Algiers directly (fast, dear) or through Blida (slower, cheaper)
+    """
+    graph = ItineraryGraph()
+    graph.add_route(route("direct", "oran", "algiers", 300))
+    graph.add_route(route("west", "oran", "blida", 240))
+    graph.add_route(route("east", "blida", "algiers", 60))
+    graph.add_trip(trip("d1", "direct", "08:00", 2000.0))
+    graph.add_trip(trip("w1", "west", "07:00", 800.0))
+    graph.add_trip(trip("e1", "east", "11:45", 300.0))
+    # Too tight a connection after w1 arrives at 11:00
+    graph.add_trip(trip("e0", "east", "11:10", 100.0))
+    return graph
+
+
+def trip_ids(itineraries):
+    return sorted([leg.trip_id for leg in legs] for legs in itineraries)
+
+
+def test_trip_times_roll_arrival_past_midnight():
+    assert trip_times(trip("t", "r", "22:30", 1.0, arrival_time="01:15"), None) == (
+        DAY + timedelta(hours=22, minutes=30), DAY + timedelta(days=1, hours=1, minutes=15)
+    )
+    assert trip_times(trip("t", "r", "08:00", 1.0), 90)[1] == DAY + timedelta(hours=9, minutes=30)
+
+
+def test_search_keeps_the_fastest_and_the_cheapest(graph):
+    assert trip_ids(graph.search("oran", "algiers", DAY)) == [["d1"], ["w1", "e1"]]
+
+
+def test_transfers_are_limited(graph):
+    assert trip_ids(graph.search("oran", "algiers", DAY, max_transfers=0)) == [["d1"]]
+
+
+def test_dominated_itineraries_are_dropped(graph):
+    # Leaves earlier, arrives later and costs more than d1
+    graph.add_route(route("coastal", "oran", "algiers", 420))
+    graph.add_trip(trip("c1", "coastal", "07:30", 2500.0))
+    assert trip_ids(graph.search("oran", "algiers", DAY)) == [["d1"], ["w1", "e1"]]
+
+
+def test_seats_follow_bookings(graph):
+    graph.adjust_seats("d1", -10)
+    assert trip_ids(graph.search("oran", "algiers", DAY)) == [["w1", "e1"]]
+    graph.set_seats("d1", 3)
+    assert trip_ids(graph.search("oran", "algiers", DAY, passengers_count=4)) == [["w1", "e1"]]
+    assert ["d1"] in trip_ids(graph.search("oran", "algiers", DAY, passengers_count=3))
+
+
+def test_only_trips_leaving_on_the_day_start_an_itinerary(graph):
+    assert graph.search("oran", "algiers", DAY + timedelta(days=1)) == []
+    graph.add_trip(trip("d3", "direct", "06:00", 1500.0, day=DAY + timedelta(days=1)))
+    assert trip_ids(graph.search("oran", "algiers", DAY + timedelta(days=1))) == [["d3"]]
+
+
+def test_removed_and_replaced_trips(graph):
+    graph.remove_trip("d1")
+    assert trip_ids(graph.search("oran", "algiers", DAY)) == [["w1", "e1"]]
+    graph.add_trip(trip("e1", "east", "15:00", 50.0))
+    assert len(graph) == 3
+    (legs,) = graph.search("oran", "algiers", DAY)
+    assert legs[-1].departure == DAY + timedelta(hours=15)
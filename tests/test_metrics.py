@@ -0,0 +1,65 @@
+from prometheus_client import REGISTRY
+from pymongo.errors import ServerSelectionTimeoutError
+
+HOTEL = {"name": "Hotel Es Salam", "city": "Oran", "address": "1 Front de Mer", "description": "Sea view", "stars": 4}
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_requests_are_labelled_with_their_route_template(client):
+    route = "/api/hotels/{hotel_id}"
+    hotel = client.post("/api/hotels", json=HOTEL).json()
+    ok_before = sample("http_responses_total", method="GET", route=route, status="200")
+    missing_before = sample("http_responses_total", method="GET", route=route, status="404")
+    observed_before = sample("http_request_duration_seconds_count", method="GET", route=route)
+
+    assert client.get(f"/api/hotels/{hotel['id']}").status_code == 200
+    assert client.get("/api/hotels/no-such-hotel").status_code == 404
+
+    assert sample("http_responses_total", method="GET", route=route, status="200") == ok_before + 1
+    assert sample("http_responses_total", method="GET", route=route, status="404") == missing_before + 1
+    assert sample("http_request_duration_seconds_count", method="GET", route=route) == observed_before + 2
+
+    scraped = client.get("/metrics")
+    assert scraped.status_code == 200
+    assert scraped.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/api/hotels/{hotel_id}"}' in scraped.text
+    # Raw paths never become labels
+    assert hotel["id"] not in scraped.text
+    assert "no-such-hotel" not in scraped.text
+
+
+def test_unknown_paths_share_one_label(client):
+    before = sample("http_responses_total", method="GET", route="unmatched", status="404")
+    client.get("/api/no/such/path/1")
+    client.get("/api/no/such/path/2")
+    assert sample("http_responses_total", method="GET", route="unmatched", status="404") == before + 2
+
+
+def test_static_routes_are_labelled_with_their_path(client, user):
+    before = sample("http_responses_total", method="GET", route="/api/users/me", status="200")
+    client.get("/api/users/me", headers=user["headers"])
+    assert sample("http_responses_total", method="GET", route="/api/users/me", status="200") == before + 1
+
+
+def test_ready_once_the_database_answers(client):
+    assert client.get("/api/ready").json() == {"status": "ready"}
+
+
+def test_not_ready_when_the_database_ping_fails(server, client, monkeypatch):
+    async def unreachable(*args, **kwargs):
+        raise ServerSelectionTimeoutError("no servers")
+
+    monkeypatch.setattr(server.db, "command", unreachable)
+    response = client.get("/api/ready")
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Database unavailable"
+
+
+def test_not_ready_before_the_bootstrap(server, client, monkeypatch):
+    monkeypatch.setattr(server.app.state, "indexes_ready", False)
+    response = client.get("/api/ready")
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Startup bootstrap in progress"
@@ -0,0 +1,84 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+HOTEL = {"city": "Oran", "address": "Front de Mer", "description": "Sea view", "stars": 3}
+MALFORMED = ["not-a-cursor", "e30", base64.urlsafe_b64encode(b'{"id": "123"}').decode(), "%%%"]
+
+
+def walk(client, path, limit, cursor=None, **kwargs):
+    """
+    Follow the next-page cursor to the end; returns the pages
+    """
+    pages = []
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(path, params=params, **kwargs)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    from bson import ObjectId
+
+    object_id = ObjectId()
+    assert decode_cursor(encode_cursor({"_id": object_id})) == object_id
+    assert "=" not in encode_cursor({"_id": object_id})
+
+
+@pytest.mark.parametrize("cursor", MALFORMED)
+def test_malformed_cursors_are_rejected(client, user, cursor):
+    assert client.get("/api/hotels", params={"cursor": cursor}).status_code == 400
+    assert client.get("/api/bus/companies", params={"cursor": cursor}).status_code == 400
+    response = client.get("/api/bus/bookings/me", params={"cursor": cursor}, headers=user["headers"])
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
+
+
+def test_hotels_are_paged_to_the_end_without_gaps_or_repeats(client):
+    names = [f"Hotel {number:02d}" for number in range(11)]
+    for name in names:
+        assert client.post("/api/hotels", json={**HOTEL, "name": name}).status_code == 200
+
+    pages = walk(client, "/api/hotels", limit=4)
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [hotel["name"] for page in pages for hotel in page] == names
+
+
+def test_an_exact_last_page_has_no_next_cursor(client):
+    for number in range(4):
+        client.post("/api/hotels", json={**HOTEL, "name": f"Hotel {number}"})
+    assert [len(page) for page in walk(client, "/api/hotels", limit=2)] == [2, 2]
+
+
+def test_rows_added_while_paging_are_neither_lost_nor_repeated(client):
+    for number in range(5):
+        client.post("/api/bus/companies", json={"name": f"Company {number}"})
+    first = client.get("/api/bus/companies", params={"limit": 3})
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+    client.post("/api/bus/companies", json={"name": "Company 5"})
+
+    rest = walk(client, "/api/bus/companies", limit=2, cursor=cursor)
+    names = [company["name"] for company in first.json()] + [company["name"] for page in rest for company in page]
+    assert names == [f"Company {number}" for number in range(6)]
+
+
+@pytest.mark.anyio
+async def test_bus_bookings_are_paged_newest_first(server, client, user):
+    await server.db.bus_ticket_bookings.insert_many([
+        {
+            "id": f"b{number}", "user_id": user["id"], "trip_id": "gone", "passenger_name": "Amina",
+            "passenger_phone": "0550000000", "seat_number": str(number), "price": 900.0,
+            "status": "confirmed", "created_at": datetime(2030, 1, 1), "updated_at": datetime(2030, 1, 1),
+        }
+        for number in range(1, 8)
+    ])
+    pages = walk(client, "/api/bus/bookings/me", limit=3, headers=user["headers"])
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [item["booking"]["id"] for page in pages for item in page] == [f"b{number}" for number in range(7, 0, -1)]
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
+
+from passwords import PasswordHashingPool
+
+pytestmark = pytest.mark.anyio
+
+
+class BlockingContext:
+    """
+    A stand-in for CryptContext whose hashing waits until released
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def hash(self, password):
+        self.release.wait(5)
+        return f"hashed:{password}"
+
+    def verify(self, plain_password, hashed_password):
+        return hashed_password == self.hash(plain_password)
+
+
+def sample(name):
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+async def test_a_full_pool_refuses_with_503_and_records_queue_wait():
+    context = BlockingContext()
+    pool = PasswordHashingPool(context, workers=1, queue_limit=1)
+    waits_before = sample("password_hash_queue_wait_seconds_count")
+    rejected_before = sample("password_hash_rejected_total")
+    try:
+        # One call runs on the worker, one waits in the queue
+        running = asyncio.ensure_future(pool.hash("first"))
+        queued = asyncio.ensure_future(pool.hash("second"))
+        await asyncio.sleep(0)
+        assert pool.stats()["in_flight"] == 2
+
+        with pytest.raises(HTTPException) as refused:
+            await pool.verify("third", "hashed:third")
+        assert refused.value.status_code == 503
+        assert refused.value.headers == {"Retry-After": "1"}
+
+        context.release.set()
+        assert await running == "hashed:first"
+        assert await queued == "hashed:second"
+    finally:
+        context.release.set()
+        pool.shutdown()
+
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["in_flight"] == 0
+    assert stats["queue_wait"]["count"] == 2
+    assert sample("password_hash_queue_wait_seconds_count") == waits_before + 2
+    assert sample("password_hash_rejected_total") == rejected_before + 1
+
+
+def test_admin_endpoints_require_an_admin(server, client, user, monkeypatch):
+    for path in ("/api/admin/stats", "/api/admin/indexes"):
+        assert client.get(path).status_code == 401
+        assert client.get(path, headers=user["headers"]).status_code == 403
+
+    monkeypatch.setattr(server, "ADMIN_EMAILS", {"amina@example.com"})
+    stats = client.get("/api/admin/stats", headers=user["headers"])
+    assert stats.status_code == 200
+    assert stats.json()["password_hashing"]["workers"] >= 1
+    assert client.get("/api/admin/indexes", headers=user["headers"]).status_code == 200
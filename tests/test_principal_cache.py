@@ -0,0 +1,73 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from cache import TTLCache
+from invalidation import InvalidationChannel
+from profiler import capture_requests
+
+
+def queries(client, method, path, **kwargs):
+    with capture_requests() as captured:
+        response = getattr(client, method)(path, **kwargs)
+    assert response.status_code == 200, response.text
+    (recorder,) = captured
+    return response, recorder.count
+
+
+def test_cached_principal_skips_the_user_lookup(client, user):
+    _, first = queries(client, "get", "/api/users/me", headers=user["headers"])
+    _, second = queries(client, "get", "/api/users/me", headers=user["headers"])
+    assert (first, second) == (1, 0)
+
+
+def test_profile_update_evicts_the_stale_principal(server, client, user):
+    client.get("/api/users/me", headers=user["headers"])
+    assert server.principal_cache.get(user["id"]) is not None
+
+    client.put("/api/users/me", headers=user["headers"], json={"full_name": "Amina Renamed"})
+    assert server.principal_cache.get(user["id"]) is None
+    response, count = queries(client, "get", "/api/users/me", headers=user["headers"])
+    assert response.json()["full_name"] == "Amina Renamed"
+    assert count == 1
+
+
+@pytest.mark.anyio
+async def test_deactivated_users_lose_access_at_once(server, client, user):
+    assert client.get("/api/users/me", headers=user["headers"]).status_code == 200
+
+    await server.deactivate_user(user["id"])
+    assert client.get("/api/users/me", headers=user["headers"]).status_code == 401
+    login = client.post("/api/auth/login", data={"username": "amina@example.com", "password": "secret-password"})
+    assert login.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_invalidations_reach_the_other_workers():
+    redis_server = fakeredis.FakeServer()
+    here, there = TTLCache(maxsize=10, ttl=60), TTLCache(maxsize=10, ttl=60)
+    publisher = InvalidationChannel(here, "principals", fakeredis.FakeAsyncRedis(server=redis_server))
+    subscriber = InvalidationChannel(there, "principals", fakeredis.FakeAsyncRedis(server=redis_server))
+
+    there.set("stale", "cleared on subscribe")
+    listener = asyncio.create_task(subscriber.listen())
+    try:
+        for _ in range(100):
+            if there.get("stale") is None:
+                break
+            await asyncio.sleep(0.01)
+        assert there.get("stale") is None
+
+        here.set("u1", "principal")
+        there.set("u1", "principal")
+        there.set("u2", "principal")
+        await publisher.invalidate("u1")
+        for _ in range(100):
+            if there.get("u1") is None:
+                break
+            await asyncio.sleep(0.01)
+        assert here.get("u1") is None and there.get("u1") is None
+        assert there.get("u2") == "principal"
+    finally:
+        listener.cancel()
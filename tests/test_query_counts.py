@@ -0,0 +1,135 @@
+"""
+Queries per request of the endpoints that used to issue one query per item.
+
+Each test creates several items, so a query per item would exceed the bound.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from profiler import assert_max_queries, capture_requests, record_queries
+
+DAY = datetime(2030, 5, 1)
+ITEMS = 3
+
+
+@pytest.fixture
+def trips(client):
+    """
+    Trips from Oran to Algiers on DAY, each run by its own company
+    """
+    trip_ids = []
+    for number in range(ITEMS):
+        company = client.post("/api/bus/companies", json={"name": f"Company {number}"}).json()
+        route = client.post("/api/bus/routes", json={
+            "company_id": company["id"],
+            "origin_city": "Oran",
+            "destination_city": "Alger",
+            "distance_km": 430,
+            "duration_minutes": 300,
+        }).json()
+        trip = client.post("/api/bus/trips", json={
+            "route_id": route["id"],
+            "company_id": company["id"],
+            "departure_date": DAY.isoformat(),
+            "departure_time": f"0{7 + number}:00",
+            "arrival_time": f"1{2 + number}:00",
+            "available_seats": 40,
+            "total_seats": 40,
+            "price": 1000.0 + number,
+        })
+        assert trip.status_code == 200, trip.text
+        trip_ids.append(trip.json()["id"])
+    return trip_ids
+
+
+@pytest.fixture
+def headers(client, user):
+    # The first authenticated request also loads the principal
+    with assert_max_queries(1):
+        assert client.get("/api/users/me", headers=user["headers"]).status_code == 200
+    return user["headers"]
+
+
+def request_queries(send) -> int:
+    with capture_requests() as captured:
+        response = send()
+    assert response.status_code == 200, response.text
+    (recorder,) = captured
+    return recorder.count
+
+
+@pytest.mark.anyio
+async def test_record_queries_counts_awaited_calls(db):
+    with record_queries() as recorder:
+        await db.bus_trips.find_one({"id": "t1"})
+        await db.bus_trips.find({"available_seats": {"$gte": 1}}).to_list(None)
+        await db.bus_trips.update_one({"id": "t1"}, {"$set": {"price": 1.0}})
+    assert recorder.count == 3
+    assert recorder.shapes['bus_trips.find {"id": "?"}'] == 1
+    assert recorder.shapes['bus_trips.update {"id": "?"}'] == 1
+
+
+def test_assert_max_queries_reports_the_queries(server, client, headers):
+    server.principal_cache.clear()
+    with pytest.raises(AssertionError, match=r"2 queries, expected at most 1:\n.*users\.find"):
+        with assert_max_queries(1):
+            client.get("/api/bookings/me", headers=headers)
+
+
+def test_bus_search_runs_one_query_then_none(client, trips):
+    search = {"origin_city": "وهران", "destination_city": "Algiers", "departure_date": DAY.isoformat()}
+    with assert_max_queries(1):
+        response = client.post("/api/bus/search", json=search)
+    assert len(response.json()) == ITEMS
+    # Served from the search cache
+    assert request_queries(lambda: client.post("/api/bus/search", json=search)) == 0
+
+
+def test_trip_details_run_one_query(client, trips):
+    with assert_max_queries(1):
+        response = client.get(f"/api/bus/trips/{trips[0]}")
+    assert response.json()["company"]["name"] == "Company 0"
+    assert len(response.json()["seats"]) == 40
+
+
+def test_fare_calendar_runs_one_query(client, trips):
+    params = {"origin_city": "Oran", "destination_city": "Algiers", "departure_date": DAY.isoformat(), "days": 7}
+    with assert_max_queries(1):
+        response = client.get("/api/bus/fare-calendar", params=params)
+    calendar = response.json()
+    assert len(calendar) == 15
+    assert calendar[7]["trip_count"] == ITEMS
+
+
+def test_bus_bookings_run_one_query(client, trips, headers):
+    for seat, trip_id in enumerate(trips, start=1):
+        booked = client.post("/api/bus/bookings", headers=headers, json={
+            "trip_id": trip_id, "passenger_name": "Amina", "passenger_phone": "0550000000", "seat_number": str(seat)
+        })
+        assert booked.status_code == 200, booked.text
+
+    with assert_max_queries(1):
+        response = client.get("/api/bus/bookings/me", headers=headers)
+    assert sorted(item["company"]["name"] for item in response.json()) == [f"Company {n}" for n in range(ITEMS)]
+
+
+@pytest.mark.anyio
+async def test_hotel_bookings_run_one_query(server, client, headers, user):
+    await server.db.bookings.insert_many([
+        {
+            "id": f"b{number}", "user_id": user["id"], "hotel_id": "h1", "room_id": f"r{number}",
+            "check_in_date": DAY, "check_out_date": DAY + timedelta(days=2), "guests_count": 2,
+            "total_price": 180.0, "status": "confirmed", "created_at": DAY, "updated_at": DAY,
+        }
+        for number in range(ITEMS)
+    ])
+    with assert_max_queries(1):
+        response = client.get("/api/bookings/me", headers=headers)
+    assert len(response.json()) == ITEMS
+
+
+def test_bus_companies_come_from_reference_data(client, trips):
+    with assert_max_queries(0):
+        response = client.get("/api/bus/companies")
+    assert len(response.json()) == ITEMS
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from profiler import record_queries
+from reference_data import ReferenceData
+
+pytestmark = pytest.mark.anyio
+
+STAMP = datetime(2030, 1, 1)
+
+
+def company(company_id, name, updated_at=STAMP):
+    return {"id": company_id, "name": name, "created_at": STAMP, "updated_at": updated_at}
+
+
+def route(route_id, company_id, origin, destination, updated_at=STAMP):
+    return {
+        "id": route_id, "company_id": company_id, "origin_city": origin.title(), "destination_city": destination.title(),
+        "origin_city_key": origin, "destination_city_key": destination, "distance_km": 400, "duration_minutes": 300,
+        "created_at": STAMP, "updated_at": updated_at,
+    }
+
+
+@pytest.fixture
+async def workers(db):
+    await db.bus_companies.insert_many([company("c1", "Sogral"), company("c2", "Tassili")])
+    await db.bus_routes.insert_many([route("r1", "c1", "oran", "algiers"), route("r2", "c2", "oran", "blida")])
+    here, there = ReferenceData(db), ReferenceData(db)
+    await here.load()
+    await there.load()
+    return here, there
+
+
+async def test_lookups_and_listings_are_served_from_memory(workers):
+    here, _ = workers
+    with record_queries() as recorder:
+        assert (await here.company("c1"))["name"] == "Sogral"
+        assert (await here.route("r2"))["destination_city_key"] == "blida"
+        assert [item["id"] for item in here.companies()] == ["c1", "c2"]
+        assert [item["id"] for item in here.routes("oran", "algiers")] == ["r1"]
+        assert [item["id"] for item in here.routes(company_id="c2")] == ["r2"]
+        assert [item["id"] for item in here.routes(origin_key="oran")] == ["r1", "r2"]
+    assert recorder.count == 0
+
+
+async def test_refresh_picks_up_another_workers_update(db, workers):
+    here, _ = workers
+    assert not await here.refresh()
+
+    # Another worker renames a company
+    await db.bus_companies.update_one(
+        {"id": "c1"}, {"$set": {"name": "Sogral Express", "updated_at": STAMP + timedelta(minutes=1)}}
+    )
+    assert (await here.company("c1"))["name"] == "Sogral"
+    assert await here.refresh()
+    assert (await here.company("c1"))["name"] == "Sogral Express"
+    assert not await here.refresh()
+    assert here.loads == 2
+
+
+async def test_refresh_picks_up_inserts_and_deletes(db, workers):
+    here, _ = workers
+    await db.bus_routes.delete_one({"id": "r2"})
+    assert await here.refresh()
+    assert here.routes(company_id="c2") == []
+
+    # An insert with an older stamp still changes the document count
+    await db.bus_routes.insert_one(route("r3", "c2", "oran", "setif", updated_at=STAMP - timedelta(days=1)))
+    assert await here.refresh()
+    assert [item["id"] for item in here.routes("oran", "setif")] == ["r3"]
+
+
+async def test_a_lookup_miss_falls_back_to_mongo(db, workers):
+    here, there = workers
+    # Written through the other worker since this one last refreshed
+    created = company("c3", "Nouvelle")
+    await db.bus_companies.insert_one(created)
+    there.put_company(created)
+
+    with record_queries() as recorder:
+        assert (await here.company("c3"))["name"] == "Nouvelle"
+        assert (await here.company("c3"))["name"] == "Nouvelle"
+    assert recorder.count == 1
+    assert [item["id"] for item in here.companies()] == ["c1", "c2", "c3"]
+
+    await db.bus_routes.insert_one(route("r4", "c3", "batna", "biskra"))
+    assert (await here.route("r4"))["company_id"] == "c3"
+    assert await here.route("missing") is None
+    assert await here.company("missing") is None
@@ -0,0 +1,298 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from bson.int64 import Int64
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import reservations
+from migrations import run_migrations
+from reservations import HOLD_CLAIM_LEASE, SeatReservationEngine
+from seat_map import add_held_bitmaps, is_sold, is_taken, new_seat_map, seat_position, sold_count
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def trip(db):
+    document = {"id": "t1", "total_seats": 10, "available_seats": 10, "seat_map": new_seat_map(10, 250.0)}
+    await db.bus_trips.insert_one(dict(document))
+    return document
+
+
+@pytest.fixture
+def engine(db):
+    return SeatReservationEngine(db)
+
+
+def booking(seat: int, price: float):
+    return {"id": str(uuid.uuid4()), "trip_id": "t1", "seat_number": str(seat), "price": price}
+
+
+def bookings(seats, prices):
+    return [booking(seat, price) for seat, price in zip(seats, prices)]
+
+
+def hold(seats, user_id="u1", minutes=10):
+    return {
+        "id": str(uuid.uuid4()),
+        "trip_id": "t1",
+        "user_id": user_id,
+        "seat_numbers": seats,
+        "expires_at": datetime.utcnow() + timedelta(minutes=minutes),
+    }
+
+
+async def stored_trip(db):
+    return await db.bus_trips.find_one({"id": "t1"})
+
+
+async def test_reserve_claims_the_seat_and_records_the_booking(db, engine, trip):
+    recorded = await engine.reserve(trip, "3", lambda price: booking(3, price))
+    assert recorded["price"] == 250.0
+    assert await db.bus_ticket_bookings.count_documents({}) == 1
+
+    stored = await stored_trip(db)
+    assert is_sold(stored["seat_map"], 3)
+    assert stored["available_seats"] == 9
+
+
+async def test_a_seat_cannot_be_booked_twice(db, engine, trip):
+    await engine.reserve(trip, "3", lambda price: booking(3, price))
+    with pytest.raises(HTTPException) as error:
+        await engine.reserve(trip, "3", lambda price: booking(3, price))
+    assert error.value.status_code == 400
+    assert await db.bus_ticket_bookings.count_documents({}) == 1
+    assert (await stored_trip(db))["available_seats"] == 9
+
+
+async def test_unknown_seat_is_not_found(engine, trip):
+    with pytest.raises(HTTPException) as error:
+        await engine.reserve(trip, "11", lambda price: booking(11, price))
+    assert error.value.status_code == 404
+
+
+async def test_claim_is_rolled_back_when_the_booking_cannot_be_recorded(db, engine, trip):
+    existing = await engine.reserve(trip, "3", lambda price: booking(3, price))
+
+    # A booking id that is already taken makes the insert fail after the claim
+    with pytest.raises(DuplicateKeyError):
+        await engine.reserve(trip, "4", lambda price: {**booking(4, price), "id": existing["id"]})
+    stored = await stored_trip(db)
+    assert not is_sold(stored["seat_map"], 4)
+    assert stored["available_seats"] == 9
+
+
+async def test_group_takes_every_seat_or_none(db, engine, trip):
+    await engine.reserve(trip, "5", lambda price: booking(5, price))
+    with pytest.raises(HTTPException) as error:
+        await engine.reserve_group(trip, ["4", "5", "6"], bookings)
+    assert error.value.status_code == 400
+    stored = await stored_trip(db)
+    assert not is_sold(stored["seat_map"], 4) and not is_sold(stored["seat_map"], 6)
+
+    recorded = await engine.reserve_group(trip, ["6", "7"], bookings)
+    assert [item["seat_number"] for item in recorded] == ["6", "7"]
+    assert (await stored_trip(db))["available_seats"] == 7
+
+
+async def test_release_returns_the_seat(db, engine, trip):
+    await engine.reserve(trip, "2", lambda price: booking(2, price))
+    assert await engine.release("t1", "2")
+    assert not await engine.release("t1", "2")
+    stored = await stored_trip(db)
+    assert not is_sold(stored["seat_map"], 2)
+    assert stored["available_seats"] == 10
+
+
+async def test_held_seats_cannot_be_booked_or_held_again(engine, trip):
+    await engine.hold(trip, hold(["1", "2"]))
+    with pytest.raises(HTTPException):
+        await engine.reserve(trip, "2", lambda price: booking(2, price))
+    with pytest.raises(HTTPException):
+        await engine.hold(trip, hold(["1"], user_id="u2"))
+
+
+async def test_booking_a_hold_sells_its_seats(db, engine, trip):
+    held = await engine.hold(trip, hold(["1", "2"]))
+    recorded = await engine.book_hold(held["id"], "u1", lambda _, seats, prices: bookings(seats, prices))
+    assert len(recorded) == 2
+
+    stored = await stored_trip(db)
+    assert is_sold(stored["seat_map"], 1) and is_sold(stored["seat_map"], 2)
+    assert stored["seat_map"]["held"][0] == 0
+    assert await db.bus_seat_holds.count_documents({}) == 0
+
+
+async def test_a_hold_is_booked_only_by_its_owner_and_once(engine, trip):
+    held = await engine.hold(trip, hold(["3"]))
+    with pytest.raises(HTTPException) as error:
+        await engine.book_hold(held["id"], "u2", lambda _, seats, prices: bookings(seats, prices))
+    assert error.value.status_code == 404
+
+    await engine.book_hold(held["id"], "u1", lambda _, seats, prices: bookings(seats, prices))
+    with pytest.raises(HTTPException) as error:
+        await engine.book_hold(held["id"], "u1", lambda _, seats, prices: bookings(seats, prices))
+    assert error.value.status_code == 404
+
+
+async def test_booking_a_hold_whose_seats_were_freed_records_nothing(db, engine, trip):
+    held = await engine.hold(trip, hold(["3"]))
+    await engine._free_seats("t1", [3], "held")
+    with pytest.raises(HTTPException) as error:
+        await engine.book_hold(held["id"], "u1", lambda _, seats, prices: bookings(seats, prices))
+    assert error.value.status_code == 409
+    assert await db.bus_ticket_bookings.count_documents({}) == 0
+
+
+async def test_expired_holds_free_their_seats(db, engine, trip):
+    expired = await engine.hold(trip, hold(["1"], minutes=-1))
+    active = await engine.hold(trip, hold(["2"]))
+
+    released = await engine.expire_holds()
+    assert [item["id"] for item in released] == [expired["id"]]
+    stored = await stored_trip(db)
+    assert not is_taken(stored["seat_map"], 1)
+    assert is_taken(stored["seat_map"], 2)
+    assert stored["available_seats"] == 9
+
+    # An expired hold can no longer be booked
+    with pytest.raises(HTTPException):
+        await engine.book_hold(expired["id"], "u1", lambda _, seats, prices: bookings(seats, prices))
+    assert await db.bus_seat_holds.count_documents({"id": active["id"]}) == 1
+
+
+async def test_cancelling_a_hold_frees_its_seats(db, engine, trip):
+    held = await engine.hold(trip, hold(["5"]))
+    assert await engine.cancel_hold(held["id"], "u2") is None
+    assert (await engine.cancel_hold(held["id"], "u1"))["id"] == held["id"]
+    assert not is_taken((await stored_trip(db))["seat_map"], 5)
+
+
+async def test_a_failed_booking_leaves_the_hold_for_the_sweeper(db, engine, trip, monkeypatch):
+    held = await engine.hold(trip, hold(["4", "5"]))
+
+    def broken_update(masks):
+        raise ConnectionError("primary stepped down")
+
+    monkeypatch.setattr(reservations, "sell_held_update", broken_update)
+    with pytest.raises(ConnectionError):
+        await engine.book_hold(held["id"], "u1", lambda _, seats, prices: bookings(seats, prices))
+    monkeypatch.undo()
+
+    # The claimed hold is neither bookable nor swept until its lease runs out
+    with pytest.raises(HTTPException):
+        await engine.book_hold(held["id"], "u1", lambda _, seats, prices: bookings(seats, prices))
+    assert await engine.expire_holds() == []
+    assert (await stored_trip(db))["available_seats"] == 8
+
+    later = datetime.utcnow() + HOLD_CLAIM_LEASE + timedelta(seconds=1)
+    assert [item["id"] for item in await engine.expire_holds(later)] == [held["id"]]
+    stored = await stored_trip(db)
+    assert not is_taken(stored["seat_map"], 4) and not is_taken(stored["seat_map"], 5)
+    assert stored["available_seats"] == 10
+    assert await db.bus_seat_holds.count_documents({}) == 0
+
+
+async def test_a_hold_being_booked_cannot_be_cancelled_or_expired(db, engine, trip):
+    held = await engine.hold(trip, hold(["6"], minutes=-1))
+    # Booking claimed the hold just before it expired
+    await db.bus_seat_holds.update_one(
+        {"id": held["id"]},
+        {"$set": {"state": "booking", "expires_at": datetime.utcnow() + HOLD_CLAIM_LEASE}}
+    )
+    assert await engine.cancel_hold(held["id"], "u1") is None
+    assert await engine.expire_holds() == []
+    assert is_taken((await stored_trip(db))["seat_map"], 6)
+
+
+async def test_sweeping_a_stale_claim_whose_seats_were_sold_frees_nothing(db, engine, trip):
+    held = await engine.hold(trip, hold(["7"]))
+    await engine.book_hold(held["id"], "u1", lambda _, seats, prices: bookings(seats, prices))
+    # As if the worker had died before dropping the hold document
+    await db.bus_seat_holds.insert_one({**held, "state": "booking", "expires_at": datetime.utcnow()})
+
+    assert await engine.expire_holds() == []
+    stored = await stored_trip(db)
+    assert is_sold(stored["seat_map"], 7)
+    assert stored["available_seats"] == 9
+    assert await db.bus_seat_holds.count_documents({}) == 0
+
+
+async def test_trips_from_before_seat_holds_work_after_the_migration(db, engine):
+    seat_map = new_seat_map(10, 250.0)
+    del seat_map["held"]
+    seat_map["sold"][0] = Int64(0b1)
+    await db.bus_trips.insert_one({"id": "t1", "total_seats": 10, "available_seats": 9, "seat_map": seat_map})
+
+    await run_migrations(db)
+    assert await add_held_bitmaps(db) == 0
+    trip = await stored_trip(db)
+    assert trip["seat_map"]["held"] == [Int64(0)]
+
+    with pytest.raises(HTTPException):
+        await engine.reserve(trip, "1", lambda price: booking(1, price))
+    await engine.reserve(trip, "2", lambda price: booking(2, price))
+    held = await engine.hold(trip, hold(["3", "4"]))
+    await engine.book_hold(held["id"], "u1", lambda _, seats, prices: bookings(seats, prices))
+
+    stored = await stored_trip(db)
+    assert [number for number in range(1, 11) if is_sold(stored["seat_map"], number)] == [1, 2, 3, 4]
+    assert stored["seat_map"]["held"] == [Int64(0)]
+    assert stored["available_seats"] == 6
+
+
+def sell(seat_map, *numbers):
+    for number in numbers:
+        word, mask = seat_position(str(number))
+        seat_map["sold"][word] = Int64(seat_map["sold"][word] | mask)
+
+
+async def test_adjacent_seats_take_the_first_free_run(db, engine, trip):
+    await engine.reserve(trip, "2", lambda price: booking(2, price))
+    recorded = await engine.reserve_adjacent(await stored_trip(db), 3, bookings)
+    assert [item["seat_number"] for item in recorded] == ["3", "4", "5"]
+    assert (await stored_trip(db))["available_seats"] == 6
+
+
+async def test_no_adjacent_run_claims_nothing(db, engine):
+    seat_map = new_seat_map(10, 250.0)
+    sell(seat_map, 3, 6, 9)
+    await db.bus_trips.insert_one({"id": "t1", "total_seats": 10, "available_seats": 7, "seat_map": seat_map})
+
+    with pytest.raises(HTTPException) as error:
+        await engine.reserve_adjacent(await stored_trip(db), 3, bookings)
+    assert error.value.status_code == 400
+    stored = await stored_trip(db)
+    assert sold_count(stored["seat_map"]) == 3 and stored["available_seats"] == 7
+    assert await db.bus_ticket_bookings.count_documents({}) == 0
+
+
+async def test_adjacent_run_taken_meanwhile_is_picked_again(db, engine, trip):
+    # Another booking takes seat 2 after this request read the seat map
+    await engine.reserve(trip, "2", lambda price: booking(2, price))
+    recorded = await engine.reserve_adjacent(trip, 3, bookings)
+    assert [item["seat_number"] for item in recorded] == ["3", "4", "5"]
+    stored = await stored_trip(db)
+    # Seat 1 of the first, lost run was not left claimed
+    assert not is_sold(stored["seat_map"], 1)
+    assert [number for number in range(1, 11) if is_sold(stored["seat_map"], number)] == [2, 3, 4, 5]
+    assert stored["available_seats"] == 6
+
+
+async def test_adjacent_run_is_released_when_the_bookings_cannot_be_recorded(db, engine, trip):
+    existing = await engine.reserve(trip, "1", lambda price: booking(1, price))
+
+    def clashing_bookings(seats, prices):
+        made = bookings(seats, prices)
+        made[-1]["id"] = existing["id"]
+        return made
+
+    # Two of the three bookings are inserted before the clash
+    with pytest.raises(BulkWriteError):
+        await engine.reserve_adjacent(await stored_trip(db), 3, clashing_bookings)
+    stored = await stored_trip(db)
+    assert [number for number in range(1, 11) if is_sold(stored["seat_map"], number)] == [1]
+    assert stored["available_seats"] == 9
+    assert await db.bus_ticket_bookings.count_documents({}) == 1
@@ -0,0 +1,71 @@
+from datetime import date, datetime
+
+import pytest
+
+from room_inventory import RoomInventory, backfill_room_nights, stay_nights
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def inventory(db):
+    return RoomInventory(db)
+
+
+def test_stay_nights_counts_calendar_nights():
+    assert stay_nights(date(2030, 1, 1), date(2030, 1, 3)) == [datetime(2030, 1, 1), datetime(2030, 1, 2)]
+    # Check-in and check-out times do not change which nights are taken
+    assert len(stay_nights(datetime(2030, 1, 1, 14), datetime(2030, 1, 3, 10))) == 2
+    assert stay_nights(datetime(2030, 1, 1, 8), datetime(2030, 1, 1, 20)) == []
+
+
+async def test_overlapping_stays_cannot_both_be_claimed(db, inventory):
+    assert await inventory.claim("r1", date(2030, 1, 1), date(2030, 1, 4), "b1")
+    assert not await inventory.claim("r1", date(2030, 1, 3), date(2030, 1, 6), "b2")
+    # The rejected stay left none of its nights behind
+    assert await db.room_nights.count_documents({"booking_id": "b2"}) == 0
+    assert await db.room_nights.count_documents({"booking_id": "b1"}) == 3
+
+    # Back-to-back stays and other rooms do not conflict
+    assert await inventory.claim("r1", date(2030, 1, 4), date(2030, 1, 5), "b3")
+    assert await inventory.claim("r2", date(2030, 1, 1), date(2030, 1, 4), "b4")
+
+
+async def test_claiming_the_same_stay_again_keeps_its_nights(db, inventory):
+    assert await inventory.claim("r1", date(2030, 1, 1), date(2030, 1, 4), "b1")
+    assert await inventory.claim("r1", date(2030, 1, 1), date(2030, 1, 4), "b1")
+    assert await db.room_nights.count_documents({"booking_id": "b1"}) == 3
+
+
+async def test_a_failed_claim_keeps_the_nights_of_the_same_booking(db, inventory):
+    assert await inventory.claim("r1", date(2030, 1, 1), date(2030, 1, 3), "b1")
+    assert await inventory.claim("r1", date(2030, 1, 5), date(2030, 1, 6), "b2")
+    # Overlaps its own nights and another booking's
+    assert not await inventory.claim("r1", date(2030, 1, 1), date(2030, 1, 6), "b1")
+    assert await db.room_nights.count_documents({"booking_id": "b1"}) == 2
+
+
+async def test_release_frees_the_nights(inventory):
+    await inventory.claim("r1", date(2030, 1, 1), date(2030, 1, 4), "b1")
+    assert await inventory.free_rooms(["r1", "r2"], date(2030, 1, 2), date(2030, 1, 3)) == {"r2"}
+    assert await inventory.release("b1") == 3
+    assert await inventory.free_rooms(["r1", "r2"], date(2030, 1, 2), date(2030, 1, 3)) == {"r1", "r2"}
+    assert await inventory.claim("r1", date(2030, 1, 2), date(2030, 1, 3), "b2")
+
+
+async def test_backfill_claims_active_bookings_once_and_reports_overlaps(db):
+    await db.bookings.insert_many([
+        {"id": "b1", "room_id": "r1", "status": "confirmed", "created_at": datetime(2029, 1, 1),
+         "check_in_date": datetime(2030, 1, 1), "check_out_date": datetime(2030, 1, 4)},
+        {"id": "b2", "room_id": "r1", "status": "pending", "created_at": datetime(2029, 1, 2),
+         "check_in_date": datetime(2030, 1, 2), "check_out_date": datetime(2030, 1, 3)},
+        {"id": "b3", "room_id": "r1", "status": "canceled", "created_at": datetime(2029, 1, 3),
+         "check_in_date": datetime(2030, 2, 1), "check_out_date": datetime(2030, 2, 3)},
+    ])
+    result = await backfill_room_nights(db)
+    assert result == {"claimed": 1, "conflicts": ["b2"]}
+    assert await db.room_nights.count_documents({}) == 3
+
+    # A second run, e.g. by another worker, changes nothing
+    assert await backfill_room_nights(db) == {"claimed": 0, "conflicts": []}
+    assert await db.room_nights.count_documents({}) == 3
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+from search_cache import BusSearchCache, cache_from_env, search_bucket
+
+BUCKET = search_bucket("oran", "algiers", datetime(2030, 5, 1, 8, 30))
+RESULTS = [{"id": "t1", "departure_date": datetime(2030, 5, 1), "price": 1200.0}]
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+def worker(redis_server):
+    """
+    The cache of one worker process, sharing the Redis tier with the others
+    """
+    return BusSearchCache(maxsize=100, ttl=30, redis=fakeredis.FakeAsyncRedis(server=redis_server))
+
+
+def test_buckets_are_per_day():
+    assert BUCKET == ("oran", "algiers", "2030-05-01")
+
+
+async def test_local_tier_without_redis():
+    cache = BusSearchCache(maxsize=100, ttl=30)
+    version = await cache.version(BUCKET)
+    await cache.set(BUCKET, version, 1, RESULTS)
+    assert await cache.get(BUCKET, version, 1) == RESULTS
+    assert await cache.get(BUCKET, version, 2) is None
+
+    await cache.invalidate(BUCKET)
+    assert await cache.version(BUCKET) == version + 1
+    assert await cache.get(BUCKET, await cache.version(BUCKET), 1) is None
+
+
+async def test_results_are_shared_through_redis(redis_server):
+    first, second = worker(redis_server), worker(redis_server)
+    version = await first.version(BUCKET)
+    await first.set(BUCKET, version, 1, RESULTS)
+
+    # Dates survive the round trip through Redis
+    assert await second.get(BUCKET, await second.version(BUCKET), 1) == RESULTS
+    assert second.redis_hits == 1
+    # and the entry is now in the second worker's local tier too
+    assert await second.get(BUCKET, version, 1) == RESULTS
+    assert second.redis_hits == 1
+
+
+async def test_an_invalidation_in_one_worker_reaches_the_others(redis_server):
+    first, second = worker(redis_server), worker(redis_server)
+    version = await first.version(BUCKET)
+    await first.set(BUCKET, version, 1, RESULTS)
+    await second.set(BUCKET, version, 1, RESULTS)
+
+    await second.invalidate(BUCKET)
+    current = await first.version(BUCKET)
+    assert current == version + 1
+    # The first worker's local entry is under the old version and no longer reachable
+    assert await first.get(BUCKET, current, 1) is None
+    # Other buckets keep their version
+    assert await first.version(search_bucket("oran", "algiers", datetime(2030, 5, 2))) == 0
+
+
+async def test_a_broken_redis_falls_back_to_the_local_tier():
+    class BrokenRedis:
+        async def get(self, *args, **kwargs):
+            raise ConnectionError("down")
+
+        set = incr = get
+
+    cache = BusSearchCache(maxsize=100, ttl=30, redis=BrokenRedis())
+    await cache.set(BUCKET, 0, 1, RESULTS)
+    assert await cache.version(BUCKET) == 0
+    assert await cache.get(BUCKET, 0, 1) == RESULTS
+    assert await cache.get(BUCKET, 0, 2) is None
+    assert cache.stats()["redis_errors"] == 3
+
+
+def test_several_workers_without_redis_disable_the_cache(monkeypatch, redis_server):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert cache_from_env().local.maxsize == 0
+    assert cache_from_env(fakeredis.FakeAsyncRedis(server=redis_server)).local.maxsize > 0
+
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    assert cache_from_env().local.maxsize > 0
@@ -0,0 +1,144 @@
+import pytest
+from bson.int64 import Int64
+
+from seat_map import (
+    claim_query, claim_update, free_seat_run, is_sold, is_taken, migrate_seat_documents, new_seat_map, release_query,
+    release_update, seat_map_from_documents, seat_masks, seat_position, seat_price, sell_held_update, sold_count
+)
+
+
+def test_new_seat_map_has_one_word_per_32_seats():
+    seat_map = new_seat_map(50, 200.0)
+    assert seat_map["sold"] == [Int64(0), Int64(0)]
+    assert seat_map["held"] == [Int64(0), Int64(0)]
+    assert seat_map["classes"] == [{"name": "standard", "first_seat": 1, "last_seat": 50, "price": 200.0}]
+
+
+def test_seat_position():
+    assert seat_position("1") == (0, 1)
+    assert seat_position("32") == (0, 1 << 31)
+    assert seat_position("33") == (1, 1)
+    assert seat_position("0") is None
+    assert seat_position("51", total_seats=50) is None
+    assert seat_position("A1") is None
+
+
+def test_seat_masks_combine_seats_per_word():
+    assert seat_masks([1, 2, 33]) == {0: 0b11, 1: 0b1}
+
+
+def test_claim_query_requires_seats_neither_sold_nor_held():
+    assert claim_query({0: 0b101}) == {
+        "seat_map.sold.0": {"$bitsAllClear": 0b101},
+        "seat_map.held.0": {"$bitsAllClear": 0b101},
+    }
+
+
+def test_claim_and_release_updates():
+    assert claim_update({1: 4}, "held") == {"$bit": {"seat_map.held.1": {"or": Int64(4)}}}
+    assert release_query({0: 4}) == {"seat_map.sold.0": {"$bitsAllSet": 4}}
+    assert release_update({0: 4}) == {"$bit": {"seat_map.sold.0": {"and": Int64(0xFFFFFFFB)}}}
+
+
+def test_sell_held_update_moves_bits_in_one_write():
+    assert sell_held_update({0: 2}) == {"$bit": {
+        "seat_map.held.0": {"and": Int64(0xFFFFFFFD)},
+        "seat_map.sold.0": {"or": Int64(2)},
+    }}
+
+
+def test_taken_seats_and_free_runs():
+    seat_map = new_seat_map(8, 100.0)
+    seat_map["sold"][0] = Int64(0b00000100)
+    seat_map["held"][0] = Int64(0b00100000)
+    assert is_sold(seat_map, 3)
+    assert is_taken(seat_map, 6) and not is_sold(seat_map, 6)
+    assert not is_taken(seat_map, 4)
+    assert free_seat_run(seat_map, 8, 2) == [1, 2]
+    assert free_seat_run(seat_map, 8, 3) is None
+    assert sold_count(seat_map) == 1
+
+
+def test_seat_map_from_legacy_documents():
+    seats = [
+        {"seat_number": "1", "is_available": False, "price": 100.0},
+        {"seat_number": "2", "is_available": True, "price": 100.0},
+        {"seat_number": "3", "is_available": True, "price": 150.0},
+    ]
+    seat_map = seat_map_from_documents(3, seats, 100.0, "vip")
+    assert is_sold(seat_map, 1) and not is_sold(seat_map, 2)
+    assert seat_price(seat_map, 2) == 100.0
+    assert seat_price(seat_map, 3) == 150.0
+    assert [seat_class["name"] for seat_class in seat_map["classes"]] == ["vip", "vip_2"]
+
+
+async def _trip_with_seat_map(db, total_seats: int):
+    await db.bus_trips.insert_one(
+        {"id": "t1", "total_seats": total_seats, "seat_map": new_seat_map(total_seats, 100.0)}
+    )
+
+
+@pytest.mark.anyio
+async def test_claim_matches_only_while_seats_are_free(db):
+    await _trip_with_seat_map(db, 40)
+    masks = seat_masks([2, 34])
+    first = await db.bus_trips.update_one({"id": "t1", **claim_query(masks)}, claim_update(masks))
+    second = await db.bus_trips.update_one({"id": "t1", **claim_query(masks)}, claim_update(masks))
+    assert (first.modified_count, second.modified_count) == (1, 0)
+
+    trip = await db.bus_trips.find_one({"id": "t1"})
+    assert is_sold(trip["seat_map"], 2) and is_sold(trip["seat_map"], 34)
+    assert sold_count(trip["seat_map"]) == 2
+
+
+@pytest.mark.anyio
+async def test_release_clears_only_the_given_seats(db):
+    await _trip_with_seat_map(db, 8)
+    claimed = seat_masks([1, 2])
+    await db.bus_trips.update_one({"id": "t1", **claim_query(claimed)}, claim_update(claimed))
+    released = seat_masks([2])
+    result = await db.bus_trips.update_one({"id": "t1", **release_query(released)}, release_update(released))
+    assert result.modified_count == 1
+
+    trip = await db.bus_trips.find_one({"id": "t1"})
+    assert is_sold(trip["seat_map"], 1) and not is_sold(trip["seat_map"], 2)
+
+
+@pytest.mark.anyio
+async def test_legacy_seat_documents_are_migrated_in_one_pass(db):
+    await db.bus_trips.insert_many([
+        {"id": "t2", "total_seats": 3, "available_seats": 3, "price": 100.0, "bus_type": "vip"},
+        {"id": "t1", "total_seats": 4, "available_seats": 4, "price": 80.0},
+        {"id": "t3", "total_seats": 2, "available_seats": 2, "price": 50.0},
+        {"id": "t0", "total_seats": 2, "available_seats": 2, "price": 50.0, "seat_map": new_seat_map(2, 50.0)},
+    ])
+    # Seats of different trips are interleaved; t1 lists a seat beyond its recorded total
+    await db.bus_seats.insert_many([
+        {"trip_id": "t2", "seat_number": "1", "is_available": False, "price": 100.0},
+        {"trip_id": "t1", "seat_number": "5", "is_available": False, "price": 80.0},
+        {"trip_id": "t2", "seat_number": "2", "is_available": True, "price": 100.0},
+        {"trip_id": "t1", "seat_number": "2", "is_available": False, "price": 80.0},
+        {"trip_id": "t2", "seat_number": "3", "is_available": True, "price": 140.0},
+        {"trip_id": "t0", "seat_number": "1", "is_available": False, "price": 50.0},
+    ])
+
+    assert await migrate_seat_documents(db) == 3
+    trips = {trip["id"]: trip async for trip in db.bus_trips.find({}, {"_id": 0})}
+
+    t1 = trips["t1"]
+    assert t1["total_seats"] == 5
+    assert [number for number in range(1, 6) if is_sold(t1["seat_map"], number)] == [2, 5]
+    assert t1["available_seats"] == 3
+
+    t2 = trips["t2"]
+    assert is_sold(t2["seat_map"], 1) and not is_taken(t2["seat_map"], 2)
+    assert t2["available_seats"] == 2
+    assert [seat_class["name"] for seat_class in t2["seat_map"]["classes"]] == ["vip", "vip_2"]
+    assert seat_price(t2["seat_map"], 3) == 140.0
+
+    # A trip without seat documents starts with every seat free
+    assert trips["t3"]["available_seats"] == 2 and sold_count(trips["t3"]["seat_map"]) == 0
+    # Trips that already had a seat map are left alone
+    assert sold_count(trips["t0"]["seat_map"]) == 0
+
+    assert await migrate_seat_documents(db) == 0
@@ -0,0 +1,112 @@
+from datetime import datetime
+
+import pytest
+
+DAY = datetime(2030, 5, 1)
+
+
+@pytest.fixture
+def network(client):
+    """
+    A company running one Oran to Algiers trip on DAY
+    """
+    company = client.post("/api/bus/companies", json={"name": "Sogral"}).json()
+    route = client.post("/api/bus/routes", json={
+        "company_id": company["id"],
+        "origin_city": "Oran",
+        "destination_city": "Algiers",
+        "distance_km": 430,
+        "duration_minutes": 300,
+    }).json()
+    trip = client.post("/api/bus/trips", json={
+        "route_id": route["id"],
+        "company_id": company["id"],
+        "departure_date": DAY.isoformat(),
+        "departure_time": "08:00",
+        "arrival_time": "13:00",
+        "available_seats": 40,
+        "total_seats": 40,
+        "price": 1200.0,
+    }).json()
+    return {"company": company, "route": route, "trip": trip}
+
+
+def search(client, origin="Oran", destination="Algiers"):
+    response = client.post("/api/bus/search", json={
+        "origin_city": origin, "destination_city": destination, "departure_date": DAY.isoformat()
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_company_update_reaches_searches_trips_and_bookings(client, network, user):
+    company_id, trip_id = network["company"]["id"], network["trip"]["id"]
+    booked = client.post("/api/bus/bookings", headers=user["headers"], json={
+        "trip_id": trip_id, "passenger_name": "Amina", "passenger_phone": "0550000000", "seat_number": "1"
+    })
+    assert booked.status_code == 200, booked.text
+    # Cache the search before the update
+    assert search(client)[0]["company"]["name"] == "Sogral"
+
+    updated = client.put(f"/api/bus/companies/{company_id}", json={"name": "Sogral Express", "logo": "s.png"})
+    assert updated.status_code == 200, updated.text
+
+    assert search(client)[0]["company"]["name"] == "Sogral Express"
+    details = client.get(f"/api/bus/trips/{trip_id}").json()
+    assert (details["company"]["name"], details["company"]["logo"]) == ("Sogral Express", "s.png")
+    (booking,) = client.get("/api/bus/bookings/me", headers=user["headers"]).json()
+    assert booking["company"]["name"] == "Sogral Express"
+    assert client.get(f"/api/bus/companies/{company_id}").json()["name"] == "Sogral Express"
+
+
+def test_route_update_moves_cached_searches_and_itineraries(client, network):
+    route_id, trip_id = network["route"]["id"], network["trip"]["id"]
+    assert len(search(client)) == 1
+    assert search(client, destination="Blida") == []
+
+    updated = client.put(f"/api/bus/routes/{route_id}", json={"destination_city": "البليدة", "duration_minutes": 120})
+    assert updated.status_code == 200, updated.text
+    assert updated.json()["destination_city"] == "البليدة"
+
+    # Neither the old nor the new city serves a stale cached result
+    assert search(client) == []
+    (result,) = search(client, destination="Blida")
+    assert result["route"]["destination_city"] == "البليدة"
+    assert client.get(f"/api/bus/trips/{trip_id}").json()["route"]["duration_minutes"] == 120
+
+    itineraries = client.post("/api/bus/itineraries", json={
+        "origin_city": "Oran", "destination_city": "Blida", "departure_date": DAY.isoformat()
+    }).json()
+    (fastest,) = itineraries["fastest"]
+    assert fastest["duration_minutes"] == 120
+    assert fastest["legs"][0]["destination_city"] == "البليدة"
+
+
+@pytest.mark.parametrize("path, body", [
+    ("companies", {"name": None}),
+    ("routes", {"origin_city": None}),
+    ("routes", {"duration_minutes": None}),
+    ("routes", {"distance_km": "far"}),
+])
+def test_null_and_invalid_updates_are_refused(client, network, path, body):
+    entity = network["company"] if path == "companies" else network["route"]
+    response = client.put(f"/api/bus/{path}/{entity['id']}", json=body)
+    assert response.status_code == 422
+    # Nothing was written
+    assert search(client)[0]["company"]["name"] == "Sogral"
+    assert search(client)[0]["route"]["origin_city"] == "Oran"
+
+
+@pytest.mark.anyio
+async def test_updates_leaving_a_stored_document_invalid_are_refused(server, client):
+    # Written by an older version without a distance
+    await server.db.bus_routes.insert_one({
+        "id": "legacy", "company_id": "c1", "origin_city": "Oran", "destination_city": "Algiers",
+        "origin_city_key": "oran", "destination_city_key": "algiers", "duration_minutes": 300,
+    })
+    assert client.put("/api/bus/routes/legacy", json={"duration_minutes": 280}).status_code == 422
+    assert (await server.db.bus_routes.find_one({"id": "legacy"}))["duration_minutes"] == 300
+
+    fixed = client.put("/api/bus/routes/legacy", json={"duration_minutes": 280, "distance_km": 430})
+    assert fixed.status_code == 200, fixed.text
+    assert client.put("/api/bus/routes/missing", json={"duration_minutes": 1}).status_code == 404